@@ -0,0 +1,115 @@
+"""
+活动明细表
+
+trips.trip_data 仍是行程的唯一数据来源；activities 表是其中活动列表的
+规范化副本，在行程写入时同步维护，用于按城市、日期、费用等条件的
+索引查询和聚合。可通过 ACTIVITIES_TABLE_ENABLED=false 关闭。
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ACTIVITIES_TABLE_ENABLED = (
+    os.getenv("ACTIVITIES_TABLE_ENABLED", "true").lower() == "true"
+)
+
+
+def parse_time(value: Any) -> Optional[datetime]:
+    """解析 ISO 8601 时间，带时区的转换为 UTC 后去掉时区"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_cost(value: Any) -> Optional[float]:
+    """解析金额（数字或数字字符串），无法解析时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def clip_text(value: Any, limit: int) -> Optional[str]:
+    """截断到列长度的非空字符串，其他值返回 None"""
+    return value[:limit] if isinstance(value, str) and value else None
+
+
+def extract_activities(trip: models.Trip) -> List[Dict[str, Any]]:
+    """将行程中的活动列表转换为 activities 表的行"""
+    rows = []
+    for ordinal, activity in enumerate((trip.trip_data or {}).get("activities") or []):
+        if not isinstance(activity, dict):
+            continue
+        rows.append(
+            {
+                "trip_id": trip.id,
+                "ordinal": ordinal,
+                "user_id": trip.user_id,
+                "title": clip_text(activity.get("title"), 200),
+                "location": clip_text(activity.get("location"), 200),
+                "city": clip_text(activity.get("city"), 100),
+                "country_code": clip_text(activity.get("countryCode"), 10),
+                "start_time": parse_time(activity.get("startTime")),
+                "end_time": parse_time(activity.get("endTime")),
+                "estimated_cost": parse_cost(
+                    activity.get("estimatedCost", activity.get("cost"))
+                ),
+            }
+        )
+    return rows
+
+
+def sync_activities(db: Session, trips: Iterable[models.Trip]):
+    """用行程当前的 trip_data 重建其活动明细（在调用方事务内执行）"""
+    if not ACTIVITIES_TABLE_ENABLED:
+        return
+    trips = list(trips)
+    if not trips:
+        return
+    db.execute(
+        delete(models.Activity).where(
+            models.Activity.trip_id.in_([trip.id for trip in trips])
+        )
+    )
+    rows = [row for trip in trips for row in extract_activities(trip)]
+    if rows:
+        db.execute(insert(models.Activity), rows)
+
+
+def remove_activities(db: Session, trip_ids: Iterable[int]):
+    """删除行程对应的活动明细"""
+    ids = list(trip_ids)
+    if not ACTIVITIES_TABLE_ENABLED or not ids:
+        return
+    db.execute(delete(models.Activity).where(models.Activity.trip_id.in_(ids)))
+
+
+def remove_user_activities(db: Session, user_id: int):
+    """删除某个用户的全部活动明细（用户注销时调用）"""
+    if not ACTIVITIES_TABLE_ENABLED:
+        return
+    db.execute(delete(models.Activity).where(models.Activity.user_id == user_id))
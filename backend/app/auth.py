@@ -1,11 +1,23 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
-import secrets
 import base64
+import logging
+import os
+import secrets
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from .token_denylist import denylist
 
+load_dotenv()
 
-# 运行时生成随机JWT密钥（每次服务器重启都会重新生成）
+logger = logging.getLogger(__name__)
+
+
+# 运行时生成随机JWT密钥（memory 模式下每次服务器重启都会重新生成）
 def generate_random_secret_key() -> str:
     """生成32字节的随机密钥，使用base64编码"""
     random_bytes = secrets.token_bytes(32)
@@ -13,9 +25,150 @@ def generate_random_secret_key() -> str:
 
 
 # JWT配置
-SECRET_KEY = generate_random_secret_key()
 ALGORITHM = "HS256"  # 固定使用HS256算法
-ACCESS_TOKEN_EXPIRE_MINUTES = 30  # 固定30分钟过期
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# 刷新令牌的空闲有效期：每次刷新都会轮换出新令牌并重新计时
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+# 签名密钥存储：memory 为进程内随机密钥（单进程）；database 为数据库中
+# 共享的密钥集，多个 worker 签发的令牌可互相验证，并支持按 kid 轮换
+JWT_KEYRING = os.getenv("JWT_KEYRING", "memory").lower()
+# 多久从数据库重新加载一次密钥集，使其他进程的轮换生效
+KEYRING_REFRESH_SECONDS = float(os.getenv("KEYRING_REFRESH_SECONDS", "60"))
+# 轮换下来的密钥继续用于验证的时间，应不短于令牌有效期
+JWT_KEY_RETENTION_MINUTES = int(
+    os.getenv("JWT_KEY_RETENTION_MINUTES", str(ACCESS_TOKEN_EXPIRE_MINUTES))
+)
+
+# 管理员用户名（逗号分隔），可访问 /api/admin 下的运维接口
+ADMIN_USERNAMES = frozenset(
+    name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()
+)
+
+
+def is_admin(username: Optional[str]) -> bool:
+    return username is not None and username in ADMIN_USERNAMES
+
+
+class KeyRing:
+    """
+    JWT签名密钥集
+
+    签发使用当前密钥并在令牌头部写入 kid；验证按 kid 选择密钥，
+    因此轮换后旧令牌在保留期内仍然有效。
+    """
+
+    def __init__(self, backend: str = "memory"):
+        self.backend = backend
+        self._keys: Dict[str, str] = {}
+        self._active: Optional[Tuple[str, str]] = None
+        self._loaded_at = 0.0
+        self._miss_reload_at = 0.0
+        self._lock = threading.Lock()
+        if backend == "memory":
+            kid = secrets.token_hex(8)
+            self._keys = {kid: generate_random_secret_key()}
+            self._active = (kid, self._keys[kid])
+
+    def _stale(self) -> bool:
+        return time.monotonic() - self._loaded_at > KEYRING_REFRESH_SECONDS
+
+    def reload(self, create: bool = False):
+        """
+        从数据库加载未过保留期的密钥
+
+        create 为 True 时（启动阶段，单写线程启动之前）没有可用密钥则生成一个。
+        运行中的重新加载在事件循环上执行，只读取不写入：没有可用密钥时
+        继续使用已加载的密钥。
+        """
+        from . import models
+        from .database import SessionLocal
+
+        with self._lock:
+            with SessionLocal() as db:
+                cutoff = datetime.utcnow() - timedelta(
+                    minutes=JWT_KEY_RETENTION_MINUTES
+                )
+                rows = (
+                    db.query(models.SigningKey)
+                    .filter(
+                        (models.SigningKey.retired_at.is_(None))
+                        | (models.SigningKey.retired_at > cutoff)
+                    )
+                    .order_by(
+                        models.SigningKey.created_at.desc(),
+                        models.SigningKey.kid.desc(),
+                    )
+                    .all()
+                )
+                active = [row for row in rows if row.retired_at is None]
+                if not active and create:
+                    row = models.SigningKey(
+                        kid=secrets.token_hex(8), secret=generate_random_secret_key()
+                    )
+                    db.add(row)
+                    db.commit()
+                    logger.info("生成新的JWT签名密钥: kid=%s", row.kid)
+                    rows.insert(0, row)
+                    active = [row]
+                if active:
+                    self._keys = {row.kid: row.secret for row in rows}
+                    self._active = (active[0].kid, active[0].secret)
+                else:
+                    logger.warning("数据库中没有可用的JWT签名密钥，继续使用已加载的密钥")
+                    self._keys.update((row.kid, row.secret) for row in rows)
+                self._loaded_at = time.monotonic()
+
+    def signing_key(self) -> Tuple[str, str]:
+        if self.backend == "database" and (self._active is None or self._stale()):
+            self.reload()
+        return self._active
+
+    def verification_key(self, kid: Optional[str]) -> Optional[str]:
+        if self.backend == "database" and (self._active is None or self._stale()):
+            self.reload()
+        if kid is None:
+            # 兼容未携带 kid 的令牌
+            return self._active[1]
+        secret = self._keys.get(kid)
+        if secret is None and self.backend == "database":
+            # 其他进程刚轮换出的新密钥；未知 kid 触发的重新加载最多每秒一次
+            if time.monotonic() - self._miss_reload_at > 1.0:
+                self._miss_reload_at = time.monotonic()
+                self.reload()
+                secret = self._keys.get(kid)
+        return secret
+
+
+def rotate_signing_key() -> str:
+    """生成新的签名密钥并停用旧密钥，删除已过保留期的密钥，返回新 kid"""
+    from . import models
+    from .database import SessionLocal
+
+    now = datetime.utcnow()
+    cutoff = now - timedelta(minutes=JWT_KEY_RETENTION_MINUTES)
+    with SessionLocal() as db:
+        db.query(models.SigningKey).filter(
+            models.SigningKey.retired_at.isnot(None),
+            models.SigningKey.retired_at < cutoff,
+        ).delete(synchronize_session=False)
+        db.query(models.SigningKey).filter(
+            models.SigningKey.retired_at.is_(None)
+        ).update({"retired_at": now}, synchronize_session=False)
+        row = models.SigningKey(
+            kid=secrets.token_hex(8),
+            secret=generate_random_secret_key(),
+            created_at=now,
+        )
+        db.add(row)
+        db.commit()
+        kid = row.kid
+    if keyring.backend == "database":
+        keyring.reload()
+    return kid
+
+
+keyring = KeyRing(JWT_KEYRING)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -26,15 +179,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti 用于按令牌吊销，iat 用于按用户吊销（见 token_denylist.py）
+    to_encode.update(
+        {"exp": expire, "iat": datetime.utcnow(), "jti": secrets.token_urlsafe(12)}
+    )
+    kid, secret = keyring.signing_key()
+    encoded_jwt = jwt.encode(
+        to_encode, secret, algorithm=ALGORITHM, headers={"kid": kid}
+    )
     return encoded_jwt
 
 
 def verify_token(token: str):
     """验证JWT令牌"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        kid = jwt.get_unverified_header(token).get("kid")
+        secret = keyring.verification_key(kid)
+        if secret is None:
+            return None
+        payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
+        if denylist.is_revoked(payload):
+            return None
         return payload
     except JWTError:
         return None
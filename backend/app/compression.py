@@ -0,0 +1,203 @@
+"""
+行程数据压缩存储
+
+trip_data 列使用 CompressedJSON 类型：开启压缩时以 zstd 帧（可选共享训练字典）
+写入，读取时根据内容自动识别压缩帧或明文 JSON，因此新旧数据可以共存，
+路由层无需感知。
+
+环境变量:
+    TRIP_DATA_COMPRESSION      none（默认）或 zstd
+    TRIP_DATA_ZSTD_LEVEL       压缩级别，默认 3
+    TRIP_DATA_ZSTD_DICT_DIR    训练字典目录，文件名为 <dict_id>.zdict
+    TRIP_DATA_ZSTD_DICT_ID     写入时使用的字典ID，默认使用目录中最新的字典
+
+PostgreSQL 上开启压缩前需先用 compress_trip_data.py alter-column 将列改为 bytea；
+SQLite 列类型是动态的，无需修改表结构。
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import JSON, LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，仅在开启压缩时需要
+    zstandard = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# zstd 帧的魔数，明文 JSON 不可能以这四个字节开头
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+ZSTD_LEVEL = int(os.getenv("TRIP_DATA_ZSTD_LEVEL", "3"))
+ZSTD_DICT_DIR = os.getenv("TRIP_DATA_ZSTD_DICT_DIR", "./zstd_dicts")
+
+_mode = os.getenv("TRIP_DATA_COMPRESSION", "none").lower()
+
+
+def compression_mode() -> str:
+    return _mode
+
+
+def set_compression_mode(mode: str):
+    """切换写入时的压缩模式（迁移工具与基准测试使用）"""
+    global _mode
+    mode = mode.lower()
+    if mode not in ("none", "zstd"):
+        raise ValueError(f"未知的压缩模式: {mode}")
+    if mode == "zstd" and zstandard is None:
+        raise RuntimeError("开启 zstd 压缩需要安装 zstandard")
+    _mode = mode
+
+
+class ZstdDictionaryStore:
+    """按字典ID加载训练字典，并为每个线程缓存压缩器与解压器"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._dicts: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active_id: Optional[int] = None
+
+    def _path(self, dict_id: int) -> str:
+        return os.path.join(self.directory, f"{dict_id}.zdict")
+
+    def get(self, dict_id: int):
+        """获取指定ID的字典，0 表示不使用字典"""
+        if dict_id == 0:
+            return None
+        if dict_id not in self._dicts:
+            with self._lock:
+                if dict_id not in self._dicts:
+                    with open(self._path(dict_id), "rb") as f:
+                        zdict = zstandard.ZstdCompressionDict(f.read())
+                    zdict.precompute_compress(level=ZSTD_LEVEL)
+                    self._dicts[dict_id] = zdict
+        return self._dicts[dict_id]
+
+    def active_id(self) -> int:
+        """写入时使用的字典ID，目录中没有字典时为 0"""
+        if self._active_id is None:
+            configured = os.getenv("TRIP_DATA_ZSTD_DICT_ID")
+            if configured:
+                self._active_id = int(configured)
+            else:
+                self._active_id = self._latest_id()
+        return self._active_id
+
+    def _latest_id(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+        files = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".zdict")
+        ]
+        if not files:
+            return 0
+        latest = max(files, key=os.path.getmtime)
+        return int(os.path.basename(latest)[: -len(".zdict")])
+
+    def save(self, zdict) -> int:
+        """保存训练好的字典并设为当前写入字典"""
+        os.makedirs(self.directory, exist_ok=True)
+        dict_id = zdict.dict_id()
+        with open(self._path(dict_id), "wb") as f:
+            f.write(zdict.as_bytes())
+        with self._lock:
+            self._dicts.pop(dict_id, None)
+        self._active_id = dict_id
+        self._local = threading.local()
+        return dict_id
+
+    def compressor(self):
+        dict_id = self.active_id()
+        cache = self._local.__dict__.setdefault("compressors", {})
+        if dict_id not in cache:
+            cache[dict_id] = zstandard.ZstdCompressor(
+                level=ZSTD_LEVEL, dict_data=self.get(dict_id), write_dict_id=True
+            )
+        return cache[dict_id]
+
+    def decompressor(self, dict_id: int):
+        cache = self._local.__dict__.setdefault("decompressors", {})
+        if dict_id not in cache:
+            cache[dict_id] = zstandard.ZstdDecompressor(dict_data=self.get(dict_id))
+        return cache[dict_id]
+
+
+dictionary_store = ZstdDictionaryStore(ZSTD_DICT_DIR)
+
+
+def train_dictionary(samples: List[bytes], dict_size: int = 112640) -> int:
+    """用样本训练共享字典，返回字典ID"""
+    if zstandard is None:
+        raise RuntimeError("训练字典需要安装 zstandard")
+    zdict = zstandard.train_dictionary(dict_size, samples, level=ZSTD_LEVEL)
+    return dictionary_store.save(zdict)
+
+
+def encode_json(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compress_value(value: Any) -> bytes:
+    return dictionary_store.compressor().compress(encode_json(value))
+
+
+def decompress_value(data: bytes) -> Any:
+    if zstandard is None:
+        raise RuntimeError("读取压缩的行程数据需要安装 zstandard")
+    dict_id = zstandard.get_frame_parameters(data).dict_id
+    return json.loads(dictionary_store.decompressor(dict_id).decompress(data))
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    透明压缩的 JSON 类型
+
+    写入：压缩模式为 zstd 时写入 zstd 帧，否则写入 JSON 文本。
+    读取：自动识别 zstd 帧、JSON 文本或驱动已解析的对象。
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        # 仅影响建表DDL：开启压缩时新建的列为二进制类型
+        if compression_mode() == "zstd":
+            return dialect.type_descriptor(LargeBinary())
+        return dialect.type_descriptor(JSON())
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            if compression_mode() == "zstd":
+                return compress_value(value)
+            return encode_json(value).decode("utf-8")
+
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None or isinstance(value, (dict, list)):
+                return value
+            if isinstance(value, memoryview):
+                value = value.tobytes()
+            if isinstance(value, bytes):
+                if value[:4] == ZSTD_MAGIC:
+                    return decompress_value(value)
+                value = value.decode("utf-8")
+            return json.loads(value)
+
+        return process
@@ -1,23 +1,244 @@
-from sqlalchemy import create_engine, MetaData
+from fastapi import Depends
+from sqlalchemy import create_engine, event, MetaData
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+import itertools
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from .db_pool import instrument_engine, pool_options
+
 # 加载环境变量
 load_dotenv()
 
 # 数据库URL
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 
-# 创建数据库引擎
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+# SQLite运行配置：default 与旧版行为一致；production 开启 WAL、连接级 PRAGMA、
+# 读写分离的连接池，并由单个写线程合并提交（见 db_writer.py）
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default").lower()
+SQLITE_PRODUCTION = (
+    IS_SQLITE
+    and SQLITE_PROFILE == "production"
+    and ":memory:" not in SQLALCHEMY_DATABASE_URL
 )
 
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # 负数表示以 KiB 为单位
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536")),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+
+def _sqlite_connect_listener(read_only: bool):
+    def on_connect(dbapi_connection, connection_record):
+        # 由 SQLAlchemy 显式发出 BEGIN，使 SAVEPOINT 与 BEGIN IMMEDIATE 可用
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return on_connect
+
+
+# 创建数据库引擎
+if SQLITE_PRODUCTION:
+    # 写连接池只有一个连接，进程内的写操作在此排队，不再相互争锁
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **pool_options(pool_size=1, max_overflow=0),
+    )
+    event.listen(engine, "connect", _sqlite_connect_listener(read_only=False))
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(conn):
+        # 写事务开始即获取写锁，避免读升级为写时的 SQLITE_BUSY
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    # WAL 下读连接互不阻塞，常驻 SQLITE_READ_POOL_SIZE 个，高峰时不限溢出，
+    # 避免同步查询在事件循环上等待连接而卡住其他请求
+    read_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **pool_options(pool_size=SQLITE_READ_POOL_SIZE, max_overflow=-1),
+    )
+    event.listen(read_engine, "connect", _sqlite_connect_listener(read_only=True))
+
+    @event.listens_for(read_engine, "begin")
+    def _begin_deferred(conn):
+        conn.exec_driver_sql("BEGIN")
+
+elif IS_SQLITE and (
+    ":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL == "sqlite://"
+):
+    # 内存数据库使用 SQLAlchemy 默认的单连接池
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    read_engine = engine
+
+elif IS_SQLITE:
+    # SQLite 文件连接开销很小，未显式设置 DB_MAX_OVERFLOW 时不限溢出：路由在事件循环上
+    # 同步取连接，池耗尽时持有连接的请求无法推进，只能等到超时
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **pool_options(max_overflow=None if "DB_MAX_OVERFLOW" in os.environ else -1),
+    )
+    read_engine = engine
+
+else:
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options())
+    read_engine = engine
+
+instrument_engine(engine, "primary")
+if read_engine is not engine:
+    instrument_engine(read_engine, "read")
+
+# 只读副本：逗号分隔的数据库URL。只有声明了 get_read_db 依赖的请求会读副本；
+# 本地可复制一份 SQLite 文件作为副本测试路由
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+# 用户写入后在该时间窗口内，其读请求仍发往主库，保证读到自己的写入
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+
+def _create_replica_engine(url: str):
+    if not url.startswith("sqlite"):
+        return create_engine(url, **pool_options())
+    replica = create_engine(
+        url, connect_args={"check_same_thread": False}, **pool_options()
+    )
+
+    @event.listens_for(replica, "connect")
+    def _query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return replica
+
+
+replica_engines = [_create_replica_engine(url) for url in DATABASE_REPLICA_URLS]
+for _index, _replica in enumerate(replica_engines):
+    instrument_engine(_replica, f"replica{_index}")
+_replica_cycle = itertools.cycle(replica_engines)
+
+
+class RecentWriters:
+    """记录最近发生过写入的用户及粘滞截止时间（进程内）"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._deadlines = {}
+        self._lock = threading.Lock()
+
+    def mark(self, principal: str):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._deadlines) > 10000:
+                self._deadlines = {
+                    key: deadline
+                    for key, deadline in self._deadlines.items()
+                    if deadline > now
+                }
+            self._deadlines[principal] = now + self.window
+
+    def is_sticky(self, principal) -> bool:
+        deadline = self._deadlines.get(principal)
+        return deadline is not None and deadline > time.monotonic()
+
+
+recent_writers = RecentWriters(READ_YOUR_WRITES_SECONDS)
+
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip()[:6].upper().startswith("SELECT")
+    return False
+
+
+class RoutingSession(Session):
+    """
+    读写路由会话
+
+    查询发往只读引擎，flush 与 INSERT/UPDATE/DELETE 发往写引擎；
+    同一事务内一旦发生写入，后续查询也走写引擎，以读到未提交的修改。
+    会话标记了 replica_reads 且配置了副本时，查询改发副本，
+    但当前用户（info["principal"]）最近写入过则仍走主库。
+    未配置读写分离与副本时行为与普通 Session 一致。
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if read_engine is engine and not replica_engines:
+            return engine
+        transaction = self.get_transaction()
+        if self._flushing or _is_write(clause):
+            if transaction is None:
+                # 会话首个语句即为写入时事务尚未自动开启，先显式开启以便记录
+                transaction = self.begin()
+            self.info["write_transaction"] = transaction
+            self.info["wrote"] = True
+            return engine
+        if (
+            transaction is not None
+            and self.info.get("write_transaction") is transaction
+        ):
+            return engine
+        if (
+            replica_engines
+            and self.info.get("replica_reads")
+            and not recent_writers.is_sticky(self.info.get("principal"))
+        ):
+            # 同一会话固定使用一个副本，避免在副本间读到不同进度的数据
+            replica = self.info.get("replica")
+            if replica is None:
+                replica = self.info["replica"] = next(_replica_cycle)
+            return replica
+        return read_engine
+
+
+def record_write(session: Session):
+    """记录会话所属用户刚发生写入，开启读己之写的粘滞窗口"""
+    principal = session.info.get("principal")
+    if principal is not None and replica_engines:
+        recent_writers.mark(principal)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if session.info.pop("wrote", False):
+        record_write(session)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("wrote", None)
+
+
 # 创建SessionLocal类
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine
+)
 
 # 创建Base类
 Base = declarative_base()
@@ -25,10 +246,22 @@ Base = declarative_base()
 # 创建metadata
 metadata = MetaData()
 
+
 # 依赖函数，用于获取数据库会话
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db(db: Session = Depends(get_db)):
+    """
+    只读请求的数据库会话：与 get_db 是同一个会话，但查询可发往只读副本。
+
+    以路由级依赖声明（dependencies=[Depends(get_read_db)]），保证在
+    认证依赖查询用户之前生效。
+    """
+    db.info["replica_reads"] = True
+    return db
@@ -0,0 +1,161 @@
+"""
+数据库连接池配置与指标
+
+连接池参数从环境变量读取（PostgreSQL 多节点部署时按实例规格调整）：
+    DB_POOL_SIZE          常驻连接数，默认 5
+    DB_MAX_OVERFLOW       允许临时超出的连接数，默认 10（SQLite 文件数据库默认不限）
+    DB_POOL_TIMEOUT       获取连接的最长等待秒数，默认 30
+    DB_POOL_RECYCLE       连接最长存活秒数，-1 表示不回收，默认 -1
+    DB_POOL_PRE_PING      取出连接前先探活，默认 false
+    DB_POOL_WARMUP        启动时预热的连接数，默认等于 DB_POOL_SIZE
+
+每个连接池导出获取连接的等待时间分布、取出次数、超时次数、新建连接数，
+以及当前的池大小、已取出与溢出连接数。
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from .metrics import REGISTRY
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+
+POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_checkout_wait_seconds",
+    "从连接池获取连接的等待时间（含按需新建连接）",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_CHECKOUTS = REGISTRY.counter(
+    "db_pool_checkouts", "从连接池取出连接的次数", ["pool"]
+)
+POOL_TIMEOUTS = REGISTRY.counter(
+    "db_pool_checkout_timeouts", "等待连接超时的次数", ["pool"]
+)
+POOL_CONNECTS = REGISTRY.counter("db_pool_connects", "新建数据库连接的次数", ["pool"])
+POOL_SIZE = REGISTRY.gauge("db_pool_size", "连接池常驻连接数", ["pool"])
+POOL_CHECKED_OUT = REGISTRY.gauge("db_pool_checked_out", "当前已取出的连接数", ["pool"])
+POOL_OVERFLOW = REGISTRY.gauge("db_pool_overflow", "当前溢出连接数", ["pool"])
+
+
+class _PoolMetrics:
+    def __init__(self, name: str):
+        self.wait = POOL_WAIT_SECONDS.labels(name)
+        self.checkouts = POOL_CHECKOUTS.labels(name)
+        self.timeouts = POOL_TIMEOUTS.labels(name)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录获取连接等待时间的 QueuePool"""
+
+    metrics = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 正在等待连接的线程 -> 开始等待的时间
+        self._waiting: Dict[int, float] = {}
+
+    def longest_wait(self) -> float:
+        """仍在等待连接的请求中最长的已等待秒数，没有等待时为 0"""
+        waiting = list(self._waiting.values())
+        return time.perf_counter() - min(waiting) if waiting else 0.0
+
+    def _do_get(self):
+        metrics = self.metrics
+        started = time.perf_counter()
+        thread_id = threading.get_ident()
+        self._waiting[thread_id] = started
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if metrics is not None:
+                metrics.timeouts.inc()
+            raise
+        finally:
+            self._waiting.pop(thread_id, None)
+        if metrics is not None:
+            metrics.wait.observe(time.perf_counter() - started)
+            metrics.checkouts.inc()
+        return connection
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，指标需要延续
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def pool_options(pool_size: int = None, max_overflow: int = None) -> Dict[str, Any]:
+    """create_engine 的连接池参数，未指定的取环境变量配置"""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE if pool_size is None else pool_size,
+        "max_overflow": DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def instrument_engine(engine: Engine, name: str):
+    """为引擎的连接池注册指标，name 作为指标的 pool 标签"""
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.metrics = _PoolMetrics(name)
+        POOL_SIZE.labels(name).set_function(lambda: engine.pool.size())
+        POOL_CHECKED_OUT.labels(name).set_function(lambda: engine.pool.checkedout())
+        POOL_OVERFLOW.labels(name).set_function(lambda: max(engine.pool.overflow(), 0))
+
+    connects = POOL_CONNECTS.labels(name)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        connects.inc()
+
+
+def warm_pool(engine: Engine, connections: int = None):
+    """
+    启动时同时取出若干连接并执行 SELECT 1，使连接池提前建立连接；
+    数据库不可用时抛出异常，让部署尽早失败。
+    """
+    if connections is None:
+        connections = DB_POOL_WARMUP
+    if isinstance(engine.pool, QueuePool):
+        connections = min(connections, engine.pool.size())
+    connections = max(connections, 1)
+
+    started = time.perf_counter()
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+            connection.rollback()
+    except Exception as e:
+        logger.error("数据库连接池预热失败: %s", e)
+        raise
+    finally:
+        for connection in opened:
+            connection.close()
+    logger.info(
+        "数据库连接池预热完成: %s 个连接, 耗时 %.1f ms",
+        len(opened),
+        (time.perf_counter() - started) * 1000,
+    )
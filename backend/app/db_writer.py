@@ -0,0 +1,188 @@
+"""
+SQLite 单写线程与合并提交
+
+SQLite 同一时刻只允许一个写事务。production 配置下，写任务（接收 Session
+的函数）提交到队列，由一个专用线程按批取出：每个任务在独立的 SAVEPOINT 中
+执行，单个任务失败只回滚自己；一批任务共用一次 COMMIT，减少提交次数。
+非 production 配置下 run_write 直接在请求的会话中执行并提交，行为与旧版一致。
+
+写连接池只有一个连接（由写线程使用），其他代码不应直接在请求会话中提交：
+路由通过 run_write 提交写任务；没有请求会话的同步代码（线程池或后台线程中）
+使用 run_write_blocking。
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from .database import SQLITE_PRODUCTION, engine, record_write
+
+logger = logging.getLogger(__name__)
+
+WRITER_MAX_BATCH = int(os.getenv("SQLITE_WRITER_MAX_BATCH", "64"))
+
+WriteJob = Callable[[Session], Any]
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """单写线程：合并多个写任务到同一事务提交"""
+
+    def __init__(
+        self, session_factory: sessionmaker, max_batch: int = WRITER_MAX_BATCH
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.jobs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(
+            target=self._loop, name="sqlite-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, job: WriteJob) -> Future:
+        future: Future = Future()
+        self._queue.put((job, future))
+        return future
+
+    async def run(self, job: WriteJob) -> Any:
+        return await asyncio.wrap_future(self.submit(job))
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._execute(batch)
+            if stop:
+                return
+
+    def _execute(self, batch: List[Tuple[WriteJob, Future]]):
+        outcomes = []
+        session = self.session_factory()
+        try:
+            for job, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                savepoint = session.begin_nested()
+                try:
+                    result = job(session)
+                    session.flush()
+                    savepoint.commit()
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    savepoint.rollback()
+                    outcomes.append((future, None, e))
+            session.commit()
+        except Exception as e:
+            logger.error("写线程批量提交失败: %s", e)
+            session.rollback()
+            for job, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            session.close()
+
+        self.batches += 1
+        self.jobs += len(outcomes)
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# 写线程使用的会话：提交后不过期对象，任务返回的 ORM 对象在响应序列化时仍可读取
+WriterSessionLocal = sessionmaker(
+    bind=engine, autocommit=False, autoflush=False, expire_on_commit=False
+)
+
+writer = GroupCommitWriter(WriterSessionLocal)
+
+
+def start_writer():
+    if SQLITE_PRODUCTION:
+        writer.start()
+
+
+def stop_writer():
+    writer.stop()
+
+
+async def run_write(db: Session, job: WriteJob) -> Any:
+    """
+    执行写任务：production 配置下交给写线程合并提交，
+    否则在当前请求的会话中执行并立即提交。
+
+    任务需要返回的 ORM 对象应在任务内 flush 并 refresh，确保属性已加载。
+    """
+    if writer.running:
+        result = await writer.run(job)
+        record_write(db)
+        return result
+    try:
+        result = job(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+
+def run_write_blocking(job: WriteJob) -> Any:
+    """
+    在没有请求会话的同步代码中执行写任务，阻塞当前线程直到提交
+
+    production 配置下交给写线程，否则在独立的会话中执行并提交。
+    只能在线程池或后台线程中调用：在事件循环线程中调用会阻塞事件循环，
+    在写线程中（写任务内）调用会死锁。
+    """
+    if writer.running:
+        return writer.submit(job).result()
+    with WriterSessionLocal() as session:
+        try:
+            result = job(session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return result
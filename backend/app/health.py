@@ -0,0 +1,239 @@
+"""
+存活与就绪检查
+
+存活（/health、/health/live）只表示进程能响应请求，用于容器重启判断。
+就绪（/health/ready）检查以下依赖，任一关键项失败时返回 503，负载均衡器
+据此暂停向该 worker 转发请求：
+
+- database     各引擎执行 SELECT 1（在线程池中执行，带超时；SQLite 写连接
+               经由写线程执行）
+- pool         没有等待连接超过 READINESS_MAX_POOL_WAIT_MS 的请求（按等待时间
+               判断，SQLite 写连接池只有一个连接，占用本身不代表饱和）
+- event_loop   事件循环调度延迟不超过 READINESS_MAX_LOOP_LAG_MS
+- workers      SQLite 写线程队列与线程池排队任务数不超过上限
+- recognizer   与 XUNFEI_WS_BASE_URL 的 TCP 连通性（默认不检查；开启后默认
+               只作为降级信息，不影响就绪结果）
+
+检查结果缓存 READINESS_CACHE_SECONDS 秒，并发的探测共用同一次检查。
+
+环境变量:
+    READINESS_CACHE_SECONDS            默认 2
+    READINESS_DB_TIMEOUT_SECONDS       默认 2
+    READINESS_MAX_POOL_WAIT_MS         默认 1000
+    READINESS_MAX_LOOP_LAG_MS          默认 200
+    READINESS_MAX_WRITER_QUEUE         默认 1000
+    READINESS_MAX_THREADPOOL_WAITING   默认 100
+    READINESS_CHECK_RECOGNIZER         默认 false
+    READINESS_RECOGNIZER_REQUIRED      默认 false
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import anyio.to_thread
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from .database import engine, read_engine, replica_engines
+from .db_pool import InstrumentedQueuePool
+from .db_writer import writer
+from .loop_monitor import loop_monitor
+from .routers.speech import XUNFEI_WS_BASE_URL
+
+load_dotenv()
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "false").lower() in ("1", "true", "yes")
+
+
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "2"))
+READINESS_DB_TIMEOUT_SECONDS = float(os.getenv("READINESS_DB_TIMEOUT_SECONDS", "2"))
+READINESS_MAX_POOL_WAIT_MS = float(os.getenv("READINESS_MAX_POOL_WAIT_MS", "1000"))
+READINESS_MAX_LOOP_LAG_MS = float(os.getenv("READINESS_MAX_LOOP_LAG_MS", "200"))
+READINESS_MAX_WRITER_QUEUE = int(os.getenv("READINESS_MAX_WRITER_QUEUE", "1000"))
+READINESS_MAX_THREADPOOL_WAITING = int(
+    os.getenv("READINESS_MAX_THREADPOOL_WAITING", "100")
+)
+READINESS_CHECK_RECOGNIZER = _env_flag("READINESS_CHECK_RECOGNIZER")
+READINESS_RECOGNIZER_REQUIRED = _env_flag("READINESS_RECOGNIZER_REQUIRED")
+
+# 与语音路由连接同一个识别服务（XUNFEI_WS_BASE_URL 可指向压测用的模拟服务）
+_recognizer = urlsplit(XUNFEI_WS_BASE_URL)
+RECOGNIZER_HOST = _recognizer.hostname
+RECOGNIZER_PORT = _recognizer.port or (443 if _recognizer.scheme == "wss" else 80)
+
+# 检查项结果：(是否通过, 详情)
+CheckResult = Tuple[bool, Dict]
+
+
+def _engines() -> List[Tuple[str, Engine]]:
+    engines = [("primary", engine)]
+    if read_engine is not engine:
+        engines.append(("read", read_engine))
+    engines.extend(
+        (f"replica{index}", replica) for index, replica in enumerate(replica_engines)
+    )
+    return engines
+
+
+def _ping(bind: Engine):
+    with bind.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def _ping_session(session):
+    session.execute(text("SELECT 1"))
+
+
+async def check_database() -> CheckResult:
+    details = {}
+    ok = True
+    for name, bind in _engines():
+        started = time.perf_counter()
+        if writer.running and bind is engine:
+            # 写连接由写线程独占，经写线程队列探测（同时反映排队延迟）
+            probe = writer.run(_ping_session)
+        else:
+            probe = run_in_threadpool(_ping, bind)
+        try:
+            await asyncio.wait_for(probe, READINESS_DB_TIMEOUT_SECONDS)
+            details[name] = {"latency_ms": _ms(time.perf_counter() - started)}
+        except asyncio.TimeoutError:
+            ok = False
+            details[name] = {"error": "timeout"}
+        except Exception as e:
+            ok = False
+            details[name] = {"error": str(e)}
+    return ok, details
+
+
+def check_pools() -> CheckResult:
+    details = {}
+    ok = True
+    for name, bind in _engines():
+        pool = bind.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        entry = {
+            "checked_out": pool.checkedout(),
+            "size": pool.size(),
+            "overflow": max(pool.overflow(), 0),
+        }
+        if isinstance(pool, InstrumentedQueuePool):
+            wait = pool.longest_wait()
+            entry["longest_wait_ms"] = _ms(wait)
+            if wait * 1000 > READINESS_MAX_POOL_WAIT_MS:
+                ok = False
+        details[name] = entry
+    return ok, details
+
+
+async def check_event_loop() -> CheckResult:
+    """
+    测量一次调度延迟：call_soon 的回调到实际执行之间的时间。
+    开启了事件循环监控时同时参考其最近一次测得的延迟。
+    """
+    loop = asyncio.get_running_loop()
+    scheduled = time.perf_counter()
+    ran = loop.create_future()
+    loop.call_soon(lambda: ran.set_result(time.perf_counter()))
+    lag = await ran - scheduled
+    if loop_monitor.running:
+        lag = max(lag, loop_monitor.last_lag)
+    return lag * 1000 <= READINESS_MAX_LOOP_LAG_MS, {"lag_ms": _ms(lag)}
+
+
+def check_workers() -> CheckResult:
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    details = {
+        "threadpool_busy": statistics.borrowed_tokens,
+        "threadpool_size": int(statistics.total_tokens),
+        "threadpool_waiting": statistics.tasks_waiting,
+    }
+    ok = statistics.tasks_waiting <= READINESS_MAX_THREADPOOL_WAITING
+    if writer.running:
+        details["writer_queue"] = writer.queue_depth()
+        ok = ok and details["writer_queue"] <= READINESS_MAX_WRITER_QUEUE
+    return ok, details
+
+
+async def check_recognizer() -> CheckResult:
+    started = time.perf_counter()
+    try:
+        _, stream = await asyncio.wait_for(
+            asyncio.open_connection(RECOGNIZER_HOST, RECOGNIZER_PORT),
+            READINESS_DB_TIMEOUT_SECONDS,
+        )
+        stream.close()
+        return True, {"latency_ms": _ms(time.perf_counter() - started)}
+    except (OSError, asyncio.TimeoutError) as e:
+        return False, {"error": repr(e)}
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+class ReadinessProbe:
+    """带短时缓存的就绪检查，并发的探测共用一次检查"""
+
+    def __init__(self, cache_seconds: float = READINESS_CACHE_SECONDS):
+        self.cache_seconds = cache_seconds
+        self._result: Optional[Dict] = None
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def check(self) -> Dict:
+        if self._fresh():
+            return self._result
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._fresh():
+                self._result = await self._run()
+                self._checked_at = time.monotonic()
+        return self._result
+
+    def _fresh(self) -> bool:
+        return (
+            self._result is not None
+            and time.monotonic() - self._checked_at < self.cache_seconds
+        )
+
+    async def _run(self) -> Dict:
+        checks: Dict[str, CheckResult] = {}
+        checks["event_loop"] = await check_event_loop()
+        checks["database"] = await check_database()
+        checks["pool"] = check_pools()
+        checks["workers"] = check_workers()
+        ready = all(ok for ok, _ in checks.values())
+        degraded = False
+        if READINESS_CHECK_RECOGNIZER:
+            checks["recognizer"] = await check_recognizer()
+            if not checks["recognizer"][0]:
+                if READINESS_RECOGNIZER_REQUIRED:
+                    ready = False
+                else:
+                    degraded = True
+
+        status = "ready" if ready else "not_ready"
+        if ready and degraded:
+            status = "degraded"
+        return {
+            "status": status,
+            "ready": ready,
+            "checks": {
+                name: {"ok": ok, **details} for name, (ok, details) in checks.items()
+            },
+        }
+
+
+readiness_probe = ReadinessProbe()
@@ -0,0 +1,165 @@
+"""
+业务编号分配
+
+编号由 id_counters 表中的计数器行分配：每次用一条
+UPDATE ... SET next_value = next_value + n RETURNING 原子地预留一段编号，
+不再统计全表行数，并发注册也不会拿到重复编号。
+
+预留的段大小由 USER_ID_BLOCK_SIZE 控制（hi-lo 方式）。默认 1，即每个
+编号一次计数器更新，编号连续；多进程部署可调大以减少对计数器行的争用，
+代价是进程重启时会留下编号空洞。
+
+编号在写任务的事务中分配（与插入用户同一事务，经由单写线程提交），
+不另取写连接。新预留的段记录在会话中，归属预留它的事务（或 SAVEPOINT）：
+该事务回滚时计数器的更新随之撤销，段也一并丢弃；SAVEPOINT 释放后归属外层
+事务，最外层事务提交后剩余的编号才供其他会话分配。单写线程在一个批次中
+逐个回滚失败任务的 SAVEPOINT，同批的后续任务不会再用到已撤销的段。
+"""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import engine
+
+load_dotenv()
+
+USER_ID_BLOCK_SIZE = int(os.getenv("USER_ID_BLOCK_SIZE", "1"))
+
+_counters = models.IdCounter.__table__
+
+# 会话 info 中的键：未提交的段（分配器 -> [下一个编号, 上限, 所属事务]）、最近一次提交标记
+_PENDING = "id_allocator_pending"
+_COMMITTED = "id_allocator_committed"
+
+
+class HiLoAllocator:
+    """按段从计数器预留编号，段内编号在进程内分配"""
+
+    def __init__(self, bind: Engine, name: str, column, block_size: int = 1):
+        self.bind = bind
+        self.name = name
+        # 计数器行不存在时，从该列现有最大值之后开始
+        self.column = column
+        self.block_size = max(block_size, 1)
+        self._next = 0
+        self._limit = 0
+        self._lock = threading.Lock()
+
+    def allocate(self, session: Session) -> int:
+        """
+        分配一个编号，段用完时在 session 当前的事务中预留新段
+
+        由调用方提交（通常在 run_write 的写任务中，与插入同一事务）。
+        """
+        pending = session.info.setdefault(_PENDING, {}).get(self)
+        if pending is not None and pending[0] < pending[1]:
+            pending[0] += 1
+            return pending[0] - 1
+        with self._lock:
+            if self._next < self._limit:
+                self._next += 1
+                return self._next - 1
+        start = self._reserve(session.connection(), self.block_size)
+        transaction = session.get_nested_transaction() or session.get_transaction()
+        session.info[_PENDING][self] = [
+            start + 1,
+            start + self.block_size,
+            transaction,
+        ]
+        return start
+
+    def resync(self, session: Session):
+        """
+        计数器落后于该列已有的最大值时（如手工插入带编号的行），把计数器移到其后
+
+        同时丢弃进程内与会话中的段，其中的编号可能已被占用。
+        """
+        conn = session.connection()
+        taken = conn.execute(select(func.max(self.column))).scalar() or 0
+        conn.execute(
+            update(_counters)
+            .where(_counters.c.name == self.name, _counters.c.next_value <= taken)
+            .values(next_value=taken + 1)
+        )
+        session.info.get(_PENDING, {}).pop(self, None)
+        with self._lock:
+            self._next = self._limit = 0
+
+    def _adopt(self, next_value: int, limit: int):
+        """已提交的段供其他会话使用（进程内只保留一个段，多余的留作空洞）"""
+        with self._lock:
+            if self._next >= self._limit:
+                self._next, self._limit = next_value, limit
+
+    def reserve(self, count: int) -> int:
+        """在独立的短事务中一次预留连续的 count 个编号（批量导入使用），返回第一个"""
+        with self.bind.begin() as conn:
+            return self._reserve(conn, count)
+
+    def _reserve(self, conn: Connection, count: int) -> int:
+        """预留 count 个编号，返回第一个"""
+        statement = (
+            update(_counters)
+            .where(_counters.c.name == self.name)
+            .values(next_value=_counters.c.next_value + count)
+            .returning(_counters.c.next_value)
+        )
+        for _ in range(2):
+            end = conn.execute(statement).scalar()
+            if end is not None:
+                return end - count
+            start = conn.execute(select(func.max(self.column))).scalar() or 0
+            try:
+                with conn.begin_nested():
+                    conn.execute(
+                        insert(_counters).values(
+                            name=self.name, next_value=start + 1 + count
+                        )
+                    )
+            except IntegrityError:
+                # 其他进程同时创建了计数器行，重试更新
+                continue
+            return start + 1
+        raise RuntimeError(f"无法初始化编号计数器: {self.name}")
+
+
+user_id_allocator = HiLoAllocator(
+    engine, "users.userID", models.User.userID, USER_ID_BLOCK_SIZE
+)
+
+
+def allocate_user_id(session: Session) -> int:
+    return user_id_allocator.allocate(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    # SAVEPOINT 释放时同样触发，由 after_transaction_end 按层级处理
+    if session.info.get(_PENDING):
+        session.info[_COMMITTED] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    committed = session.info.pop(_COMMITTED, False)
+    pending = session.info.get(_PENDING)
+    if not pending:
+        return
+    for allocator, block in list(pending.items()):
+        if block[2] is not transaction:
+            continue
+        if not committed:
+            # 预留随事务回滚撤销，计数器会再次分配这些编号
+            del pending[allocator]
+        elif transaction.parent is not None:
+            block[2] = transaction.parent
+        else:
+            del pending[allocator]
+            allocator._adopt(block[0], block[1])
@@ -0,0 +1,174 @@
+"""
+请求与数据库指标采集
+
+- MetricsMiddleware：纯 ASGI 中间件，按 方法 + 路由模板 统计请求数、
+  延迟分布与进行中的请求数。每个路由的子指标首次出现时绑定并缓存，
+  之后每个请求只做字典查找和几次整数/浮点累加。
+- install_sql_metrics：通过 SQLAlchemy 游标事件统计各类语句的次数与耗时。
+- observe_upstream：记录外部服务（讯飞、地理编码、LLM 等）调用耗时。
+- sql_trace：当前请求的 SQL 明细收集列表（由请求剖析开启），未开启时为 None。
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import REGISTRY
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests", "HTTP请求数", ["method", "route", "status"]
+)
+HTTP_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP请求处理耗时", ["method", "route"]
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "正在处理的HTTP请求数")
+
+DB_QUERIES = REGISTRY.counter("db_queries", "执行的SQL语句数", ["operation"])
+DB_QUERY_DURATION = REGISTRY.histogram(
+    "db_query_duration_seconds",
+    "SQL语句执行耗时",
+    ["operation"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "upstream_request_duration_seconds",
+    "外部服务调用耗时",
+    ["upstream", "outcome"],
+)
+
+# 未匹配任何路由的请求（404 等）归为一类，避免按原始路径产生大量标签
+UNMATCHED_ROUTE = "unmatched"
+
+
+class _RouteSeries:
+    __slots__ = ("method", "route", "duration", "statuses")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.duration = HTTP_DURATION.labels(method, route)
+        self.statuses: Dict[int, object] = {}
+
+    def record(self, status: int, elapsed: float):
+        self.duration.observe(elapsed)
+        counter = self.statuses.get(status)
+        if counter is None:
+            counter = self.statuses[status] = HTTP_REQUESTS.labels(
+                self.method, self.route, status
+            )
+        counter.inc()
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        # 以 (方法, 路由对象) 为键缓存，路由对象在应用生命周期内不变
+        self._series: Dict[Tuple[str, int], _RouteSeries] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            key = (scope["method"], id(route))
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _RouteSeries(
+                    scope["method"], _route_template(scope, route)
+                )
+            series.record(status, elapsed)
+
+
+def _route_template(scope, route) -> str:
+    """
+    路由模板（如 /api/trips/{trip_id}）。较新的 FastAPI 中 scope["route"]
+    是未加 include_router 前缀的原始路由，此时用请求路径补回前缀。
+    """
+    if route is None or not hasattr(route, "path_regex"):
+        return UNMATCHED_ROUTE
+    path = scope["path"]
+    for index, char in enumerate(path):
+        if char == "/" and route.path_regex.match(path[index:]):
+            return path[:index] + route.path
+    return route.path
+
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip()[:6].upper()
+    return keyword if keyword in _OPERATIONS else "OTHER"
+
+
+# 每项为 (语句, 耗时秒)；ContextVar 会随请求传递到线程池中的同步依赖
+sql_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "sql_trace", default=None
+)
+
+_query_series = {
+    operation: (DB_QUERIES.labels(operation), DB_QUERY_DURATION.labels(operation))
+    for operation in _OPERATIONS + ("OTHER",)
+}
+
+
+def install_sql_metrics():
+    """为所有引擎注册 SQL 计时事件（重复调用无副作用）"""
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    count, duration = _query_series[_operation(statement)]
+    count.inc()
+    duration.observe(elapsed)
+    trace = sql_trace.get()
+    if trace is not None:
+        trace.append((statement, elapsed))
+
+
+@contextmanager
+def observe_upstream(upstream: str):
+    """记录一次外部服务调用的耗时，异常时 outcome 为 error"""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        UPSTREAM_DURATION.labels(upstream, outcome).observe(
+            time.perf_counter() - started
+        )
@@ -0,0 +1,215 @@
+"""
+结构化日志
+
+- 请求线程只把 LogRecord 放入内存队列（QueueHandler），消息格式化与写出
+  由后台 QueueListener 线程完成；日志参数使用 %s 占位符延迟格式化，
+  级别未开启的日志只付出一次 isEnabledFor 判断。
+- 输出为 JSON 行（LOG_FORMAT=json，默认）或便于本地阅读的文本（text），
+  通过 extra= 传入的字段作为 JSON 的顶层键输出。
+- RequestIdMiddleware 为每个请求生成或沿用 X-Request-ID，并写入同一请求
+  产生的所有日志。
+- 可按模块设置级别，并对高频模块的低级别日志按比例采样。
+
+环境变量:
+    LOG_LEVEL          根级别，默认 INFO
+    LOG_LEVELS         按模块的级别，如 "app.routers.auth=DEBUG,sqlalchemy.engine=WARNING"
+    LOG_SAMPLE_RATES   按模块对 WARNING 以下日志采样，如 "app.routers.auth=0.1"
+    LOG_FORMAT         json（默认）或 text
+    LOG_QUEUE_SIZE     日志队列容量，默认 10000，队列满时丢弃新日志
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import sys
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord 的标准属性，其余属性视为 extra 字段
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+) | {"message", "asctime", "request_id", "taskName"}
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    mapping = {}
+    for item in value.split(","):
+        name, _, setting = item.partition("=")
+        if name.strip() and setting.strip():
+            mapping[name.strip()] = setting.strip()
+    return mapping
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    在调用线程中补充请求ID，并对配置了采样率的模块的低级别日志采样。
+    挂在 QueueHandler 上，被采样丢弃的日志不会进入队列。
+    """
+
+    def __init__(self, sample_rates: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self._rate_cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._rate_cache.get(name)
+        if rate is None:
+            rate = 1.0
+            # 取最长匹配的模块前缀
+            for prefix in sorted(self.sample_rates, key=len, reverse=True):
+                if name == prefix or name.startswith(prefix + "."):
+                    rate = self.sample_rates[prefix]
+                    break
+            self._rate_cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.sample_rates and record.levelno < logging.WARNING:
+            rate = self._rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        record.request_id = request_id.get()
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    不在调用线程中格式化的 QueueHandler。
+
+    标准 QueueHandler.prepare 会在入队前格式化消息；这里原样入队，由监听线程
+    格式化。日志参数因此会在稍后被读取，应传入不可变的值。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # 日志积压时宁可丢弃，也不阻塞请求
+            pass
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging():
+    """配置根日志器（重复调用无副作用）"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        output.setFormatter(
+            logging.Formatter(
+                "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+            )
+        )
+    else:
+        output.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = DeferredQueueHandler(log_queue)
+    sample_rates = {
+        name: float(rate)
+        for name, rate in _parse_mapping(os.getenv("LOG_SAMPLE_RATES", "")).items()
+    }
+    handler.addFilter(RequestContextFilter(sample_rates))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_mapping(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    # uvicorn 自带的处理器会绕过队列直接写出，改为交给根日志器
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """为请求分配请求ID（沿用客户端传入的 X-Request-ID），并在响应头中返回"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        current = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                current = value.decode("latin-1")[:64]
+                break
+        if not current:
+            current = secrets.token_hex(8)
+        token = request_id.set(current)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, current.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
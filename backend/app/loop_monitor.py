@@ -0,0 +1,174 @@
+"""
+事件循环延迟与阻塞调用检测
+
+开启后（LOOP_MONITOR_ENABLED=true）在事件循环中运行一个定时任务，每隔
+LOOP_MONITOR_INTERVAL_MS 醒来一次，实际醒来时间与预期之差即为调度延迟，
+写入 event_loop_lag_seconds 直方图。
+
+另有一个看门狗线程检查定时任务的心跳：心跳超过 LOOP_BLOCK_THRESHOLD_MS
+未更新，说明某个回调正在长时间占用事件循环（同步 SQL、SRP 运算等），
+此时抓取事件循环线程当前的调用栈，记录日志并保存到最近
+LOOP_MONITOR_MAX_REPORTS 条阻塞记录中（/api/admin/loop-blocks 查看）。
+阻塞结束后补记实际持续时间。
+
+开销：每个间隔一次定时器唤醒和一次直方图记录；看门狗线程每半个阈值醒来
+一次，只有发生阻塞时才抓取调用栈。
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .metrics import REGISTRY
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "200"))
+LOOP_MONITOR_MAX_REPORTS = int(os.getenv("LOOP_MONITOR_MAX_REPORTS", "20"))
+
+# 调用栈最多保留的帧数（从最内层算起）
+STACK_LIMIT = 40
+
+LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds",
+    "事件循环调度延迟",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_BLOCKS = REGISTRY.counter("event_loop_blocks", "事件循环阻塞次数（超过阈值）")
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        interval: float = LOOP_MONITOR_INTERVAL_MS / 1000,
+        threshold: float = LOOP_BLOCK_THRESHOLD_MS / 1000,
+        max_reports: int = LOOP_MONITOR_MAX_REPORTS,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self._reports = deque(maxlen=max_reports)
+        self._lock = threading.Lock()
+        self._heartbeat = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        # 当前这次阻塞对应的记录，阻塞结束后补记持续时间
+        self._open_report: Optional[Dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在事件循环中调用"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join(timeout=1)
+        self._watchdog = None
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(now - expected, 0.0)
+            self.last_lag = lag
+            LOOP_LAG.observe(lag)
+            report = self._open_report
+            if report is not None:
+                self._open_report = None
+                report["blocked_ms"] = round(lag * 1000, 1)
+                logger.warning(
+                    "事件循环阻塞结束，持续 %.1f ms",
+                    lag * 1000,
+                    extra={"block": report["id"]},
+                )
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            if heartbeat == reported_heartbeat:
+                continue
+            if time.monotonic() - heartbeat - self.interval < self.threshold:
+                continue
+            reported_heartbeat = heartbeat
+            self._capture()
+
+    def _capture(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT)
+        del frame
+        LOOP_BLOCKS.inc()
+        report = {
+            "id": int(time.time() * 1000),
+            "detected_at": time.time(),
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "blocked_ms": None,
+            "stack": "".join(stack),
+        }
+        with self._lock:
+            self._reports.append(report)
+        self._open_report = report
+        logger.warning(
+            "事件循环阻塞超过 %.0f ms，当前调用位置: %s",
+            self.threshold * 1000,
+            stack[-1].strip() if stack else "?",
+            extra={"block": report["id"], "stack": report["stack"]},
+        )
+
+    def reports(self) -> List[Dict]:
+        with self._lock:
+            return list(reversed(self._reports))
+
+
+loop_monitor = LoopMonitor()
+
+
+def start_loop_monitor():
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+
+async def stop_loop_monitor():
+    await loop_monitor.stop()
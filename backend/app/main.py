@@ -1,14 +1,58 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
 
 # 导入路由
-from .routers import auth, users, trips, speech
+from .routers import admin, auth, users, trips, speech
+from .auth import keyring
+from .database import engine, read_engine, replica_engines
+from .db_pool import warm_pool
+from .db_writer import start_writer, stop_writer
+from .health import readiness_probe
+from .models import Base
+from .instrumentation import MetricsMiddleware, install_sql_metrics
+from .logging_setup import RequestIdMiddleware, setup_logging
+from .loop_monitor import start_loop_monitor, stop_loop_monitor
+from .metrics import CONTENT_TYPE, REGISTRY
+from .profiling import ProfilingMiddleware
+from .rate_limit import RateLimitMiddleware
+from .search import init_search_index
+from .srp_auth import start_ephemeral_pool, stop_ephemeral_pool
+from .token_denylist import start_denylist, stop_denylist
 
 # 加载环境变量
 load_dotenv()
 
+# 结构化日志（JSON 行，后台线程写出）
+setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：预热连接池，确保数据表与检索索引已就绪，启动后台线程与事件循环监控"""
+    warm_pool(engine)
+    if read_engine is not engine:
+        warm_pool(read_engine)
+    for replica in replica_engines:
+        warm_pool(replica)
+    Base.metadata.create_all(bind=engine)
+    init_search_index(engine)
+    if keyring.backend == "database":
+        keyring.reload(create=True)
+    start_writer()
+    start_loop_monitor()
+    start_ephemeral_pool()
+    start_denylist()
+    yield
+    stop_denylist()
+    stop_ephemeral_pool()
+    await stop_loop_monitor()
+    stop_writer()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="AI旅行规划师API",
@@ -16,8 +60,12 @@ app = FastAPI(
     version="0.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
+# 限流与并发上限（位于CORS之内，被拒绝的响应同样带CORS头，浏览器可读到429/503）
+app.add_middleware(RateLimitMiddleware)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -27,11 +75,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按请求采样剖析（需配置 PROFILER_SAMPLE_RATE 或 ADMIN_USERNAMES 才会生效）
+app.add_middleware(ProfilingMiddleware)
+
+# 请求与SQL指标（最外层中间件，统计包含CORS处理在内的完整耗时）
+app.add_middleware(MetricsMiddleware)
+install_sql_metrics()
+
+# 请求ID（最外层，使中间件与路由中的日志都带上同一个请求ID）
+app.add_middleware(RequestIdMiddleware)
+
 # 包含路由（添加/api前缀）
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(trips.router, prefix="/api")
 app.include_router(speech.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 
 @app.get("/")
@@ -42,10 +101,29 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """健康检查端点"""
+    """健康检查端点（存活检查，保留给已有的容器健康检查使用）"""
     return {"status": "healthy"}
 
 
+@app.get("/health/live")
+async def liveness():
+    """存活检查：进程能够响应请求"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """就绪检查：数据库、连接池、事件循环延迟、工作队列等依赖状态"""
+    result = await readiness_probe.check()
+    return JSONResponse(result, status_code=200 if result["ready"] else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
 
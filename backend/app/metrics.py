@@ -0,0 +1,224 @@
+"""
+进程内指标
+
+轻量的 Counter / Gauge / Histogram 实现，以 Prometheus 文本格式导出，
+不依赖 prometheus_client。带标签的指标通过 labels(...) 取得子指标，
+热点路径可缓存子指标以避免重复查找。
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认延迟分桶（秒）
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(v))}"' for name, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> "_Metric":
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[str, str, float]]:
+        """(后缀, 标签串, 值) 列表"""
+        raise NotImplementedError
+
+    def _series(self):
+        if self.labelnames:
+            return list(self._children.items())
+        return [((), self)]
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in self._series():
+            for suffix, extra, value in child._samples():
+                labels = _format_labels(
+                    self.labelnames + tuple(n for n, _ in extra),
+                    tuple(values) + tuple(v for _, v in extra),
+                )
+                lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0):
+        # CPython 下 float 累加在 GIL 内完成，统计用途可接受极少量竞争误差
+        self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def _samples(self):
+        return [("_total", (), self._value)]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """导出时调用 function 取值"""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def _samples(self):
+        return [("", (), self.value)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def _samples(self):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self._counts):
+            cumulative += count
+            samples.append(("_bucket", (("le", _format_value(bound)),), cumulative))
+        samples.append(("_count", (), cumulative))
+        samples.append(("_sum", (), self._sum))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
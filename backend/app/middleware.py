@@ -1,7 +1,7 @@
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from .auth import verify_token
+from .auth import is_admin, verify_token
 from .database import get_db
 from . import models
 
@@ -38,7 +38,11 @@ class JWTBearer(HTTPBearer):
         return payload is not None
 
 
-def get_current_user(token: str = Depends(JWTBearer()), db: Session = Depends(get_db)):
+# 共用同一个实例，同一请求中多个依赖引用时只校验一次
+jwt_bearer = JWTBearer()
+
+
+def get_current_user(token: str = Depends(jwt_bearer), db: Session = Depends(get_db)):
     """获取当前用户"""
     payload = verify_token(token)
     if payload is None:
@@ -56,6 +60,8 @@ def get_current_user(token: str = Depends(JWTBearer()), db: Session = Depends(ge
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # 读写路由按用户判断读己之写的粘滞窗口
+    db.info["principal"] = username
     user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
         raise HTTPException(
@@ -70,4 +76,14 @@ def get_current_user(token: str = Depends(JWTBearer()), db: Session = Depends(ge
 def get_current_active_user(current_user: models.User = Depends(get_current_user)):
     """获取当前活跃用户"""
     # 这里可以添加更多用户状态检查逻辑
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+    """获取当前管理员用户（用户名需在 ADMIN_USERNAMES 中）"""
+    if not is_admin(current_user.username):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="需要管理员权限"
+        )
+    return current_user
@@ -7,10 +7,13 @@ from sqlalchemy import (
     Boolean,
     ForeignKey,
     JSON,
+    Float,
+    Index,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
+from .compression import CompressedJSON
 
 # 使用标准SQLAlchemy类型而不是自定义类型
 from sqlalchemy import String, Text
@@ -24,7 +27,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     userID = Column(
         Integer, unique=True, index=True, nullable=False
-    )  # 用户ID，按照用户数量自动生成
+    )  # 用户ID，由 id_counters 计数器分配（见 id_allocator.py）
     username = Column(String(50), unique=True, index=True, nullable=False)
     email = Column(String(100), unique=True, index=True, nullable=False)
 
@@ -70,8 +73,8 @@ class Trip(Base):
         String(20), default="planning"
     )  # planning, in_progress, completed, cancelled
 
-    # 行程数据（JSON格式，包含所有行程详情）
-    trip_data = Column(JSON, nullable=False)
+    # 行程数据（JSON格式，包含所有行程详情；可按配置透明压缩存储）
+    trip_data = Column(CompressedJSON, nullable=False)
 
     # 时间戳
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -81,3 +84,145 @@ class Trip(Base):
 
     # 关系
     user = relationship("User", back_populates="trips")
+
+    # 行程总是按用户查询（列表按创建时间倒序）
+    __table_args__ = (Index("ix_trips_user_id_created_at", "user_id", "created_at"),)
+
+
+class Activity(Base):
+    """活动明细模型 - 由行程 trip_data 中的 activities 派生，用于索引查询与聚合"""
+
+    __tablename__ = "activities"
+
+    trip_id = Column(
+        Integer, ForeignKey("trips.id", ondelete="CASCADE"), primary_key=True
+    )
+    ordinal = Column(Integer, primary_key=True)  # 活动在 activities 数组中的序号
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    title = Column(String(200), nullable=True)
+    location = Column(String(200), nullable=True)
+    city = Column(String(100), nullable=True)
+    country_code = Column(String(10), nullable=True)  # 对应 countryCode
+    start_time = Column(DateTime, nullable=True)  # 对应 startTime
+    end_time = Column(DateTime, nullable=True)  # 对应 endTime
+    estimated_cost = Column(Float, nullable=True)  # 对应 estimatedCost
+
+    # 查询总是限定在当前用户内，因此索引都以 user_id 开头
+    __table_args__ = (
+        Index("ix_activities_user_city", "user_id", "city"),
+        Index("ix_activities_user_country_code", "user_id", "country_code"),
+        Index("ix_activities_user_start_time", "user_id", "start_time"),
+        Index("ix_activities_user_estimated_cost", "user_id", "estimated_cost"),
+    )
+
+
+class TripStats(Base):
+    """行程统计明细 - 每个行程对用户统计的贡献，用于增量维护 UserTripStats"""
+
+    __tablename__ = "trip_stats"
+
+    # 不设外键级联：行程删除后仍要读取其原有贡献，从用户统计中减去后再删除
+    trip_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String(200), nullable=True)
+    status = Column(String(20), nullable=False)
+    budget = Column(Float, nullable=True)  # 对应 trip_data.budget
+    activity_count = Column(Integer, nullable=False)
+    countries = Column(JSON, nullable=False)  # 活动涉及的国家代码列表
+    start_date = Column(DateTime, nullable=True)  # 对应 trip_data.startDate
+    end_date = Column(DateTime, nullable=True)  # 对应 trip_data.endDate
+
+    # 即将开始的行程按开始日期查询
+    __table_args__ = (Index("ix_trip_stats_user_start_date", "user_id", "start_date"),)
+
+
+class UserTripStats(Base):
+    """用户行程统计 - 行程写入时增量维护，统计接口只读这一行"""
+
+    __tablename__ = "user_trip_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    trip_count = Column(Integer, nullable=False, default=0)
+    status_counts = Column(JSON, nullable=False)  # 状态 -> 行程数
+    total_budget = Column(Float, nullable=False, default=0)
+    activity_count = Column(Integer, nullable=False, default=0)
+    country_counts = Column(JSON, nullable=False)  # 国家代码 -> 行程数
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class TripVersion(Base):
+    """行程版本号 - 行程每次写入加一，随变更事件推送给客户端"""
+
+    __tablename__ = "trip_versions"
+
+    # 不设外键级联：行程删除后仍要读取其版本号，生成删除事件后再删除
+    trip_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+
+
+class IdCounter(Base):
+    """编号计数器 - 按名称分配单调递增的业务编号（如 userID）"""
+
+    __tablename__ = "id_counters"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(Integer, nullable=False)  # 下一个未分配的编号
+
+
+class SigningKey(Base):
+    """JWT签名密钥 - 多进程共享，按 kid 轮换"""
+
+    __tablename__ = "signing_keys"
+
+    kid = Column(String(32), primary_key=True)
+    secret = Column(String(128), nullable=False)  # base64url 编码的随机密钥
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 轮换后不再用于签发，保留到已签发令牌全部过期后删除
+    retired_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class RefreshToken(Base):
+    """刷新令牌 - 只保存随机密钥的摘要；同一次登录轮换出的令牌属于同一族"""
+
+    __tablename__ = "refresh_tokens"
+
+    token_id = Column(String(32), primary_key=True)
+    family_id = Column(String(32), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    secret_hash = Column(String(64), nullable=False)  # SHA-256 十六进制摘要
+    expires_at = Column(DateTime, nullable=False, index=True)
+    # 轮换或注销后置位；已置位的令牌再次出现视为泄露，整族作废
+    revoked_at = Column(DateTime, nullable=True)
+
+
+class RevokedToken(Base):
+    """已吊销的访问令牌 - jti 为令牌编号，或 "sub:<用户名>" 表示该用户此前签发的全部令牌"""
+
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    # 被吊销令牌的过期时间，之后条目即可删除
+    expires_at = Column(DateTime, nullable=False, index=True)
+    # 各 worker 按此增量加载
+    revoked_at = Column(DateTime, nullable=False, index=True)
+
+
+class SRPSessionRecord(Base):
+    """SRP认证会话 - 多进程共享时持久化挑战阶段的服务端状态"""
+
+    __tablename__ = "srp_sessions"
+
+    session_id = Column(String(64), primary_key=True)
+    username = Column(String(50), nullable=False)
+    salt = Column(Text, nullable=False)  # Base64
+    verifier = Column(Text, nullable=False)  # Base64
+    A = Column(Text, nullable=False)  # 客户端公钥 (Base64)
+    b = Column(Text, nullable=False)  # 服务端私有随机数 (Base64)
+    # 服务端公钥 B (Base64)，验证阶段由此得到 g^b，无需重新计算
+    # （列名不能用 B：SQLite 列名不区分大小写，与 b 冲突）
+    server_public = Column(Text)
+    expires_at = Column(DateTime, nullable=False, index=True)
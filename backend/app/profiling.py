@@ -0,0 +1,308 @@
+"""
+按请求采样剖析与慢请求捕获
+
+ProfilingMiddleware 对两类请求开启剖析：
+- 管理员主动触发：请求头带 X-Profile: 1 且 Bearer 令牌属于 ADMIN_USERNAMES，
+  无论耗时都会保存，并在响应头 X-Profile-Id 中返回捕获编号；
+- 随机采样：按 PROFILER_SAMPLE_RATE 抽样，只保存耗时不低于
+  PROFILER_THRESHOLD_MS 的请求。
+
+每条捕获包含调用树（安装了 pyinstrument 时使用 pyinstrument，否则使用
+cProfile）和本次请求执行的 SQL 明细，保存在容量为 PROFILER_BUFFER_SIZE 的
+环形缓冲中，可通过 /api/admin/profiles 查看与下载。
+
+同一时间只剖析一个请求。cProfile 按线程采集，剖析期间事件循环上其他请求的
+执行也会计入调用树；pyinstrument 的异步模式只统计当前请求。SQLite 生产模式下
+由写线程批量提交的写入语句不在本请求的 SQL 明细中。
+
+环境变量:
+    PROFILER_SAMPLE_RATE        随机采样比例，默认 0（只响应管理员触发）
+    PROFILER_THRESHOLD_MS       采样请求的保存阈值，默认 500
+    PROFILER_SQL_THRESHOLD_MS   SQL 明细只列出不低于该耗时的语句，默认 0
+    PROFILER_BUFFER_SIZE        保留的捕获条数，默认 50
+    PROFILER_BACKEND            auto（默认）、pyinstrument 或 cprofile
+"""
+
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from .auth import ADMIN_USERNAMES, is_admin, verify_token
+from .instrumentation import sql_trace
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # 可选依赖，未安装时使用 cProfile
+    PyinstrumentProfiler = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_THRESHOLD_MS = float(os.getenv("PROFILER_THRESHOLD_MS", "500"))
+PROFILER_SQL_THRESHOLD_MS = float(os.getenv("PROFILER_SQL_THRESHOLD_MS", "0"))
+PROFILER_BUFFER_SIZE = int(os.getenv("PROFILER_BUFFER_SIZE", "50"))
+PROFILER_BACKEND = os.getenv("PROFILER_BACKEND", "auto").lower()
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# 报告中列出的 cProfile 函数条数与单条 SQL 的最大长度
+CPROFILE_REPORT_LINES = 60
+SQL_STATEMENT_MAX_LENGTH = 1000
+
+
+def _use_pyinstrument() -> bool:
+    if PROFILER_BACKEND == "cprofile":
+        return False
+    if PROFILER_BACKEND == "pyinstrument" and PyinstrumentProfiler is None:
+        raise RuntimeError("PROFILER_BACKEND=pyinstrument 需要安装 pyinstrument")
+    return PyinstrumentProfiler is not None
+
+
+class ProfileCapture:
+    """一次请求的剖析结果"""
+
+    def __init__(
+        self,
+        capture_id: str,
+        method: str,
+        path: str,
+        status: int,
+        duration: float,
+        forced: bool,
+        backend: str,
+        sql: List[tuple],
+        report: str,
+        download: bytes,
+        download_type: str,
+        download_suffix: str,
+    ):
+        self.capture_id = capture_id
+        self.method = method
+        self.path = path
+        self.status = status
+        self.duration = duration
+        self.forced = forced
+        self.backend = backend
+        self.created_at = time.time()
+        self.sql_count = len(sql)
+        self.sql_seconds = sum(elapsed for _, elapsed in sql)
+        self.sql = [
+            {
+                "statement": statement[:SQL_STATEMENT_MAX_LENGTH],
+                "duration_ms": round(elapsed * 1000, 3),
+            }
+            for statement, elapsed in sql
+            if elapsed * 1000 >= PROFILER_SQL_THRESHOLD_MS
+        ]
+        self.report = report
+        self.download = download
+        self.download_type = download_type
+        self.download_suffix = download_suffix
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.capture_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 2),
+            "forced": self.forced,
+            "backend": self.backend,
+            "created_at": self.created_at,
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+        }
+
+    def detail(self) -> Dict:
+        return {**self.summary(), "sql": self.sql, "report": self.report}
+
+
+class ProfileStore:
+    """保存最近 N 条捕获的环形缓冲（线程安全）"""
+
+    def __init__(self, capacity: int):
+        self._captures = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def add(self, capture: ProfileCapture):
+        with self._lock:
+            self._captures.append(capture)
+
+    def list(self) -> List[ProfileCapture]:
+        with self._lock:
+            return list(reversed(self._captures))
+
+    def get(self, capture_id: str) -> Optional[ProfileCapture]:
+        with self._lock:
+            for capture in self._captures:
+                if capture.capture_id == capture_id:
+                    return capture
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._captures.clear()
+
+
+profile_store = ProfileStore(PROFILER_BUFFER_SIZE)
+
+
+class _CProfileSession:
+    backend = "cprofile"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def render(self):
+        stats = pstats.Stats(self._profile)
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(CPROFILE_REPORT_LINES)
+        # 与 pstats.dump_stats 的格式一致，可用 snakeviz 等工具直接打开
+        return (
+            output.getvalue(),
+            marshal.dumps(stats.stats),
+            "application/octet-stream",
+            ".prof",
+        )
+
+
+class _PyinstrumentSession:
+    backend = "pyinstrument"
+
+    def __init__(self):
+        self._profiler = PyinstrumentProfiler(async_mode="enabled")
+
+    def start(self):
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+
+    def render(self):
+        report = self._profiler.output_text(unicode=True, color=False)
+        html = self._profiler.output_html().encode("utf-8")
+        return report, html, "text/html; charset=utf-8", ".html"
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.enabled = PROFILER_SAMPLE_RATE > 0 or bool(ADMIN_USERNAMES)
+        self._session_class = (
+            _PyinstrumentSession if _use_pyinstrument() else _CProfileSession
+        )
+        # 同一时间只允许一个剖析会话（cProfile 与 pyinstrument 都不支持嵌套）
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        forced = _admin_requested(scope)
+        if not forced and (
+            PROFILER_SAMPLE_RATE <= 0 or random.random() >= PROFILER_SAMPLE_RATE
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self._profile(scope, receive, send, forced)
+        finally:
+            self._busy.release()
+
+    async def _profile(self, scope, receive, send, forced: bool):
+        capture_id = secrets.token_hex(8)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if forced:
+                    headers = list(message.get("headers", []))
+                    headers.append((PROFILE_ID_HEADER, capture_id.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        session = self._session_class()
+        trace = []
+        token = sql_trace.set(trace)
+        started = time.perf_counter()
+        session.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            session.stop()
+            elapsed = time.perf_counter() - started
+            sql_trace.reset(token)
+
+        if not forced and elapsed * 1000 < PROFILER_THRESHOLD_MS:
+            return
+        try:
+            report, download, download_type, suffix = await run_in_threadpool(
+                session.render
+            )
+        except Exception:
+            logger.exception("生成剖析报告失败")
+            return
+        profile_store.add(
+            ProfileCapture(
+                capture_id,
+                scope["method"],
+                scope["path"],
+                status,
+                elapsed,
+                forced,
+                session.backend,
+                trace,
+                report,
+                download,
+                download_type,
+                suffix,
+            )
+        )
+
+
+def _admin_requested(scope) -> bool:
+    """请求是否带有 X-Profile 头且令牌属于管理员"""
+    if not ADMIN_USERNAMES:
+        return False
+    profile, authorization = None, None
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            profile = value
+        elif name == b"authorization":
+            authorization = value
+    if profile not in (b"1", b"true") or authorization is None:
+        return False
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme != "Bearer":
+        return False
+    payload = verify_token(token)
+    return payload is not None and is_admin(payload.get("sub"))
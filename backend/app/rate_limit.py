@@ -0,0 +1,378 @@
+"""
+限流与准入控制
+
+RateLimitMiddleware 是纯 ASGI 中间件，在路由之前处理 HTTP 与 WebSocket 请求：
+
+- 令牌桶限流（RATE_LIMIT_ENABLED=true 时开启）：每个调用方一个桶，每秒补充
+  RATE_LIMIT_RATE 个令牌，最多积累 RATE_LIMIT_BURST 个。调用方按 RATE_LIMIT_KEY
+  区分：auto（默认）带有效 Bearer 令牌时按用户名、否则按客户端地址，ip 始终
+  按客户端地址。每个路径消耗的令牌数不同，SRPAuthInit 等涉及 4096 位运算的
+  接口权重最高（见 DEFAULT_COSTS，可用 RATE_LIMIT_COSTS 覆盖）。令牌不足时直接返回 429 并带 Retry-After。
+- 并发上限：同时处理的 HTTP 请求超过 MAX_CONCURRENT_REQUESTS、或同时打开的
+  WebSocket 超过 MAX_CONCURRENT_WEBSOCKETS 时立即返回 503（WebSocket 在握手
+  阶段拒绝），不排队。SSE 推送等长连接（STREAMING_PATHS）与 WebSocket 一起
+  计入 MAX_CONCURRENT_WEBSOCKETS，不占用 HTTP 请求的并发名额。路由在事件循环上同步获取数据库连接，PostgreSQL 等
+  连接池有上限的数据库上，建议把 MAX_CONCURRENT_REQUESTS 设为不超过
+  DB_POOL_SIZE + DB_MAX_OVERFLOW，避免请求在事件循环上等待连接而互相卡住。
+
+登录相关接口另外按用户名限流（limit_username），防止针对单个账号的尝试。
+
+令牌桶默认保存在进程内存中；多 worker 或多实例部署可设置
+RATE_LIMIT_BACKEND=redis 共享（需要安装 ratelimit 可选依赖 redis），
+Redis 不可用时放行并记录警告。并发上限始终按进程计算。
+
+开销：内存后端每个请求一次字典查找与几次浮点运算；同一个令牌只在首次出现时
+校验签名，结果缓存在 TOKEN_CACHE_SIZE 条的 LRU 中，每条最多保留
+TOKEN_CACHE_TTL_SECONDS 秒且不超过令牌的过期时间。
+
+环境变量:
+    RATE_LIMIT_ENABLED            是否开启令牌桶限流，默认 false
+    RATE_LIMIT_RATE               每秒补充的令牌数，默认 10
+    RATE_LIMIT_BURST              桶容量，默认 60
+    RATE_LIMIT_KEY                auto（默认）或 ip
+    RATE_LIMIT_COSTS              路径消耗的令牌数，如 /api/auth/SRPAuthInit=20,/api/trips/=2
+    RATE_LIMIT_USERNAME_RATE      登录接口按用户名的每秒令牌数，默认 0.5
+    RATE_LIMIT_USERNAME_BURST     登录接口按用户名的桶容量，默认 10
+    RATE_LIMIT_BACKEND            memory（默认）或 redis
+    RATE_LIMIT_REDIS_URL          Redis 地址，默认 redis://localhost:6379/0
+    MAX_CONCURRENT_REQUESTS       同时处理的 HTTP 请求上限，默认 0（不限）
+    MAX_CONCURRENT_WEBSOCKETS     同时打开的 WebSocket 与 SSE 长连接上限，默认 0（不限）
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from .auth import verify_token
+from .metrics import REGISTRY
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # 可选依赖，仅在 RATE_LIMIT_BACKEND=redis 时需要
+    redis_asyncio = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "10"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "60"))
+RATE_LIMIT_KEY = os.getenv("RATE_LIMIT_KEY", "auto").lower()
+RATE_LIMIT_USERNAME_RATE = float(os.getenv("RATE_LIMIT_USERNAME_RATE", "0.5"))
+RATE_LIMIT_USERNAME_BURST = float(os.getenv("RATE_LIMIT_USERNAME_BURST", "10"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "0"))
+MAX_CONCURRENT_WEBSOCKETS = int(os.getenv("MAX_CONCURRENT_WEBSOCKETS", "0"))
+
+# 各路径消耗的令牌数，未列出的路径消耗 1 个
+DEFAULT_COSTS = {
+    "/api/auth/SRPAuthInit": 20,
+    "/api/auth/SRPAuthProof": 5,
+    "/api/auth/register": 5,
+    "/api/auth/insecure/register": 5,
+    "/api/auth/insecure/login": 5,
+    "/api/speech/recognize": 10,
+    "/api/trips/import": 10,
+    "/api/trips/export": 10,
+}
+
+# 不限流的路径（健康检查与监控抓取）
+EXEMPT_PATHS = frozenset(["/", "/health", "/health/live", "/health/ready", "/metrics"])
+
+# 长时间保持打开的 HTTP 路径（SSE），按 WebSocket 计入并发上限
+STREAMING_PATHS = frozenset(["/api/trips/changes"])
+
+TOKEN_CACHE_SIZE = 10000
+# 令牌校验结果的缓存时间（同时不超过令牌本身的 exp）
+TOKEN_CACHE_TTL_SECONDS = 300.0
+# 空闲桶（已补满）的清理间隔
+SWEEP_INTERVAL_SECONDS = 60.0
+
+RATE_LIMITED = REGISTRY.counter(
+    "rate_limited_requests", "被限流或准入控制拒绝的请求数", ["reason"]
+)
+rate_limited_by_rate = RATE_LIMITED.labels("rate")
+rate_limited_by_username = RATE_LIMITED.labels("username")
+rate_limited_by_concurrency = RATE_LIMITED.labels("concurrency")
+
+
+def _parse_costs(value: str) -> Dict[str, float]:
+    costs = dict(DEFAULT_COSTS)
+    for item in value.split(","):
+        path, sep, cost = item.strip().rpartition("=")
+        if sep and path:
+            costs[path] = float(cost)
+    return costs
+
+
+RATE_LIMIT_COSTS = _parse_costs(os.getenv("RATE_LIMIT_COSTS", ""))
+
+
+class MemoryBucketStore:
+    """进程内令牌桶，桶状态为 [剩余令牌, 更新时间, 补满时间]"""
+
+    def __init__(self):
+        self._buckets: Dict[str, list] = {}
+        self._last_sweep = time.monotonic()
+
+    async def consume(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """扣除 cost 个令牌，成功返回 0，否则返回需要等待的秒数（不扣除）"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if now - self._last_sweep > SWEEP_INTERVAL_SECONDS:
+                self._sweep(now)
+            bucket = self._buckets[key] = [burst, now, now]
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        bucket[0] = tokens
+        bucket[1] = now
+        bucket[2] = now + (burst - tokens) / rate
+        return wait
+
+    def _sweep(self, now: float):
+        # 已补满的桶与不存在等价，可以删除
+        self._last_sweep = now
+        idle = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+        for key in idle:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# 在 Redis 中原子地补充并扣除令牌，时间取 Redis 服务器时间，各实例时钟不一致也不影响
+_REDIS_CONSUME = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = burst
+  ts = now
+end
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """多进程/多实例共享的令牌桶，Redis 出错时放行"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        if redis_asyncio is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis 需要安装 redis")
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(_REDIS_CONSUME)
+        self._warned_at = 0.0
+
+    async def consume(self, key: str, cost: float, rate: float, burst: float) -> float:
+        try:
+            wait = await self._script(
+                keys=[self.prefix + key], args=[rate, burst, cost]
+            )
+        except Exception as e:
+            now = time.monotonic()
+            if now - self._warned_at > SWEEP_INTERVAL_SECONDS:
+                self._warned_at = now
+                logger.warning("限流后端不可用，暂时放行: %r", e)
+            return 0.0
+        return float(wait)
+
+
+def create_store():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBucketStore(RATE_LIMIT_REDIS_URL)
+    if RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"未知的限流后端: {RATE_LIMIT_BACKEND}")
+    return MemoryBucketStore()
+
+
+bucket_store = create_store()
+
+
+class TokenSubjectCache:
+    """
+    Bearer 令牌到用户名的 LRU 缓存，无效令牌记为 None
+
+    条目最多保留 TOKEN_CACHE_TTL_SECONDS 秒且不超过令牌的 exp，
+    过期后重新校验；条目数超过 maxsize 时淘汰最久未用的。
+    """
+
+    def __init__(
+        self, maxsize: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL_SECONDS
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # 令牌 -> (用户名, 条目失效的时间戳)
+        self._items: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+
+    def subject(self, token: str) -> Optional[str]:
+        now = time.time()
+        item = self._items.get(token)
+        if item is not None and item[1] > now:
+            self._items.move_to_end(token)
+            return item[0]
+        payload = verify_token(token)
+        subject = payload.get("sub") if payload else None
+        expires_at = now + self.ttl
+        if payload and isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        self._items[token] = (subject, expires_at)
+        self._items.move_to_end(token)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return subject
+
+
+def _retry_after(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
+
+
+async def limit_username(username: str, cost: float = 1):
+    """按用户名限流（登录接口在解析请求体后调用），超出时抛出 429"""
+    if not RATE_LIMIT_ENABLED or not username:
+        return
+    wait = await bucket_store.consume(
+        f"username:{username}",
+        cost,
+        RATE_LIMIT_USERNAME_RATE,
+        RATE_LIMIT_USERNAME_BURST,
+    )
+    if wait > 0:
+        rate_limited_by_username.inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="该账号尝试过于频繁，请稍后再试",
+            headers={"Retry-After": _retry_after(wait)},
+        )
+
+
+async def _reject_http(send, status_code: int, detail: str, retry_after: str):
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after.encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _reject_websocket(receive, send, code: int):
+    # 握手阶段关闭，服务器以 403 拒绝升级
+    message = await receive()
+    if message["type"] == "websocket.connect":
+        await send({"type": "websocket.close", "code": code})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.rate_limit = RATE_LIMIT_ENABLED
+        self.key_mode = RATE_LIMIT_KEY
+        self.costs = RATE_LIMIT_COSTS
+        self.max_requests = MAX_CONCURRENT_REQUESTS
+        self.max_websockets = MAX_CONCURRENT_WEBSOCKETS
+        self.in_flight = 0
+        self.websockets = 0
+        self._subjects = TokenSubjectCache()
+
+    async def __call__(self, scope, receive, send):
+        scope_type = scope["type"]
+        if scope_type not in ("http", "websocket") or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limit:
+            wait = await bucket_store.consume(
+                self._key(scope),
+                self.costs.get(scope["path"], 1),
+                RATE_LIMIT_RATE,
+                RATE_LIMIT_BURST,
+            )
+            if wait > 0:
+                rate_limited_by_rate.inc()
+                if scope_type == "http":
+                    await _reject_http(
+                        send, 429, "请求过于频繁，请稍后再试", _retry_after(wait)
+                    )
+                else:
+                    await _reject_websocket(receive, send, 1008)
+                return
+
+        if scope_type == "http" and scope["path"] not in STREAMING_PATHS:
+            if self.max_requests and self.in_flight >= self.max_requests:
+                rate_limited_by_concurrency.inc()
+                await _reject_http(send, 503, "服务繁忙，请稍后再试", "1")
+                return
+            self.in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.in_flight -= 1
+        else:
+            if self.max_websockets and self.websockets >= self.max_websockets:
+                rate_limited_by_concurrency.inc()
+                if scope_type == "http":
+                    await _reject_http(send, 503, "服务繁忙，请稍后再试", "1")
+                else:
+                    await _reject_websocket(receive, send, 1013)
+                return
+            self.websockets += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.websockets -= 1
+
+    def _key(self, scope) -> str:
+        if self.key_mode != "ip":
+            subject = self._subject(scope)
+            if subject is not None:
+                return f"user:{subject}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    def _subject(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme == "Bearer" and token:
+                    return self._subjects.subject(token)
+                return None
+        return None
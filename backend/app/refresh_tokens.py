@@ -0,0 +1,117 @@
+"""
+刷新令牌
+
+访问令牌过期后，客户端用刷新令牌调用 /api/auth/refresh 换取新的访问令牌，
+无需重新进行 SRP 握手。刷新令牌是不透明字符串 "<token_id>.<secret>"：
+服务端按 token_id 主键查找，只保存 secret 的 SHA-256 摘要，校验为一次哈希比较。
+
+每次刷新都会作废旧令牌并签发同一族（family）的新令牌，有效期重新计时（滑动会话）。
+已作废的令牌再次被使用说明它可能已泄露，此时整族作废，持有者需要重新登录。
+刷新令牌保存在数据库中，与签名密钥存储方式无关，worker 重启后仍然有效。
+"""
+
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .auth import REFRESH_TOKEN_EXPIRE_DAYS
+from .metrics import REGISTRY
+
+REFRESH_RESULTS = REGISTRY.counter("token_refreshes", "刷新令牌请求结果", ["result"])
+refresh_success = REFRESH_RESULTS.labels("success")
+refresh_invalid = REFRESH_RESULTS.labels("invalid")
+refresh_expired = REFRESH_RESULTS.labels("expired")
+refresh_reused = REFRESH_RESULTS.labels("reused")
+
+
+def _digest(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _new_token(
+    db: Session, user_id: int, family_id: str, now: datetime
+) -> Tuple[models.RefreshToken, str]:
+    secret = secrets.token_urlsafe(32)
+    row = models.RefreshToken(
+        token_id=secrets.token_urlsafe(12),
+        family_id=family_id,
+        user_id=user_id,
+        secret_hash=_digest(secret),
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    db.add(row)
+    return row, f"{row.token_id}.{secret}"
+
+
+def issue_refresh_token(db: Session, user_id: int) -> str:
+    """登录成功后签发新一族的刷新令牌，并顺带清理已过期的令牌（写任务，由调用方提交）"""
+    now = datetime.utcnow()
+    db.query(models.RefreshToken).filter(models.RefreshToken.expires_at < now).delete(
+        synchronize_session=False
+    )
+    _, token = _new_token(db, user_id, secrets.token_urlsafe(12), now)
+    db.flush()
+    return token
+
+
+def rotate_refresh_token(db: Session, token: str) -> Optional[Tuple[models.User, str]]:
+    """
+    校验刷新令牌并轮换（写任务，由调用方提交）
+
+    成功时返回 (用户, 新刷新令牌)；令牌无效、过期、已被使用或用户已删除时返回 None。
+    已被使用时整族作废，该作废同样需要提交。
+    """
+    token_id, _, secret = token.partition(".")
+    row = db.get(models.RefreshToken, token_id) if secret else None
+    if row is None or not hmac.compare_digest(row.secret_hash, _digest(secret)):
+        refresh_invalid.inc()
+        return None
+
+    now = datetime.utcnow()
+    if row.expires_at < now:
+        refresh_expired.inc()
+        return None
+
+    # 条件更新保证同一令牌并发刷新时只有一个请求成功
+    claimed = (
+        db.query(models.RefreshToken)
+        .filter(
+            models.RefreshToken.token_id == token_id,
+            models.RefreshToken.revoked_at.is_(None),
+        )
+        .update({"revoked_at": now}, synchronize_session=False)
+    )
+    if not claimed:
+        revoke_family(db, row.family_id)
+        refresh_reused.inc()
+        return None
+
+    user = db.get(models.User, row.user_id)
+    if user is None:
+        refresh_invalid.inc()
+        return None
+
+    _, new_token = _new_token(db, user.id, row.family_id, now)
+    db.flush()
+    refresh_success.inc()
+    return user, new_token
+
+
+def revoke_family(db: Session, family_id: str):
+    """作废一族刷新令牌（一次登录派生出的全部令牌，由调用方提交）"""
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.family_id == family_id,
+        models.RefreshToken.revoked_at.is_(None),
+    ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+
+
+def delete_user_tokens(db: Session, user_id: int):
+    """删除用户的全部刷新令牌（用户注销时调用，由调用方提交）"""
+    db.query(models.RefreshToken).filter(models.RefreshToken.user_id == user_id).delete(
+        synchronize_session=False
+    )
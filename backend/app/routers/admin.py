@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import Response
+
+from .. import models
+from ..loop_monitor import loop_monitor
+from ..middleware import get_current_admin_user
+from ..profiling import profile_store
+
+router = APIRouter(prefix="/admin", tags=["管理"])
+
+
+def _get_capture(capture_id: str):
+    capture = profile_store.get(capture_id)
+    if capture is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="剖析记录不存在或已被淘汰"
+        )
+    return capture
+
+
+@router.get("/profiles")
+async def list_profiles(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """列出最近的请求剖析记录（新的在前）"""
+    return {"items": [capture.summary() for capture in profile_store.list()]}
+
+
+@router.get("/profiles/{capture_id}")
+async def get_profile(
+    capture_id: str,
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """查看剖析记录：调用树文本报告与 SQL 明细"""
+    return _get_capture(capture_id).detail()
+
+
+@router.get("/profiles/{capture_id}/download")
+async def download_profile(
+    capture_id: str,
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """下载原始剖析文件（cProfile 为 .prof，pyinstrument 为 .html）"""
+    capture = _get_capture(capture_id)
+    filename = f"profile-{capture.capture_id}{capture.download_suffix}"
+    return Response(
+        capture.download,
+        media_type=capture.download_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.delete("/profiles", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_profiles(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """清空剖析记录"""
+    profile_store.clear()
+
+
+@router.get("/loop-blocks")
+async def list_loop_blocks(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """最近的事件循环阻塞记录（需开启 LOOP_MONITOR_ENABLED）"""
+    return {"enabled": loop_monitor.running, "items": loop_monitor.reports()}
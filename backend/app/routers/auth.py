@@ -1,73 +1,105 @@
 import base64
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
+from functools import partial
+from typing import Optional
 import secrets
+import time
 import srp
 
 from ..database import get_db
 from .. import models, schemas
-from ..auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..db_writer import run_write
+from ..id_allocator import allocate_user_id, user_id_allocator
+from ..auth import create_access_token, verify_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from ..srp_auth import srp_session_manager, generate_session_token
+from ..srp_auth import (
+    srp_challenge_timer,
+    srp_failure,
+    srp_proof_timer,
+    srp_success,
+)
 from app.utils.srp_dataType import (
     bigint_to_base64,
     base64_to_bigint,
     generate_secure_salt,
 )
 from ..srp_auth import hash_password_for_storage, verify_password_hash
-from ..middleware import get_current_active_user
+from ..middleware import get_current_active_user, jwt_bearer
+from ..rate_limit import limit_username
+from ..refresh_tokens import issue_refresh_token, revoke_family, rotate_refresh_token
+from ..token_denylist import denylist
 
-# 配置日志
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 
 
+_UNIQUE_VIOLATIONS = (("username", "用户名已存在"), ("email", "邮箱已被注册"))
+# userID 冲突（计数器落后于已有编号，如手工导入的用户）时重新分配的次数
+_USER_ID_RETRIES = 3
+
+
+def _violates(error: IntegrityError, column: str) -> bool:
+    message = str(error.orig)
+    # SQLite: "UNIQUE constraint failed: users.username"
+    # PostgreSQL: 'violates unique constraint "ix_users_username"'
+    return f"users.{column}" in message or f"ix_users_{column}" in message
+
+
+async def _insert_user(db: Session, **fields) -> models.User:
+    """分配 userID 并插入用户，唯一约束冲突映射为 400 错误"""
+
+    def insert_user(session: Session, resync: bool = False) -> models.User:
+        if resync:
+            user_id_allocator.resync(session)
+        db_user = models.User(userID=allocate_user_id(session), **fields)
+        session.add(db_user)
+        session.flush()
+        session.refresh(db_user)
+        return db_user
+
+    for attempt in range(_USER_ID_RETRIES):
+        try:
+            return await run_write(db, partial(insert_user, resync=attempt > 0))
+        except IntegrityError as e:
+            for column, detail in _UNIQUE_VIOLATIONS:
+                if _violates(e, column):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST, detail=detail
+                    )
+            if not _violates(e, "userID") or attempt == _USER_ID_RETRIES - 1:
+                raise
+            # 计数器落后于已有编号，重试时先把计数器移到最大编号之后
+            logger.warning("注册时 userID 冲突，重新分配")
+
+
+def _start_srp_session(username: str, salt: bytes, verifier: bytes, A: bytes):
+    """创建SRP会话并取回验证器（数据库会话存储经由写线程写入，在线程池中调用）"""
+    session_id = srp_session_manager.create_session(username, salt, verifier, A)
+    # 同一线程紧接着读取，数据库会话存储直接返回刚创建的验证器
+    return session_id, srp_session_manager.get_session(session_id)
+
+
 # 用户注册（使用SRP认证）
 @router.post("/register", response_model=schemas.SRPRegisterResponse)
 async def register(
     register_data: schemas.SRPRegisterRequest, db: Session = Depends(get_db)
 ):
     """用户注册"""
-    # 检查用户名是否已存在
-    existing_user = (
-        db.query(models.User)
-        .filter(models.User.username == register_data.username)
-        .first()
-    )
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="用户名已存在"
-        )
-
-    # 检查邮箱是否已存在
-    existing_email = (
-        db.query(models.User).filter(models.User.email == register_data.email).first()
-    )
-    if existing_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="邮箱已被注册"
-        )
-
-    # 计算下一个userID（当前用户数量 + 1）
-    user_count = db.query(models.User).count()
-    next_user_id = user_count + 1
-
-    # 创建新用户
-    db_user = models.User(
-        userID=next_user_id,
+    # 创建新用户，用户名或邮箱重复由唯一约束判定
+    db_user = await _insert_user(
+        db,
         username=register_data.username,
         email=register_data.email,
         srp_salt=register_data.srp_salt,
         srp_verifier=register_data.srp_verifier,
     )
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
     return schemas.SRPRegisterResponse(username=db_user.username, email=db_user.email)
 
 
@@ -76,7 +108,9 @@ async def challenge(
     challenge_data: schemas.SRPChallengeRequest, db: Session = Depends(get_db)
 ):
     """认证挑战 - 客户端发送A，服务器返回salt和B"""
-    logger.info(f"SRPAuthInit: 收到认证初始化请求，用户名: {challenge_data.username}")
+    logger.debug("SRPAuthInit: 收到认证初始化请求，用户名: %s", challenge_data.username)
+    # 按用户名限流在查库与 SRP 运算之前进行
+    await limit_username(challenge_data.username)
 
     # 查找用户
     user = (
@@ -86,18 +120,14 @@ async def challenge(
     )
 
     if not user:
-        logger.warning(f"SRPAuthInit: 用户不存在 - {challenge_data.username}")
+        logger.warning("SRPAuthInit: 用户不存在 - %s", challenge_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在"
         )
 
-    logger.info(
-        f"SRPAuthInit: 找到用户 - {challenge_data.username}, userID: {user.userID}"
-    )
-
     # 验证客户端公钥A是否提供
     if not challenge_data.A:
-        logger.error("SRPAuthInit: 缺少客户端公钥A")
+        logger.warning("SRPAuthInit: 缺少客户端公钥A")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="缺少客户端公钥A"
         )
@@ -106,37 +136,27 @@ async def challenge(
         # 解码存储的salt和verifier
         salt = base64.b64decode(user.srp_salt)
         verifier = base64.b64decode(user.srp_verifier)
-        logger.debug(
-            f"SRPAuthInit: 解码salt长度: {len(salt)}, verifier长度: {len(verifier)}"
-        )
-
         # 从客户端获取A值
         A = base64.b64decode(challenge_data.A)
-        logger.debug(f"SRPAuthInit: 解码A长度: {len(A)}")
 
         # 创建SRP会话（使用新的API）
-        session_id = srp_session_manager.create_session(
-            challenge_data.username, salt, verifier, A
+        started = time.perf_counter()
+        session_id, session = await run_in_threadpool(
+            _start_srp_session, challenge_data.username, salt, verifier, A
         )
-        logger.info(f"SRPAuthInit: 创建会话成功，session_id: {session_id}")
-
-        # 从会话中获取验证器
-        session = srp_session_manager.get_session(session_id)
         if not session:
-            logger.error(f"SRPAuthInit: 无法获取会话 - {session_id}")
+            logger.error("SRPAuthInit: 无法获取会话 - %s", session_id)
             raise HTTPException(status_code=400, detail="Failed to create session")
 
         svr: srp.Verifier = session['verifier']
 
         # 获取挑战(salt和B) - 按照官方示例
         s, B = svr.get_challenge()
-        logger.debug(
-            f"SRPAuthInit: 生成挑战 - salt长度: {len(s) if s else 0}, B长度: {len(B) if B else 0}"
-        )
+        srp_challenge_timer.observe(time.perf_counter() - started)
 
         if s is None or B is None:
             logger.error("SRPAuthInit: 生成挑战失败")
-            srp_session_manager.remove_session(session_id)
+            await run_in_threadpool(srp_session_manager.remove_session, session_id)
             raise HTTPException(status_code=400, detail="Failed to generate challenge")
 
         response = schemas.SRPChallengeResponse(
@@ -146,11 +166,11 @@ async def challenge(
             session_id=session_id,
         )
 
-        logger.info(f"SRPAuthInit: 认证初始化成功，返回session_id: {session_id}")
+        logger.debug("SRPAuthInit: 认证初始化成功，session_id: %s", session_id)
         return response
 
     except Exception as e:
-        logger.error(f"SRPAuthInit: 认证初始化异常 - {str(e)}", exc_info=True)
+        logger.error("SRPAuthInit: 认证初始化异常 - %s", e, exc_info=True)
         raise HTTPException(status_code=400, detail=f"Authentication failed: {str(e)}")
 
 
@@ -159,8 +179,10 @@ async def authenticate(
     auth_data: schemas.SRPAuthenticateRequest, db: Session = Depends(get_db)
 ):
     """认证验证 - 客户端发送M1，服务器返回M2和token"""
-    logger.info(
-        f"SRPAuthProof: 收到认证验证请求，用户名: {auth_data.username}, session_id: {auth_data.session_id}"
+    logger.debug(
+        "SRPAuthProof: 收到认证验证请求，用户名: %s, session_id: %s",
+        auth_data.username,
+        auth_data.session_id,
     )
 
     # 查找用户
@@ -169,78 +191,93 @@ async def authenticate(
     )
 
     if not user:
-        logger.warning(f"SRPAuthProof: 用户不存在 - {auth_data.username}")
+        logger.warning("SRPAuthProof: 用户不存在 - %s", auth_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在"
         )
 
     # 检查会话ID
-    session = srp_session_manager.get_session(auth_data.session_id)
+    started = time.perf_counter()
+    session = await run_in_threadpool(
+        srp_session_manager.get_session, auth_data.session_id
+    )
     if not auth_data.session_id or not session:
-        logger.error(f"SRPAuthProof: 无效的会话ID - {auth_data.session_id}")
+        logger.warning("SRPAuthProof: 无效的会话ID - %s", auth_data.session_id)
+        srp_failure.inc()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="无效的会话ID"
         )
 
-    logger.info(f"SRPAuthProof: 找到会话，用户名: {session['username']}")
-
     svr: srp.Verifier = session['verifier']
 
     try:
         # 获取客户端发送的M1
         M1 = base64.b64decode(auth_data.M1)
-        logger.debug(f"SRPAuthProof: 解码M1长度: {len(M1)}")
-        logger.debug(f"SRPAuthProof: M1前16字节: {M1[:16].hex()}...")
 
         # 验证客户端证明并获取服务器证明HAMK - 按照官方示例
-        logger.info("SRPAuthProof: 开始验证客户端证明...")
         HAMK = svr.verify_session(M1)
+        srp_proof_timer.observe(time.perf_counter() - started)
 
         if HAMK is None:
-            logger.error("SRPAuthProof: 客户端证明验证失败 - HAMK为None")
-            logger.error(
-                "SRPAuthProof: 可能的原因: SRP参数不匹配、密码错误、会话状态异常"
+            srp_failure.inc()
+            logger.warning(
+                "SRPAuthProof: 客户端证明验证失败（密码错误或会话状态异常）- %s",
+                auth_data.username,
+            )
+            await run_in_threadpool(
+                srp_session_manager.remove_session, auth_data.session_id
             )
-            srp_session_manager.remove_session(auth_data.session_id)
             raise HTTPException(
                 status_code=401,
                 detail="Authentication failed - client proof verification failed",
             )
 
-        logger.info("SRPAuthProof: 客户端证明验证成功")
-        logger.debug(f"SRPAuthProof: HAMK长度: {len(HAMK)}")
+        srp_success.inc()
 
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
             data={"sub": user.username}, expires_delta=access_token_expires
         )
-        logger.info(f"SRPAuthProof: 生成访问令牌成功，用户名: {user.username}")
 
-        srp_session_manager.remove_session(auth_data.session_id)
-        logger.info(f"SRPAuthProof: 清理会话 - {auth_data.session_id}")
+        await run_in_threadpool(
+            srp_session_manager.remove_session, auth_data.session_id
+        )
+        refresh_token = await run_write(
+            db, partial(issue_refresh_token, user_id=user.id)
+        )
 
         response = schemas.SRPAuthenticateResponse(
             username=user.username,
             M2=base64.b64encode(HAMK).decode('utf-8'),
             access_token=access_token,
+            refresh_token=refresh_token,
+            expires_in=int(access_token_expires.total_seconds()),
             success=True,
         )
 
-        logger.info(f"SRPAuthProof: 认证验证成功，返回访问令牌")
+        logger.info("SRPAuthProof: 认证成功 - %s", user.username)
         return response
 
     except ValueError as e:
-        logger.error(f"SRPAuthProof: 数值计算异常 - {str(e)}", exc_info=True)
-        logger.error(f"SRPAuthProof: 可能的原因: 参数格式错误、大整数计算错误")
-        srp_session_manager.remove_session(auth_data.session_id)
+        logger.error(
+            "SRPAuthProof: 数值计算异常（参数格式或大整数计算错误）- %s",
+            e,
+            exc_info=True,
+        )
+        srp_failure.inc()
+        await run_in_threadpool(
+            srp_session_manager.remove_session, auth_data.session_id
+        )
         raise HTTPException(
             status_code=401, detail=f"Value error in authentication: {str(e)}"
         )
     except Exception as e:
-        logger.error(f"SRPAuthProof: 认证验证异常 - {str(e)}", exc_info=True)
-        logger.error(f"SRPAuthProof: 异常类型: {e.__class__.__name__}")
-        logger.error(f"SRPAuthProof: 异常详情: {str(e)}")
-        srp_session_manager.remove_session(auth_data.session_id)
+        logger.error("SRPAuthProof: 认证验证异常 - %r", e, exc_info=True)
+        if not isinstance(e, HTTPException):
+            srp_failure.inc()
+        await run_in_threadpool(
+            srp_session_manager.remove_session, auth_data.session_id
+        )
         raise HTTPException(status_code=401, detail=f"Verification failed: {str(e)}")
 
 
@@ -250,36 +287,12 @@ async def insecure_register(
     register_data: schemas.InsecureRegisterRequest, db: Session = Depends(get_db)
 ):
     """不安全密码传输注册"""
-    # 检查用户名是否已存在
-    existing_user = (
-        db.query(models.User)
-        .filter(models.User.username == register_data.username)
-        .first()
-    )
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="用户名已存在"
-        )
-
-    # 检查邮箱是否已存在
-    existing_email = (
-        db.query(models.User).filter(models.User.email == register_data.email).first()
-    )
-    if existing_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="邮箱已被注册"
-        )
-
-    # 计算下一个userID（当前用户数量 + 1）
-    user_count = db.query(models.User).count()
-    next_user_id = user_count + 1
-
     # 生成密码hash
     password_hash = hash_password_for_storage(register_data.password)
 
-    # 创建新用户（使用不安全密码传输）
-    db_user = models.User(
-        userID=next_user_id,
+    # 创建新用户（使用不安全密码传输），用户名或邮箱重复由唯一约束判定
+    db_user = await _insert_user(
+        db,
         username=register_data.username,
         email=register_data.email,
         srp_salt="",  # 空值，因为不使用SRP
@@ -288,10 +301,6 @@ async def insecure_register(
         is_insecure_auth=True,
     )
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
     return schemas.SRPRegisterResponse(username=db_user.username, email=db_user.email)
 
 
@@ -301,6 +310,7 @@ async def insecure_login(
     login_data: schemas.InsecureLoginRequest, db: Session = Depends(get_db)
 ):
     """不安全密码传输登录"""
+    await limit_username(login_data.username)
     # 查找用户
     user = (
         db.query(models.User)
@@ -309,21 +319,21 @@ async def insecure_login(
     )
 
     if not user:
-        logger.warning(f"不安全登录: 用户不存在 - {login_data.username}")
+        logger.warning("不安全登录: 用户不存在 - %s", login_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="用户名或密码错误"
         )
 
     # 检查用户是否使用不安全密码传输
     if not user.is_insecure_auth or not user.insecure_password_hash:
-        logger.warning(f"不安全登录: 用户未启用不安全密码传输 - {login_data.username}")
+        logger.warning("不安全登录: 用户未启用不安全密码传输 - %s", login_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="用户名或密码错误"
         )
 
     # 验证密码
     if not verify_password_hash(login_data.password, user.insecure_password_hash):
-        logger.warning(f"不安全登录: 密码验证失败 - {login_data.username}")
+        logger.warning("不安全登录: 密码验证失败 - %s", login_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="用户名或密码错误"
         )
@@ -334,33 +344,83 @@ async def insecure_login(
         data={"sub": user.username}, expires_delta=access_token_expires
     )
 
-    logger.info(f"不安全登录: 登录成功 - {user.username}")
+    refresh_token = await run_write(db, partial(issue_refresh_token, user_id=user.id))
+
+    logger.info("不安全登录: 登录成功 - %s", user.username)
 
     return schemas.InsecureLoginResponse(
         username=user.username,
         access_token=access_token,
+        refresh_token=refresh_token,
+        expires_in=int(access_token_expires.total_seconds()),
         is_insecure_auth=True,
     )
 
 
+# 刷新访问令牌
+@router.post("/refresh", response_model=schemas.TokenRefreshResponse)
+async def refresh(
+    refresh_data: schemas.TokenRefreshRequest, db: Session = Depends(get_db)
+):
+    """用刷新令牌换取新的访问令牌，刷新令牌同时轮换"""
+    rotated = await run_write(
+        db, partial(rotate_refresh_token, token=refresh_data.refresh_token)
+    )
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效或过期的刷新令牌",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user, refresh_token = rotated
+
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    logger.debug("刷新令牌: 用户 %s 获取新的访问令牌", user.username)
+
+    return schemas.TokenRefreshResponse(
+        username=user.username,
+        access_token=access_token,
+        refresh_token=refresh_token,
+        expires_in=int(access_token_expires.total_seconds()),
+    )
+
+
 # Token验证端点
 @router.get("/verify")
 async def verify_token_endpoint(
     current_user: models.User = Depends(get_current_active_user),
 ):
     """验证JWT令牌有效性"""
-    logger.info(f"Token验证: 用户 {current_user.username} 的令牌有效")
+    logger.debug("Token验证: 用户 %s 的令牌有效", current_user.username)
     return {"valid": True, "username": current_user.username}
 
 
 # 用户注销（会话注销）
 @router.post("/logout")
 async def logout(
+    logout_data: Optional[schemas.TokenRefreshRequest] = None,
+    token: str = Depends(jwt_bearer),
     current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
 ):
     """用户注销（会话注销）"""
-    # 对于JWT令牌，由于是无状态的，注销主要是客户端行为
-    # 这里可以记录注销日志或进行其他清理操作
-    logger.info(f"用户注销: {current_user.username}")
+    payload = verify_token(token)
+
+    def revoke(session: Session):
+        # 吊销当前访问令牌，之后携带该令牌的请求在查询数据库之前即被拒绝
+        if payload is not None:
+            denylist.revoke(session, payload)
+        # 请求体带有刷新令牌时，作废该次登录派生出的全部刷新令牌
+        if logout_data is not None:
+            token_id = logout_data.refresh_token.partition(".")[0]
+            row = session.get(models.RefreshToken, token_id)
+            if row is not None and row.user_id == current_user.id:
+                revoke_family(session, row.family_id)
+
+    await run_write(db, revoke)
+    logger.info("用户注销: %s", current_user.username)
 
     return {"message": "注销成功"}
@@ -6,19 +6,35 @@ import hmac
 import hashlib
 import time
 from datetime import datetime
+from typing import Optional
 from urllib.parse import urlencode
 import asyncio
+import logging
+import os
 import websockets
 from app.middleware import get_current_active_user
 from app.models import User
 from app.database import get_db
+from app.instrumentation import observe_upstream
+from app.metrics import REGISTRY
 from sqlalchemy.orm import Session
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/speech", tags=["speech"])
 
 # 讯飞语音API配置
 XUNFEI_HOST = "iat-api.xfyun.cn"
 XUNFEI_PATH = "/v2/iat"
+# 识别服务地址，压测时可指向本地模拟服务（如 ws://127.0.0.1:9001）
+XUNFEI_WS_BASE_URL = os.getenv("XUNFEI_WS_BASE_URL", f"wss://{XUNFEI_HOST}")
+
+SPEECH_SESSIONS = REGISTRY.gauge("speech_sessions_active", "进行中的语音识别会话数")
+SPEECH_BYTES = REGISTRY.counter(
+    "speech_relayed_bytes", "语音识别转发的消息字节数", ["direction"]
+)
+speech_bytes_upstream = SPEECH_BYTES.labels("client_to_upstream")
+speech_bytes_downstream = SPEECH_BYTES.labels("upstream_to_client")
 
 
 class SpeechRecognitionManager:
@@ -65,7 +81,36 @@ def generate_auth_url(api_key: str, api_secret: str) -> str:
     # 构建URL参数
     params = {"host": XUNFEI_HOST, "date": date, "authorization": authorization_base64}
 
-    return f"wss://{XUNFEI_HOST}{XUNFEI_PATH}?{urlencode(params)}"
+    return f"{XUNFEI_WS_BASE_URL}{XUNFEI_PATH}?{urlencode(params)}"
+
+
+def client_message_to_xunfei_frame(data: str) -> Optional[str]:
+    """把客户端消息转换为讯飞数据帧，audio 为音频帧，end 为结束帧，其他消息忽略"""
+    message = json.loads(data)
+
+    if message.get("type") == "audio":
+        # 转发音频数据到讯飞
+        audio_frame = {
+            "data": {
+                "status": message.get("status", 1),
+                "format": "audio/L16;rate=16000",
+                "encoding": "raw",
+                "audio": message["audio"],
+            }
+        }
+        return json.dumps(audio_frame)
+    if message.get("type") == "end":
+        # 发送结束帧
+        end_frame = {
+            "data": {
+                "status": 2,
+                "format": "audio/L16;rate=16000",
+                "encoding": "raw",
+                "audio": "",
+            }
+        }
+        return json.dumps(end_frame)
+    return None
 
 
 async def forward_to_xunfei(
@@ -75,9 +120,13 @@ async def forward_to_xunfei(
     try:
         # 生成鉴权URL
         auth_url = generate_auth_url(api_key, api_secret)
-        print(f"连接到讯飞API: {auth_url}")
+        # 鉴权URL含签名，只记录服务地址
+        logger.info("连接到讯飞API: %s", XUNFEI_WS_BASE_URL)
 
-        async with websockets.connect(auth_url) as xunfei_ws:
+        with observe_upstream("xunfei_connect"):
+            xunfei_connection = await websockets.connect(auth_url)
+
+        async with xunfei_connection as xunfei_ws:
             # 发送初始帧
             initial_frame = {
                 "common": {"app_id": app_id},
@@ -103,48 +152,33 @@ async def forward_to_xunfei(
                 try:
                     while True:
                         data = await websocket.receive_text()
-                        message = json.loads(data)
-
-                        if message.get("type") == "audio":
-                            # 转发音频数据到讯飞
-                            audio_frame = {
-                                "data": {
-                                    "status": message.get("status", 1),
-                                    "format": "audio/L16;rate=16000",
-                                    "encoding": "raw",
-                                    "audio": message["audio"],
-                                }
-                            }
-                            await xunfei_ws.send(json.dumps(audio_frame))
-                        elif message.get("type") == "end":
-                            # 发送结束帧
-                            end_frame = {
-                                "data": {
-                                    "status": 2,
-                                    "format": "audio/L16;rate=16000",
-                                    "encoding": "raw",
-                                    "audio": "",
-                                }
-                            }
-                            await xunfei_ws.send(json.dumps(end_frame))
+                        speech_bytes_upstream.inc(len(data))
+                        frame = client_message_to_xunfei_frame(data)
+                        if frame is not None:
+                            await xunfei_ws.send(frame)
 
                 except WebSocketDisconnect:
-                    print("客户端断开连接")
+                    logger.info("语音识别客户端断开连接")
 
             async def receive_from_xunfei():
                 try:
                     while True:
                         data = await xunfei_ws.recv()
+                        speech_bytes_downstream.inc(len(data))
                         # 转发讯飞响应到客户端
                         await websocket.send_text(data)
                 except websockets.exceptions.ConnectionClosed:
-                    print("讯飞API连接关闭")
+                    logger.info("讯飞API连接关闭")
 
             # 同时处理两个方向的通信
-            await asyncio.gather(receive_from_client(), receive_from_xunfei())
+            SPEECH_SESSIONS.inc()
+            try:
+                await asyncio.gather(receive_from_client(), receive_from_xunfei())
+            finally:
+                SPEECH_SESSIONS.dec()
 
     except Exception as e:
-        print(f"讯飞API连接错误: {e}")
+        logger.warning("讯飞API连接错误: %r", e)
         try:
             # 只在连接仍然打开时发送错误消息
             if websocket.client_state.name == "CONNECTED":
@@ -162,7 +196,7 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
     try:
         # 首先接受WebSocket连接
         await websocket.accept()
-        print("WebSocket连接已接受")
+        logger.debug("语音识别WebSocket连接已接受")
 
         # 等待客户端发送认证信息
         auth_data = await websocket.receive_text()
@@ -192,7 +226,7 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
         except WebSocketDisconnect:
             manager.disconnect(user_id)
         except Exception as e:
-            print(f"语音识别错误: {e}")
+            logger.error("语音识别错误: %r", e, exc_info=True)
             try:
                 # 只在连接仍然打开时发送错误消息
                 if websocket.client_state.name == "CONNECTED":
@@ -204,7 +238,7 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                 pass
 
     except Exception as e:
-        print(f"WebSocket连接错误: {e}")
+        logger.warning("语音识别WebSocket连接错误: %r", e)
         try:
             # 只在连接仍然打开时关闭连接
             if websocket.client_state.name == "CONNECTED":
@@ -1,15 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from functools import partial
+import logging
+from sqlalchemy import bindparam, delete, func, select, update
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
 
-from ..database import get_db
-from .. import models, schemas
-from ..middleware import get_current_active_user
+from ..database import get_db, get_read_db
+from ..db_writer import run_write
+from .. import (
+    activities,
+    models,
+    schemas,
+    search,
+    trip_events,
+    trip_io,
+    trip_stats,
+    trip_sync,
+)
+from ..auth import verify_token
+from ..middleware import get_current_active_user, jwt_bearer
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/trips", tags=["行程"])
 
 
-@router.get("/", response_model=schemas.ListResponse)
+def _activity_count(trip_data) -> Optional[int]:
+    if isinstance(trip_data, dict) and isinstance(trip_data.get('activities'), list):
+        return len(trip_data['activities'])
+    return None
+
+
+@router.get(
+    "/",
+    response_model=schemas.ListResponse,
+    dependencies=[Depends(get_read_db)],
+)
 async def get_trips(
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(10, ge=1, le=100, description="每页数量"),
@@ -47,6 +76,383 @@ async def get_trips(
     )
 
 
+@router.get(
+    "/search",
+    response_model=schemas.TripSearchResponse,
+    dependencies=[Depends(get_read_db)],
+)
+async def search_trips(
+    q: str = Query("", description="检索关键词，空格分隔的多个词需同时命中"),
+    city: Optional[str] = Query(None, description="按城市过滤"),
+    country: Optional[str] = Query(None, description="按国家代码过滤"),
+    status: Optional[str] = Query(None, description="行程状态过滤"),
+    page: int = Query(1, ge=1, description="页码"),
+    size: int = Query(10, ge=1, le=100, description="每页数量"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """全文检索用户行程，并返回城市、国家、状态分面统计"""
+    try:
+        trip_ids, total, facets = search.search_trips(
+            db,
+            current_user.id,
+            query=q,
+            city=city,
+            country=country,
+            status=status,
+            offset=(page - 1) * size,
+            limit=size,
+        )
+    except RuntimeError as e:
+        # 参数 status 遮蔽了 fastapi.status 模块，此处直接使用状态码
+        raise HTTPException(status_code=501, detail=str(e))
+
+    # 按相关度顺序返回当前页的行程
+    trips = db.query(models.Trip).filter(models.Trip.id.in_(trip_ids)).all()
+    trips_by_id = {trip.id: trip for trip in trips}
+    trip_responses = [
+        schemas.TripResponse.from_orm(trips_by_id[trip_id])
+        for trip_id in trip_ids
+        if trip_id in trips_by_id
+    ]
+
+    return schemas.TripSearchResponse(
+        items=trip_responses,
+        total=total,
+        page=page,
+        size=size,
+        pages=(total + size - 1) // size,
+        facets=facets,
+    )
+
+
+def _activity_filters(
+    user_id: int,
+    city: Optional[str],
+    country: Optional[str],
+    start_from: Optional[datetime],
+    start_to: Optional[datetime],
+    min_cost: Optional[float],
+    max_cost: Optional[float],
+):
+    """构建活动明细查询条件"""
+    if not activities.ACTIVITIES_TABLE_ENABLED:
+        raise HTTPException(status_code=501, detail="活动明细表未启用")
+
+    conditions = [models.Activity.user_id == user_id]
+    if city:
+        conditions.append(models.Activity.city == city)
+    if country:
+        conditions.append(models.Activity.country_code == country)
+    if start_from:
+        conditions.append(models.Activity.start_time >= start_from)
+    if start_to:
+        conditions.append(models.Activity.start_time < start_to)
+    if min_cost is not None:
+        conditions.append(models.Activity.estimated_cost >= min_cost)
+    if max_cost is not None:
+        conditions.append(models.Activity.estimated_cost <= max_cost)
+    return conditions
+
+
+@router.get(
+    "/activities",
+    response_model=schemas.ListResponse,
+    dependencies=[Depends(get_read_db)],
+)
+async def get_activities(
+    city: Optional[str] = Query(None, description="按城市过滤"),
+    country: Optional[str] = Query(None, description="按国家代码过滤"),
+    start_from: Optional[datetime] = Query(None, description="开始时间下限（含）"),
+    start_to: Optional[datetime] = Query(None, description="开始时间上限（不含）"),
+    min_cost: Optional[float] = Query(None, description="预估费用下限"),
+    max_cost: Optional[float] = Query(None, description="预估费用上限"),
+    page: int = Query(1, ge=1, description="页码"),
+    size: int = Query(20, ge=1, le=100, description="每页数量"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """跨行程查询活动明细，按开始时间排序"""
+    conditions = _activity_filters(
+        current_user.id, city, country, start_from, start_to, min_cost, max_cost
+    )
+    total = db.scalar(
+        select(func.count()).select_from(models.Activity).where(*conditions)
+    )
+    items = db.scalars(
+        select(models.Activity)
+        .where(*conditions)
+        .order_by(
+            models.Activity.start_time, models.Activity.trip_id, models.Activity.ordinal
+        )
+        .offset((page - 1) * size)
+        .limit(size)
+    ).all()
+
+    return schemas.ListResponse(
+        items=[schemas.ActivityResponse.from_orm(item) for item in items],
+        total=total,
+        page=page,
+        size=size,
+        pages=(total + size - 1) // size,
+    )
+
+
+@router.get(
+    "/activities/summary",
+    response_model=schemas.ActivitySummaryResponse,
+    dependencies=[Depends(get_read_db)],
+)
+async def get_activity_summary(
+    group_by: str = Query(
+        "city", pattern="^(city|country|date)$", description="聚合维度"
+    ),
+    city: Optional[str] = Query(None, description="按城市过滤"),
+    country: Optional[str] = Query(None, description="按国家代码过滤"),
+    start_from: Optional[datetime] = Query(None, description="开始时间下限（含）"),
+    start_to: Optional[datetime] = Query(None, description="开始时间上限（不含）"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """按城市、国家或日期聚合活动数量与预估费用"""
+    conditions = _activity_filters(
+        current_user.id, city, country, start_from, start_to, None, None
+    )
+    key = {
+        "city": models.Activity.city,
+        "country": models.Activity.country_code,
+        "date": func.date(models.Activity.start_time),
+    }[group_by]
+
+    rows = db.execute(
+        select(
+            key.label("key"),
+            func.count().label("activity_count"),
+            func.count(func.distinct(models.Activity.trip_id)).label("trip_count"),
+            func.coalesce(func.sum(models.Activity.estimated_cost), 0).label(
+                "total_cost"
+            ),
+        )
+        .where(*conditions)
+        .group_by(key)
+        .order_by(key)
+    ).all()
+
+    return schemas.ActivitySummaryResponse(
+        group_by=group_by,
+        groups=[
+            schemas.ActivitySummaryGroup(
+                key=None if row.key is None else str(row.key),
+                activity_count=row.activity_count,
+                trip_count=row.trip_count,
+                total_cost=row.total_cost,
+            )
+            for row in rows
+        ],
+    )
+
+
+@router.get("/stats", response_model=schemas.TripStatsResponse)
+async def get_trip_stats(
+    upcoming_limit: int = Query(5, ge=0, le=20, description="即将开始的行程数量"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """用户行程统计：按状态的行程数、总预算、活动数、涉及国家与即将开始的行程"""
+    stats = db.get(models.UserTripStats, current_user.id)
+    if stats is None:
+        # 首次查询时由全部行程建立统计，之后随行程写入增量维护
+        stats = await run_write(
+            db, lambda session: trip_stats.rebuild_user_stats(session, current_user.id)
+        )
+        # 结束查询统计行时开启的读事务，之后的查询才能看到写线程刚写入的明细
+        db.rollback()
+
+    upcoming = (
+        trip_stats.upcoming_trips(db, current_user.id, upcoming_limit)
+        if upcoming_limit
+        else []
+    )
+    return schemas.TripStatsResponse(
+        trip_count=stats.trip_count,
+        status_counts=stats.status_counts,
+        total_budget=stats.total_budget,
+        activity_count=stats.activity_count,
+        country_count=len(stats.country_counts),
+        country_counts=stats.country_counts,
+        upcoming=[
+            schemas.UpcomingTrip(
+                id=row.trip_id,
+                title=row.title,
+                status=row.status,
+                start_date=row.start_date,
+                end_date=row.end_date,
+                budget=row.budget,
+            )
+            for row in upcoming
+        ],
+        updated_at=stats.updated_at,
+    )
+
+
+@router.get("/changes")
+async def stream_trip_changes(
+    token: str = Depends(jwt_bearer),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """以 SSE 推送当前用户的行程新建、更新、删除事件，访问令牌过期时断开"""
+    user_id = current_user.id
+    expires_at = verify_token(token)["exp"]
+    # 长连接期间不占用数据库连接
+    db.close()
+    return StreamingResponse(
+        trip_events.iter_sse(user_id, expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/export")
+async def export_trips(
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """以 NDJSON 流导出用户全部行程（每行一个行程）"""
+    return StreamingResponse(
+        trip_io.iter_export_lines(current_user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="trips.ndjson"'},
+    )
+
+
+@router.post("/import", response_model=schemas.TripImportResponse)
+async def import_trips(
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """从 NDJSON 流批量导入行程，每批作为一个写任务写入"""
+    importer = trip_io.TripImporter(current_user.id)
+
+    async def write(batches):
+        for batch in batches:
+            try:
+                await run_write(db, partial(importer.write_batch, batch=batch))
+            except Exception as e:
+                importer.record(batch, e)
+            else:
+                importer.record(batch)
+
+    # 解析在线程池中执行，写入经由 run_write，事件循环只负责收发数据
+    pending = b""
+    async for chunk in request.stream():
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        await write(await run_in_threadpool(importer.feed_lines, lines))
+    await write(await run_in_threadpool(importer.feed_lines, [pending]))
+    final = importer.finish()
+    if final is not None:
+        await write([final])
+
+    report = importer.report
+    return schemas.TripImportResponse(
+        imported=report.imported, failed=report.failed, errors=report.errors
+    )
+
+
+@router.post("/batch", response_model=schemas.TripBatchResponse)
+async def batch_trips(
+    batch: schemas.TripBatchRequest,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """批量删除行程、修改状态或标题，一次归属校验、一个事务完成"""
+    ids = {operation.id for operation in batch.operations}
+    owned = set(
+        db.scalars(
+            select(models.Trip.id).where(
+                models.Trip.user_id == current_user.id, models.Trip.id.in_(ids)
+            )
+        )
+    )
+
+    # 按请求顺序计算每个行程的最终状态，再统一写入
+    deleted = set()
+    changes: Dict[int, Dict[str, str]] = {}
+    results = []
+    for operation in batch.operations:
+        detail = None
+        if operation.id not in owned:
+            detail = "行程不存在"
+        elif operation.id in deleted:
+            detail = "行程已在本批次中删除"
+        elif operation.op == "delete":
+            deleted.add(operation.id)
+            changes.pop(operation.id, None)
+        elif operation.op == "set_status":
+            if not operation.status:
+                detail = "缺少 status"
+            else:
+                changes.setdefault(operation.id, {})["status"] = operation.status
+        elif operation.op == "retitle":
+            if not operation.title:
+                detail = "缺少 title"
+            else:
+                changes.setdefault(operation.id, {})["title"] = operation.title
+
+        results.append(
+            schemas.TripBatchItemResult(
+                id=operation.id, op=operation.op, success=detail is None, detail=detail
+            )
+        )
+
+    def apply(session: Session):
+        # 归属在写入时再次限定，避免校验之后行程被并发删除或转移
+        if deleted:
+            session.execute(
+                delete(models.Trip).where(
+                    models.Trip.id.in_(deleted),
+                    models.Trip.user_id == current_user.id,
+                )
+            )
+            trip_sync.on_trips_deleted(session, deleted, current_user.id)
+        if changes:
+            # 按修改的列分组，每组一条带用户条件的 executemany UPDATE
+            groups: Dict[tuple, List[dict]] = {}
+            for trip_id, values in changes.items():
+                groups.setdefault(tuple(sorted(values)), []).append(
+                    {"trip_id": trip_id, **values}
+                )
+            table = models.Trip.__table__
+            for columns, rows in groups.items():
+                session.execute(
+                    update(table)
+                    .where(
+                        table.c.user_id == current_user.id,
+                        table.c.id == bindparam("trip_id"),
+                    )
+                    .values({column: bindparam(column) for column in columns}),
+                    rows,
+                )
+            trip_sync.on_trips_saved(
+                session,
+                session.query(models.Trip)
+                .filter(
+                    models.Trip.id.in_(changes.keys()),
+                    models.Trip.user_id == current_user.id,
+                )
+                .populate_existing(),
+            )
+
+    if deleted or changes:
+        await run_write(db, apply)
+
+    succeeded = sum(1 for result in results if result.success)
+    return schemas.TripBatchResponse(
+        results=results, succeeded=succeeded, failed=len(results) - succeeded
+    )
+
+
 @router.post("/", response_model=schemas.TripResponse)
 async def create_trip(
     trip_data: schemas.TripCreate,
@@ -54,21 +460,28 @@ async def create_trip(
     db: Session = Depends(get_db),
 ):
     """创建新行程 - 存储明文数据"""
-    # 创建行程
-    db_trip = models.Trip(
-        title=trip_data.title,
-        trip_data=trip_data.trip_data,
-        user_id=current_user.id,
-    )
 
-    db.add(db_trip)
-    db.commit()
-    db.refresh(db_trip)
+    def create(session: Session):
+        # 创建行程
+        db_trip = models.Trip(
+            title=trip_data.title,
+            trip_data=trip_data.trip_data,
+            user_id=current_user.id,
+        )
+        session.add(db_trip)
+        session.flush()
+        trip_sync.on_trips_saved(session, [db_trip], created=True)
+        session.refresh(db_trip)
+        return db_trip
 
-    return db_trip
+    return await run_write(db, create)
 
 
-@router.get("/{trip_id}", response_model=schemas.TripResponse)
+@router.get(
+    "/{trip_id}",
+    response_model=schemas.TripResponse,
+    dependencies=[Depends(get_read_db)],
+)
 async def get_trip(
     trip_id: int,
     current_user: models.User = Depends(get_current_active_user),
@@ -95,36 +508,45 @@ async def update_trip(
     db: Session = Depends(get_db),
 ):
     """更新行程 - 只更新加密数据"""
-    trip = (
-        db.query(models.Trip)
-        .filter(models.Trip.id == trip_id, models.Trip.user_id == current_user.id)
-        .first()
-    )
-
-    if not trip:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="行程不存在")
-
     # 更新行程信息，不进行业务逻辑验证
     update_data = trip_data.dict(exclude_unset=True)
-    
-    # 调试日志：打印接收到的更新数据
-    print(f"=== 更新行程 {trip_id} ===")
-    print(f"接收到的更新数据: {update_data}")
-    if 'trip_data' in update_data:
-        print(f"trip_data 内容: {update_data['trip_data']}")
-        if 'activities' in update_data['trip_data']:
-            print(f"activities 数量: {len(update_data['trip_data']['activities'])}")
-    
-    for field, value in update_data.items():
-        setattr(trip, field, value)
-
-    db.commit()
-    db.refresh(trip)
-    
-    # 调试日志：打印更新后的数据
-    print(f"更新后的 trip_data: {trip.trip_data}")
-    if trip.trip_data and 'activities' in trip.trip_data:
-        print(f"更新后的 activities 数量: {len(trip.trip_data['activities'])}")
+
+    # 调试日志只记录更新的字段与活动数量，不输出整个行程文档
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "更新行程 %s，字段: %s，activities 数量: %s",
+            trip_id,
+            sorted(update_data),
+            _activity_count(update_data.get('trip_data')),
+        )
+
+    def apply(session: Session):
+        trip = (
+            session.query(models.Trip)
+            .filter(models.Trip.id == trip_id, models.Trip.user_id == current_user.id)
+            .first()
+        )
+
+        if not trip:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="行程不存在"
+            )
+
+        for field, value in update_data.items():
+            setattr(trip, field, value)
+
+        session.flush()
+        trip_sync.on_trips_saved(session, [trip])
+        session.refresh(trip)
+        return trip
+
+    trip = await run_write(db, apply)
+
+    logger.debug(
+        "行程 %s 更新完成，activities 数量: %s",
+        trip_id,
+        _activity_count(trip.trip_data),
+    )
 
     return trip
 
@@ -136,16 +558,22 @@ async def delete_trip(
     db: Session = Depends(get_db),
 ):
     """删除行程"""
-    trip = (
-        db.query(models.Trip)
-        .filter(models.Trip.id == trip_id, models.Trip.user_id == current_user.id)
-        .first()
-    )
 
-    if not trip:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="行程不存在")
+    def apply(session: Session):
+        trip = (
+            session.query(models.Trip)
+            .filter(models.Trip.id == trip_id, models.Trip.user_id == current_user.id)
+            .first()
+        )
+
+        if not trip:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="行程不存在"
+            )
+
+        session.delete(trip)
+        trip_sync.on_trips_deleted(session, [trip.id], trip.user_id)
 
-    db.delete(trip)
-    db.commit()
+    await run_write(db, apply)
 
     return {"message": "行程删除成功"}
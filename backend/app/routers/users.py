@@ -1,14 +1,35 @@
+from datetime import timedelta
+from functools import partial
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from ..database import get_db
-from .. import models, schemas
+from ..database import get_db, get_read_db
+from ..db_writer import run_write
+from .. import models, schemas, trip_sync
+from ..auth import ACCESS_TOKEN_EXPIRE_MINUTES
+from ..refresh_tokens import delete_user_tokens
+from ..token_denylist import denylist
 from ..middleware import get_current_active_user
 
 router = APIRouter(prefix="/user", tags=["用户"])
 
 
-@router.get("/me", response_model=schemas.UserResponse)
+def _update_user(session: Session, user_id: int, **fields) -> models.User:
+    """更新用户字段（写任务）"""
+    user = session.get(models.User, user_id)
+    for field, value in fields.items():
+        setattr(user, field, value)
+    session.flush()
+    session.refresh(user)
+    return user
+
+
+@router.get(
+    "/me",
+    response_model=schemas.UserResponse,
+    dependencies=[Depends(get_read_db)],
+)
 async def get_current_user_info(
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
@@ -37,11 +58,7 @@ async def update_api_keys(
     }
 
     # 更新用户记录
-    for key, value in update_data.items():
-        setattr(current_user, key, value)
-
-    db.commit()
-    db.refresh(current_user)
+    await run_write(db, partial(_update_user, user_id=current_user.id, **update_data))
 
     # 返回存储的API密钥
     return schemas.APIKeysResponse(**update_data)
@@ -98,13 +115,9 @@ async def update_profile(
 
     # 更新用户信息
     update_data = user_data.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(current_user, field, value)
-
-    db.commit()
-    db.refresh(current_user)
-
-    return current_user
+    return await run_write(
+        db, partial(_update_user, user_id=current_user.id, **update_data)
+    )
 
 
 @router.delete("/delete", response_model=schemas.UserDeleteResponse)
@@ -116,9 +129,19 @@ async def delete_user(
     # 仅依赖JWT认证，无需额外密码验证
     # 删除用户及其所有相关数据
     # 由于设置了级联删除，用户的行程和活动也会被自动删除
-    db.delete(current_user)
-    db.commit()
+    user_id, username = current_user.id, current_user.username
+
+    def delete(session: Session):
+        trip_sync.on_user_deleted(session, user_id)
+        delete_user_tokens(session, user_id)
+        # 该用户已签发的访问令牌全部吊销，同名用户重新注册后签发的令牌不受影响
+        denylist.revoke_subject(
+            session, username, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        session.delete(session.get(models.User, user_id))
+
+    await run_write(db, delete)
 
     return schemas.UserDeleteResponse(
-        message="用户注销成功，所有数据已永久删除", username=current_user.username
+        message="用户注销成功，所有数据已永久删除", username=username
     )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
 # 使用标准字符串类型而不是自定义类型
@@ -73,10 +73,28 @@ class SRPAuthenticateResponse(BaseSchema):
     username: str
     M2: Optional[str] = Field(None, pattern=r'^[A-Za-z0-9+/]*={0,2}$')  # 服务器证明
     access_token: Optional[str]
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
+    expires_in: Optional[int] = None  # 访问令牌有效秒数
     success: bool
 
 
+class TokenRefreshRequest(BaseSchema):
+    """刷新令牌请求"""
+
+    refresh_token: str = Field(..., max_length=128)
+
+
+class TokenRefreshResponse(BaseSchema):
+    """刷新令牌响应：新的访问令牌与轮换后的刷新令牌"""
+
+    username: str
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+
 class UserUpdate(BaseSchema):
     username: Optional[str] = None
     email: Optional[str] = None
@@ -111,6 +129,9 @@ class APIKeysResponse(APIKeysBase):
 
 
 # 行程相关模型
+TripStatus = Literal["planning", "in_progress", "completed", "cancelled"]
+
+
 class TripBase(BaseSchema):
     title: str
     status: str = "planning"  # planning, in_progress, completed, cancelled
@@ -127,6 +148,58 @@ class TripUpdate(BaseSchema):
     trip_data: Optional[Dict[str, Any]] = None  # 明文的行程数据
 
 
+class TripImportItem(BaseSchema):
+    """NDJSON 导入的单行数据，与导出格式一致（id 字段会被忽略）"""
+
+    title: str = Field(..., min_length=1, max_length=200)
+    status: TripStatus = "planning"
+    trip_data: Dict[str, Any]
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class TripImportResponse(BaseSchema):
+    """NDJSON 导入结果"""
+
+    imported: int
+    failed: int
+    errors: List[Dict[str, Any]] = []
+
+
+class TripBatchOperation(BaseSchema):
+    """批量操作中的单项：delete 删除，set_status 修改状态，retitle 修改标题"""
+
+    id: int
+    op: Literal["delete", "set_status", "retitle"]
+    status: Optional[TripStatus] = None  # set_status 时必填
+    title: Optional[str] = Field(
+        None, min_length=1, max_length=200
+    )  # retitle 时必填，长度同 trips.title
+
+
+class TripBatchRequest(BaseSchema):
+    """批量操作请求，按顺序执行并在同一事务中提交"""
+
+    operations: List[TripBatchOperation] = Field(..., min_length=1, max_length=1000)
+
+
+class TripBatchItemResult(BaseSchema):
+    """单项操作结果"""
+
+    id: int
+    op: str
+    success: bool
+    detail: Optional[str] = None
+
+
+class TripBatchResponse(BaseSchema):
+    """批量操作响应"""
+
+    results: List[TripBatchItemResult]
+    succeeded: int
+    failed: int
+
+
 class TripResponse(TripBase):
     id: int
     user_id: int
@@ -135,6 +208,55 @@ class TripResponse(TripBase):
     updated_at: datetime
 
 
+# 活动明细相关模型
+class ActivityResponse(BaseSchema):
+    trip_id: int
+    ordinal: int
+    title: Optional[str] = None
+    location: Optional[str] = None
+    city: Optional[str] = None
+    country_code: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    estimated_cost: Optional[float] = None
+
+
+class ActivitySummaryGroup(BaseSchema):
+    """按维度聚合的一组活动统计"""
+
+    key: Optional[str]
+    activity_count: int
+    trip_count: int
+    total_cost: float
+
+
+class ActivitySummaryResponse(BaseSchema):
+    group_by: str
+    groups: List[ActivitySummaryGroup]
+
+
+class UpcomingTrip(BaseSchema):
+    id: int
+    title: Optional[str] = None
+    status: str
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    budget: Optional[float] = None
+
+
+class TripStatsResponse(BaseSchema):
+    """用户行程统计，country_counts 为国家代码到涉及该国行程数的映射"""
+
+    trip_count: int
+    status_counts: Dict[str, int]
+    total_budget: float
+    activity_count: int
+    country_count: int
+    country_counts: Dict[str, int]
+    upcoming: List[UpcomingTrip]
+    updated_at: Optional[datetime] = None
+
+
 # 认证相关模型
 class Token(BaseSchema):
     access_token: str
@@ -154,6 +276,12 @@ class ListResponse(BaseSchema):
     pages: int
 
 
+class TripSearchResponse(ListResponse):
+    """行程检索响应，facets 为各分面取值到命中数量的映射"""
+
+    facets: Dict[str, Dict[str, int]]
+
+
 # 不安全密码传输相关模型
 class InsecureRegisterRequest(BaseSchema):
     """不安全密码传输注册请求"""
@@ -175,7 +303,9 @@ class InsecureLoginResponse(BaseSchema):
 
     username: str
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
+    expires_in: Optional[int] = None
     is_insecure_auth: bool = True
 
 
@@ -0,0 +1,382 @@
+"""
+行程全文检索索引
+
+SQLite 使用 FTS5 虚拟表，PostgreSQL 使用 tsvector + GIN 索引。
+中日韩文字在写入索引和查询时都会被切分为相邻二元组（bigram），
+因此无需额外的分词插件即可检索任意长度的中文子串。单字不构成二元组，
+另在 chars 列中索引行程出现过的每个中日韩字符，单字查询匹配该列。
+"""
+
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import column, inspect, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "trip_search"
+
+# 多值字段（城市、国家）在索引表中的分隔符，首尾同样带分隔符便于精确匹配
+FACET_SEP = "|"
+
+# 中日韩统一表意文字、假名、韩文音节
+_CJK_CHARS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"(?P<cjk>[{_CJK_CHARS}]+)|[^\\W{_CJK_CHARS}]+")
+_CJK_RE = re.compile(f"[{_CJK_CHARS}]")
+
+# 索引表必须具备的列，已有的表缺少时删除重建（启动时补建全部行程的索引）
+_REQUIRED_COLUMNS = {"sqlite": {"body", "chars"}, "postgresql": {"document", "chars"}}
+
+
+def _dialect(bind) -> Optional[str]:
+    name = bind.dialect.name
+    return name if name in ("sqlite", "postgresql") else None
+
+
+def segment_text(value: str) -> List[str]:
+    """将文本切分为索引词：中日韩文字按二元组切分，其余按单词切分"""
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(value.lower()):
+        run = match.group()
+        if match.lastgroup == "cjk" and len(run) > 1:
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def segment_chars(value: str) -> List[str]:
+    """文本中出现过的中日韩字符（去重，保持出现顺序）"""
+    return list(dict.fromkeys(_CJK_RE.findall(value.lower())))
+
+
+def _query_terms(query: str) -> Tuple[List[List[str]], List[str]]:
+    """
+    将查询串拆分为 (短语列表, 单字列表)
+
+    短语是需要在 body 中相邻出现的索引词序列；中日韩单字在 body 中只以
+    二元组的一部分出现，改为在 chars 列中匹配。
+    """
+    phrases: List[List[str]] = []
+    chars: List[str] = []
+    for term in query.split():
+        phrase: List[str] = []
+        for token in segment_text(term):
+            if len(token) == 1 and _CJK_RE.match(token):
+                chars.append(token)
+                if phrase:
+                    phrases.append(phrase)
+                    phrase = []
+            else:
+                phrase.append(token)
+        if phrase:
+            phrases.append(phrase)
+    return phrases, chars
+
+
+def _document(trip: models.Trip) -> Tuple[str, str, str, str]:
+    """从行程中提取 (检索文本, 中日韩单字, 城市列表, 国家列表)"""
+    data = trip.trip_data or {}
+    parts = [trip.title, data.get("title"), data.get("description")]
+    cities, countries = [], []
+    for activity in data.get("activities") or []:
+        if not isinstance(activity, dict):
+            continue
+        parts.extend(
+            activity.get(key) for key in ("title", "location", "city", "notes")
+        )
+        city, country = activity.get("city"), activity.get("countryCode")
+        if city and city not in cities:
+            cities.append(city)
+        if country and country not in countries:
+            countries.append(country)
+
+    text_parts = " ".join(part for part in parts if isinstance(part, str))
+    body = " ".join(segment_text(text_parts))
+    chars = " ".join(segment_chars(text_parts))
+    return body, chars, _join_facet(cities), _join_facet(countries)
+
+
+def _join_facet(values: List[str]) -> str:
+    cleaned = [str(v).replace(FACET_SEP, " ") for v in values]
+    return FACET_SEP + FACET_SEP.join(cleaned) + FACET_SEP if cleaned else ""
+
+
+def init_search_index(bind: Engine):
+    """创建检索索引表（如不存在），并补齐尚未建立索引的行程"""
+    dialect = _dialect(bind)
+    if dialect is None:
+        logger.warning("当前数据库不支持全文检索索引: %s", bind.dialect.name)
+        return
+
+    # 检索按用户过滤时经由 trips(user_id) 索引，已有的数据库在此补建
+    for index in models.Trip.__table__.indexes:
+        index.create(bind, checkfirst=True)
+
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        if inspector.has_table(SEARCH_TABLE):
+            columns = {c["name"] for c in inspector.get_columns(SEARCH_TABLE)}
+            if not _REQUIRED_COLUMNS[dialect] <= columns:
+                logger.info("检索索引表结构已变化，删除后重建")
+                conn.execute(text(f"DROP TABLE {SEARCH_TABLE}"))
+
+        if dialect == "sqlite":
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                    "body, chars, user_id UNINDEXED, status UNINDEXED, "
+                    "cities UNINDEXED, countries UNINDEXED, "
+                    "tokenize='unicode61 remove_diacritics 2')"
+                )
+            )
+        else:
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                    "trip_id INTEGER PRIMARY KEY "
+                    "REFERENCES trips(id) ON DELETE CASCADE, "
+                    "user_id INTEGER NOT NULL, status VARCHAR(20), "
+                    "cities TEXT NOT NULL DEFAULT '', "
+                    "countries TEXT NOT NULL DEFAULT '', "
+                    "document TSVECTOR NOT NULL, chars TSVECTOR NOT NULL)"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document "
+                    f"ON {SEARCH_TABLE} USING GIN (document)"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_user_id "
+                    f"ON {SEARCH_TABLE} (user_id)"
+                )
+            )
+
+    indexed = select(column(_key_column(dialect))).select_from(table(SEARCH_TABLE))
+    with Session(bind=bind) as db:
+        missing = db.scalars(
+            select(models.Trip.id).where(models.Trip.id.not_in(indexed))
+        ).all()
+        for start in range(0, len(missing), 500):
+            chunk = missing[start : start + 500]
+            index_trips(db, db.query(models.Trip).filter(models.Trip.id.in_(chunk)))
+            db.commit()
+            db.expunge_all()
+        if missing:
+            logger.info("已为 %d 个行程补建检索索引", len(missing))
+
+
+def _key_column(dialect: str) -> str:
+    return "rowid" if dialect == "sqlite" else "trip_id"
+
+
+def index_trip(db: Session, trip: models.Trip):
+    """写入或刷新单个行程的检索索引（在调用方事务内执行）"""
+    index_trips(db, [trip])
+
+
+def index_trips(db: Session, trips: Iterable[models.Trip]):
+    """批量写入或刷新行程检索索引，使用 executemany 一次提交多行"""
+    dialect = _dialect(db.get_bind())
+    if dialect is None:
+        return
+
+    params = []
+    for trip in trips:
+        body, chars, cities, countries = _document(trip)
+        params.append(
+            {
+                "trip_id": trip.id,
+                "user_id": trip.user_id,
+                "status": trip.status or "planning",
+                "body": body,
+                "chars": chars,
+                "cities": cities,
+                "countries": countries,
+            }
+        )
+    if not params:
+        return
+
+    if dialect == "sqlite":
+        db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :trip_id"), params)
+        db.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE} "
+                "(rowid, body, chars, user_id, status, cities, countries) "
+                "VALUES (:trip_id, :body, :chars, :user_id, :status, "
+                ":cities, :countries)"
+            ),
+            params,
+        )
+    else:
+        db.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE} "
+                "(trip_id, user_id, status, cities, countries, document, chars) "
+                "VALUES (:trip_id, :user_id, :status, :cities, :countries, "
+                "to_tsvector('simple', :body), to_tsvector('simple', :chars)) "
+                "ON CONFLICT (trip_id) DO UPDATE SET "
+                "user_id = EXCLUDED.user_id, status = EXCLUDED.status, "
+                "cities = EXCLUDED.cities, countries = EXCLUDED.countries, "
+                "document = EXCLUDED.document, chars = EXCLUDED.chars"
+            ),
+            params,
+        )
+
+
+def unindex_trips(db: Session, trip_ids: Iterable[int]):
+    """从检索索引中移除行程"""
+    dialect = _dialect(db.get_bind())
+    ids = list(trip_ids)
+    if dialect is None or not ids:
+        return
+    db.execute(
+        text(f"DELETE FROM {SEARCH_TABLE} WHERE {_key_column(dialect)} = :trip_id"),
+        [{"trip_id": trip_id} for trip_id in ids],
+    )
+
+
+def unindex_user(db: Session, user_id: int):
+    """移除某个用户的全部检索索引（用户注销时调用）"""
+    if _dialect(db.get_bind()) is None:
+        return
+    db.execute(
+        text(f"DELETE FROM {SEARCH_TABLE} WHERE user_id = :user_id"),
+        {"user_id": user_id},
+    )
+
+
+def search_trips(
+    db: Session,
+    user_id: int,
+    query: str = "",
+    city: Optional[str] = None,
+    country: Optional[str] = None,
+    status: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 10,
+) -> Tuple[List[int], int, Dict[str, Dict[str, int]]]:
+    """
+    检索用户行程
+
+    返回 (当前页行程ID列表（按相关度排序）, 命中总数, 分面统计)
+    当前页与分面统计都在数据库中完成（LIMIT/OFFSET 与 GROUP BY），
+    返回给应用的行数只与页大小和分面取值数有关，与命中数无关。
+    """
+    dialect = _dialect(db.get_bind())
+    if dialect is None:
+        raise RuntimeError("当前数据库不支持全文检索")
+
+    key = _key_column(dialect)
+    if dialect == "sqlite":
+        # FTS5 的 UNINDEXED 列不能走索引，按用户过滤改由 trips(user_id) 索引给出行程ID
+        conditions = ["rowid IN (SELECT id FROM trips WHERE user_id = :user_id)"]
+    else:
+        conditions = ["user_id = :user_id"]
+    params: Dict[str, Any] = {"user_id": user_id}
+    rank = ""
+
+    phrases, chars = _query_terms(query)
+    if dialect == "sqlite":
+        if phrases or chars:
+            conditions.append(f"{SEARCH_TABLE} MATCH :query")
+            params["query"] = " AND ".join(
+                [f"body : {_quote_phrase(tokens)}" for tokens in phrases]
+                + [f"chars : {_quote_phrase([char])}" for char in chars]
+            )
+            rank = f"bm25({SEARCH_TABLE})"
+    else:
+        if phrases:
+            conditions.append("document @@ to_tsquery('simple', :query)")
+            params["query"] = " & ".join(
+                "(" + " <-> ".join(_quote_lexeme(t) for t in tokens) + ")"
+                for tokens in phrases
+            )
+            rank = "-ts_rank(document, to_tsquery('simple', :query))"
+        if chars:
+            conditions.append("chars @@ to_tsquery('simple', :chars)")
+            params["chars"] = " & ".join(_quote_lexeme(char) for char in chars)
+
+    if status:
+        conditions.append("status = :status")
+        params["status"] = status
+    if city:
+        conditions.append("cities LIKE :city ESCAPE '\\'")
+        params["city"] = _facet_pattern(city)
+    if country:
+        conditions.append("countries LIKE :country ESCAPE '\\'")
+        params["country"] = _facet_pattern(country)
+    where = " AND ".join(conditions)
+
+    order = f"{rank}, {key} DESC" if rank else f"{key} DESC"
+    page_ids = db.scalars(
+        text(
+            f"SELECT {key} FROM {SEARCH_TABLE} WHERE {where} "
+            f"ORDER BY {order} LIMIT :limit OFFSET :offset"
+        ),
+        {**params, "limit": limit, "offset": offset},
+    ).all()
+
+    # 每个行程恰有一个状态，状态分面之和即命中总数
+    facets = {
+        "status": _counts(
+            db,
+            f"SELECT status AS value, count(*) AS n FROM {SEARCH_TABLE} "
+            f"WHERE {where} GROUP BY status",
+            params,
+        )
+    }
+    for name, facet_column in (("city", "cities"), ("country", "countries")):
+        facets[name] = _counts(
+            db, _split_facet_sql(dialect, facet_column, where), params
+        )
+    return page_ids, sum(facets["status"].values()), facets
+
+
+def _facet_pattern(value: str) -> str:
+    """匹配多值字段中某个取值的 LIKE 模式，值中的 % 与 _ 按字面匹配"""
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{FACET_SEP}{escaped}{FACET_SEP}%"
+
+
+def _split_facet_sql(dialect: str, facet_column: str, where: str) -> str:
+    """按分隔符拆开多值字段并计数的 SQL（每个行程内的取值已去重）"""
+    if dialect == "sqlite":
+        return (
+            "WITH RECURSIVE split(value, rest) AS ("
+            f"SELECT '', substr({facet_column}, 2) FROM {SEARCH_TABLE} "
+            f"WHERE {where} "
+            "UNION ALL "
+            f"SELECT substr(rest, 1, instr(rest, '{FACET_SEP}') - 1), "
+            f"substr(rest, instr(rest, '{FACET_SEP}') + 1) "
+            "FROM split WHERE rest <> '') "
+            "SELECT value, count(*) AS n FROM split WHERE value <> '' "
+            "GROUP BY value"
+        )
+    return (
+        f"SELECT value, count(*) AS n FROM {SEARCH_TABLE}, "
+        f"unnest(string_to_array({facet_column}, '{FACET_SEP}')) AS value "
+        f"WHERE {where} AND value <> '' GROUP BY value"
+    )
+
+
+def _counts(db: Session, sql: str, params: Dict[str, Any]) -> Dict[str, int]:
+    rows = db.execute(text(f"{sql} ORDER BY n DESC, value"), params).all()
+    return {row.value: row.n for row in rows}
+
+
+def _quote_phrase(tokens: List[str]) -> str:
+    return '"' + " ".join(tokens).replace('"', '""') + '"'
+
+
+def _quote_lexeme(token: str) -> str:
+    return "'" + token.replace("\\", "\\\\").replace("'", "''") + "'"
@@ -1,25 +1,304 @@
 import srp
 import secrets
 import base64
+import hmac
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
 from typing import Tuple, Optional, Dict, Any
 import hashlib
 
+from dotenv import load_dotenv
+from srp import _pysrp
+
+from .metrics import REGISTRY
+
+try:
+    import gmpy2
+except ImportError:  # 可选依赖，未安装时使用 srp 库自身的大整数运算
+    gmpy2 = None
+
+load_dotenv()
+
 srp.rfc5054_enable()
 
+# SRP会话存储：memory 为进程内字典（单进程）；database 为数据库共享存储，
+# 多个 worker 之间可以完成同一次挑战-验证
+SRP_SESSION_STORE = os.getenv("SRP_SESSION_STORE", "memory").lower()
+SRP_SESSION_TTL_SECONDS = int(os.getenv("SRP_SESSION_TTL_SECONDS", "300"))
+
+SRP_HANDSHAKE_DURATION = REGISTRY.histogram(
+    "srp_handshake_duration_seconds", "SRP握手各阶段服务端耗时", ["phase"]
+)
+SRP_HANDSHAKES = REGISTRY.counter("srp_handshakes", "SRP握手结果", ["result"])
+srp_challenge_timer = SRP_HANDSHAKE_DURATION.labels("challenge")
+srp_proof_timer = SRP_HANDSHAKE_DURATION.labels("proof")
+srp_success = SRP_HANDSHAKES.labels("success")
+srp_failure = SRP_HANDSHAKES.labels("failure")
+
+logger = logging.getLogger(__name__)
+
+# 预计算的服务端临时密钥 (b, g^b) 池大小，0 表示关闭（每次挑战现场计算）
+SRP_EPHEMERAL_POOL_SIZE = int(os.getenv("SRP_EPHEMERAL_POOL_SIZE", "64"))
+
+# SRP 大整数运算：gmpy2 用 GMP 的 powmod 计算；srp 交给 srp.Verifier（C 扩展可用时
+# 为 OpenSSL，否则为 Python 整数）；python 用内置 pow；auto 在安装了 gmpy2 时使用 gmpy2
+SRP_BIGINT_BACKEND = os.getenv("SRP_BIGINT_BACKEND", "auto").lower()
+if SRP_BIGINT_BACKEND == "auto":
+    SRP_BIGINT_BACKEND = "srp" if gmpy2 is None else "gmpy2"
+elif SRP_BIGINT_BACKEND == "gmpy2" and gmpy2 is None:
+    raise RuntimeError("SRP_BIGINT_BACKEND=gmpy2 需要安装 gmpy2")
+
+_CTSRP = srp.Verifier.__module__.endswith("_ctsrp")
+
+# 服务端私有随机数 b 的字节数：C 实现要求 32 字节，纯 Python 实现要求 256 字节
+SRP_B_LENGTH = 32 if _CTSRP else 256
+
+
+def create_verifier(username: str, salt: bytes, verifier: bytes, A: bytes, b: bytes):
+    """用指定的私有随机数 b 创建服务器端SRP对象"""
+    return srp.Verifier(
+        username,
+        salt,
+        verifier,
+        A,
+        hash_alg=srp.SHA256,
+        ng_type=srp.NG_4096,
+        bytes_b=b,
+    )
+
+
+# SRP-6a 参数（RFC 5054 4096 位组，SHA-256）：k = H(N | PAD(g))
+SRP_N, SRP_G = _pysrp.get_ng(srp.NG_4096, None, None)
+_N_WIDTH = (SRP_N.bit_length() + 7) // 8
+SRP_K = int.from_bytes(
+    hashlib.sha256(
+        SRP_N.to_bytes(_N_WIDTH, "big") + SRP_G.to_bytes(_N_WIDTH, "big")
+    ).digest(),
+    "big",
+)
+
+
+_HN_XOR_HG = bytes(
+    x ^ y
+    for x, y in zip(
+        hashlib.sha256(SRP_N.to_bytes(_N_WIDTH, "big")).digest(),
+        hashlib.sha256(SRP_G.to_bytes(_N_WIDTH, "big")).digest(),
+    )
+)
+
+if SRP_BIGINT_BACKEND == "gmpy2":
+    _powmod = gmpy2.powmod
+    _MODULUS = gmpy2.mpz(SRP_N)
+else:
+    _powmod = pow
+    _MODULUS = SRP_N
+
+
+def _int_to_bytes(value: int) -> bytes:
+    """与 srp 库一致的大端编码，不保留前导零"""
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+
+def _pad(value: int) -> bytes:
+    """RFC 5054 的 PAD()：补齐到 N 的字节长度"""
+    return value.to_bytes(_N_WIDTH, "big")
+
+
+def _salt_bytes(salt: bytes) -> bytes:
+    # C 实现把盐值当作大整数处理（去掉前导零），Python 实现原样使用
+    return _int_to_bytes(int.from_bytes(salt, "big")) if _CTSRP else salt
+
+
+def power_of_g(b: bytes) -> int:
+    """
+    计算 g^b mod N
+
+    C 实现可用时借用 srp.Verifier：验证器 v 为 0 时 B = k*v + g^b 即为 g^b，
+    OpenSSL 计算期间释放 GIL，后台线程不会阻塞事件循环；否则用 powmod 计算。
+    """
+    if _CTSRP:
+        _, B = create_verifier("", b"\x00", b"\x00", b"\x01", b).get_challenge()
+        return int.from_bytes(B, "big")
+    return int(_powmod(SRP_G, int.from_bytes(b, "big"), _MODULUS))
+
+
+class SRPVerifier:
+    """
+    SRP-6a 服务端验证器（RFC 5054，SHA-256，4096 位组）
+
+    接口与字节输出同 srp.Verifier（get_challenge / verify_session）。挑战阶段
+    B = k*v + g^b，有预计算的 g^b 时只做一次乘加；验证阶段计算
+    S = (A * v^u)^b 与会话密钥并校验客户端证明。大整数运算按
+    SRP_BIGINT_BACKEND 使用 gmpy2 或内置 pow，或交给用同一个 b 创建的 srp.Verifier。
+    """
+
+    def __init__(
+        self,
+        username: str,
+        salt: bytes,
+        verifier: bytes,
+        A: bytes,
+        b: bytes,
+        gb: Optional[int] = None,
+    ):
+        self.username = username
+        self.salt = salt
+        self.verifier = verifier
+        self.A = A
+        self.b = b
+        self._svr = None
+        self._A = int.from_bytes(A, "big")
+        # SRP-6a 安全检查：A mod N 为 0 时拒绝，与 srp.Verifier 相同
+        self.safety_failed = self._A % SRP_N == 0
+        if self.safety_failed:
+            self._challenge = (None, None)
+            return
+        if gb is None:
+            if SRP_BIGINT_BACKEND == "srp":
+                self._svr = create_verifier(username, salt, verifier, A, b)
+                self._challenge = self._svr.get_challenge()
+                return
+            gb = power_of_g(b)
+        self._B = (SRP_K * int.from_bytes(verifier, "big") + gb) % SRP_N
+        self._challenge = (_salt_bytes(salt), _int_to_bytes(self._B))
+
+    def get_challenge(self):
+        return self._challenge
+
+    def verify_session(self, user_M: bytes) -> Optional[bytes]:
+        """客户端证明 M 正确时返回服务端证明 H(A, M, K)，否则返回 None"""
+        if self.safety_failed:
+            return None
+        if SRP_BIGINT_BACKEND == "srp":
+            if self._svr is None:
+                self._svr = create_verifier(
+                    self.username, self.salt, self.verifier, self.A, self.b
+                )
+            return self._svr.verify_session(user_M)
+
+        u = int.from_bytes(
+            hashlib.sha256(_pad(self._A) + _pad(self._B)).digest(), "big"
+        )
+        v = int.from_bytes(self.verifier, "big")
+        S = _powmod(
+            self._A * _powmod(v, u, _MODULUS), int.from_bytes(self.b, "big"), _MODULUS
+        )
+        K = hashlib.sha256(_int_to_bytes(int(S))).digest()
+        A = _int_to_bytes(self._A)
+        M = hashlib.sha256(
+            _HN_XOR_HG
+            + hashlib.sha256(self.username.encode()).digest()
+            + _salt_bytes(self.salt)
+            + A
+            + _int_to_bytes(self._B)
+            + K
+        ).digest()
+        if not hmac.compare_digest(M, user_M):
+            return None
+        return hashlib.sha256(A + M + K).digest()
+
+
+SRP_EPHEMERAL_POOL_TAKES = REGISTRY.counter(
+    "srp_ephemeral_pool_takes", "SRP挑战取用预计算临时密钥的结果", ["result"]
+)
+srp_ephemeral_hit = SRP_EPHEMERAL_POOL_TAKES.labels("hit")
+srp_ephemeral_miss = SRP_EPHEMERAL_POOL_TAKES.labels("miss")
+
+
+class EphemeralPool:
+    """
+    预计算的服务端临时密钥池
+
+    g^b 与用户无关，由后台线程预先计算 (b, g^b) 放入池中；每对只取用一次。
+    池中数量低于一半时唤醒后台线程补满，池空时调用方现场计算。
+    """
+
+    def __init__(self, size: int = SRP_EPHEMERAL_POOL_SIZE):
+        self.size = size
+        self._pairs: deque = deque()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def depth(self) -> int:
+        return len(self._pairs)
+
+    def start(self):
+        if self.size <= 0 or self.running:
+            return
+        self._stopped.clear()
+        self._wakeup.set()
+        self._thread = threading.Thread(
+            target=self._refill, name="srp-ephemeral-pool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def take(self) -> Tuple[bytes, Optional[int]]:
+        """取出一对 (b, g^b)；池空时返回新的随机 b，g^b 为 None"""
+        try:
+            b, gb = self._pairs.popleft()
+        except IndexError:
+            srp_ephemeral_miss.inc()
+            b, gb = secrets.token_bytes(SRP_B_LENGTH), None
+        else:
+            srp_ephemeral_hit.inc()
+        if self.size > 0 and len(self._pairs) < self.size // 2:
+            self._wakeup.set()
+        return b, gb
+
+    def _refill(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while len(self._pairs) < self.size and not self._stopped.is_set():
+                try:
+                    b = secrets.token_bytes(SRP_B_LENGTH)
+                    self._pairs.append((b, power_of_g(b)))
+                except Exception:
+                    logger.exception("预计算SRP临时密钥失败")
+                    self._stopped.wait(1)
+
+
+ephemeral_pool = EphemeralPool()
+REGISTRY.gauge(
+    "srp_ephemeral_pool_depth", "预计算的SRP服务端临时密钥数量"
+).set_function(ephemeral_pool.depth)
+
+
+def start_ephemeral_pool():
+    ephemeral_pool.start()
+
+
+def stop_ephemeral_pool():
+    ephemeral_pool.stop()
+
 
 class SRPSession:
     def __init__(self):
-        # 可以考虑使用Redis扩容
+        # 多进程部署使用 DatabaseSRPSession
         self.sessions = {}
         srp.rfc5054_enable()
 
     def create_session(self, username: str, salt: bytes, verifier: bytes, A: bytes):
         """创建SRP会话并存储验证器对象"""
-        # 创建服务器端SRP对象
-        svr = srp.Verifier(
-            username, salt, verifier, A, hash_alg=srp.SHA256, ng_type=srp.NG_4096
-        )
-        session_id = f"session_{username}_{id(svr)}"
+        # 创建服务器端SRP对象，b 与 g^b 优先取自预计算池
+        svr = SRPVerifier(username, salt, verifier, A, *ephemeral_pool.take())
+        session_id = generate_session_token()
         self.sessions[session_id] = {
             'username': username,
             'verifier': svr,
@@ -35,8 +314,111 @@ class SRPSession:
             del self.sessions[session_id]
 
 
+class DatabaseSRPSession:
+    """
+    数据库共享的SRP会话存储
+
+    挑战阶段保存 salt、verifier、A、服务端私有随机数 b 与公钥 B，验证阶段
+    由任意 worker 用同一个 b 重建验证器对象，g^b 由 B - k*v 得到，
+    不重新做模幂运算；会话超过有效期即失效。
+    创建会话的线程紧接着读取同一会话时（挑战阶段），直接使用刚创建的
+    验证器对象，不再查询数据库，也不重新计算 g^b。
+    写入经由 run_write_blocking（production 配置下由单写线程提交），
+    各方法会阻塞调用线程，应在线程池中调用。
+    """
+
+    def __init__(self):
+        self._created = threading.local()
+
+    def create_session(self, username: str, salt: bytes, verifier: bytes, A: bytes):
+        from . import models
+        from .db_writer import run_write_blocking
+
+        svr = SRPVerifier(username, salt, verifier, A, *ephemeral_pool.take())
+        B = svr.get_challenge()[1]
+        session_id = generate_session_token()
+        now = datetime.utcnow()
+
+        def save(db):
+            # 顺带清理过期会话，expires_at 有索引
+            db.query(models.SRPSessionRecord).filter(
+                models.SRPSessionRecord.expires_at < now
+            ).delete(synchronize_session=False)
+            db.add(
+                models.SRPSessionRecord(
+                    session_id=session_id,
+                    username=username,
+                    salt=base64.b64encode(salt).decode(),
+                    verifier=base64.b64encode(verifier).decode(),
+                    A=base64.b64encode(A).decode(),
+                    b=base64.b64encode(svr.b).decode(),
+                    server_public=(
+                        base64.b64encode(B).decode() if B is not None else None
+                    ),
+                    expires_at=now + timedelta(seconds=SRP_SESSION_TTL_SECONDS),
+                )
+            )
+
+        run_write_blocking(save)
+        self._created.session = (session_id, svr)
+        return session_id
+
+    def get_session(self, session_id: str):
+        from . import models
+        from .database import SessionLocal
+
+        created = getattr(self._created, "session", None)
+        if created is not None:
+            self._created.session = None
+            if created[0] == session_id:
+                return {
+                    'username': created[1].username,
+                    'verifier': created[1],
+                    'authenticated': False,
+                }
+
+        with SessionLocal() as db:
+            record = db.get(models.SRPSessionRecord, session_id)
+            if record is None or record.expires_at < datetime.utcnow():
+                return None
+            verifier = base64.b64decode(record.verifier)
+            gb = None
+            if record.server_public:
+                # B = k*v + g^b (mod N)
+                gb = (
+                    int.from_bytes(base64.b64decode(record.server_public), "big")
+                    - SRP_K * int.from_bytes(verifier, "big")
+                ) % SRP_N
+            svr = SRPVerifier(
+                record.username,
+                base64.b64decode(record.salt),
+                verifier,
+                base64.b64decode(record.A),
+                base64.b64decode(record.b),
+                gb,
+            )
+            return {
+                'username': record.username,
+                'verifier': svr,
+                'authenticated': False,
+            }
+
+    def remove_session(self, session_id: str):
+        from . import models
+        from .db_writer import run_write_blocking
+
+        run_write_blocking(
+            lambda db: db.query(models.SRPSessionRecord)
+            .filter(models.SRPSessionRecord.session_id == session_id)
+            .delete(synchronize_session=False)
+        )
+
+
 # 全局SRP认证实例
-srp_session_manager = SRPSession()
+if SRP_SESSION_STORE == "database":
+    srp_session_manager = DatabaseSRPSession()
+else:
+    srp_session_manager = SRPSession()
 
 
 def generate_session_token() -> str:
@@ -0,0 +1,253 @@
+"""
+访问令牌吊销名单
+
+访问令牌带有 jti（令牌编号）与 iat（签发时间）。注销登录时把当前令牌的 jti
+加入吊销名单；注销账户时记录该用户名的吊销时刻，此前签发的令牌全部失效。
+
+名单在进程内以集合保存，verify_token 中一次哈希查找即可判定，被吊销的令牌
+在查询数据库之前就被拒绝。条目按令牌过期时间分桶，整桶过期后一并移除，
+名单大小只与有效期内被吊销的令牌数有关。
+
+吊销的条目在写入 revoked_tokens 的事务提交后才加入进程内名单（回滚的写入或
+回滚的 SAVEPOINT 中的条目会被丢弃），与其他 worker 从表中加载到的名单一致。
+
+名单同时写入 revoked_tokens 表：启动时全量加载，之后后台线程每
+TOKEN_DENYLIST_SYNC_SECONDS 秒增量加载其他 worker 写入的条目并清理已过期的行。
+多 worker 部署时，其他 worker 吊销的令牌最多在一个同步周期后被拒绝。
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .metrics import REGISTRY
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TOKEN_DENYLIST_SYNC_SECONDS = float(os.getenv("TOKEN_DENYLIST_SYNC_SECONDS", "5"))
+# 过期分桶的宽度（秒）
+TOKEN_DENYLIST_BUCKET_SECONDS = 60
+
+# 用户级吊销在表中以 "sub:<用户名>" 作为 jti 保存；令牌的 jti 不含冒号，不会冲突
+SUBJECT_PREFIX = "sub:"
+
+# 会话 info 中的键：待加入名单的条目、各 SAVEPOINT 开始时的条目数、最近一次提交标记
+_PENDING = "token_denylist_pending"
+_MARKS = "token_denylist_marks"
+_COMMITTED = "token_denylist_committed"
+
+TOKENS_REJECTED = REGISTRY.counter(
+    "revoked_tokens_rejected", "因已吊销而被拒绝的访问令牌", ["reason"]
+)
+rejected_jti = TOKENS_REJECTED.labels("jti")
+rejected_subject = TOKENS_REJECTED.labels("subject")
+
+
+def _timestamp(value: datetime) -> float:
+    """数据库中的时间均为 UTC 朴素时间"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+class TokenDenylist:
+    """进程内的吊销名单：jti 集合与用户名吊销时刻，按过期时间分桶清理"""
+
+    def __init__(self, bucket_seconds: int = TOKEN_DENYLIST_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self._jtis: Set[str] = set()
+        # 用户名 -> (吊销时刻, 所在桶编号)
+        self._subjects: Dict[str, Tuple[float, int]] = {}
+        # 桶编号 -> 该桶内的 jti 或 SUBJECT_PREFIX + 用户名
+        self._buckets: Dict[int, List[str]] = {}
+        self._lock = threading.Lock()
+        self._synced_at: Optional[datetime] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._jtis) + len(self._subjects)
+
+    def is_revoked(self, payload: dict) -> bool:
+        """令牌是否已被吊销（只查进程内名单，不访问数据库）"""
+        jti = payload.get("jti")
+        if jti is not None and jti in self._jtis:
+            rejected_jti.inc()
+            return True
+        if self._subjects:
+            entry = self._subjects.get(payload.get("sub"))
+            # 吊销时刻同一秒内签发的令牌也视为已吊销；没有 iat 的旧令牌一律吊销
+            if entry is not None and payload.get("iat", 0) <= entry[0]:
+                rejected_subject.inc()
+                return True
+        return False
+
+    def _add(self, key: str, expires_at: float, revoked_at: float):
+        bucket = int(expires_at // self.bucket_seconds) + 1
+        if key.startswith(SUBJECT_PREFIX):
+            subject = key[len(SUBJECT_PREFIX) :]
+            entry = self._subjects.get(subject)
+            if entry is not None and revoked_at <= entry[0]:
+                return
+            self._subjects[subject] = (revoked_at, bucket)
+        elif key in self._jtis:
+            return
+        else:
+            self._jtis.add(key)
+        self._buckets.setdefault(bucket, []).append(key)
+
+    def sweep(self, now: Optional[float] = None):
+        """移除已整桶过期的条目"""
+        current = int((time.time() if now is None else now) // self.bucket_seconds)
+        with self._lock:
+            for bucket in [b for b in self._buckets if b <= current]:
+                for key in self._buckets.pop(bucket):
+                    if key.startswith(SUBJECT_PREFIX):
+                        subject = key[len(SUBJECT_PREFIX) :]
+                        # 之后再次吊销的用户名记在更晚的桶中，不在此移除
+                        if self._subjects.get(subject, (0, bucket))[1] == bucket:
+                            self._subjects.pop(subject, None)
+                    else:
+                        self._jtis.discard(key)
+
+    def revoke(self, db, payload: dict):
+        """吊销一个访问令牌（按 jti），写入数据库由调用方提交"""
+        jti = payload.get("jti")
+        if jti is None:
+            # 没有 jti 的旧令牌无法单独吊销，按过期时间自然失效
+            return
+        expires_at = datetime.utcfromtimestamp(payload["exp"])
+        self._persist(db, jti, expires_at)
+
+    def revoke_subject(self, db, username: str, lifetime: timedelta):
+        """吊销某用户此前签发的全部访问令牌，lifetime 为访问令牌有效期"""
+        self._persist(db, SUBJECT_PREFIX + username, datetime.utcnow() + lifetime)
+
+    def _persist(self, db, key: str, expires_at: datetime):
+        from . import models
+
+        revoked_at = datetime.utcnow()
+        db.merge(
+            models.RevokedToken(jti=key, expires_at=expires_at, revoked_at=revoked_at)
+        )
+        # 事务提交后再加入进程内名单（见 _after_transaction_end）
+        db.info.setdefault(_PENDING, []).append(
+            (self, key, _timestamp(expires_at), _timestamp(revoked_at))
+        )
+
+    def add_committed(self, rows: List[Tuple[str, float, float]]):
+        """加入已提交的条目"""
+        with self._lock:
+            for row in rows:
+                self._add(*row)
+
+    def load(self):
+        """从数据库加载上次同步以来写入的条目（首次为全量），并删除已过期的行"""
+        from . import models
+        from .database import SessionLocal
+        from .db_writer import run_write_blocking
+
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            query = db.query(models.RevokedToken).filter(
+                models.RevokedToken.expires_at > now
+            )
+            if self._synced_at is not None:
+                # 留出余量覆盖各 worker 之间的提交延迟与时钟偏差，重复条目会被忽略
+                since = self._synced_at - timedelta(
+                    seconds=TOKEN_DENYLIST_SYNC_SECONDS + 5
+                )
+                query = query.filter(models.RevokedToken.revoked_at >= since)
+            rows = [
+                (row.jti, _timestamp(row.expires_at), _timestamp(row.revoked_at))
+                for row in query
+            ]
+        # 过期行的清理经由写线程提交
+        run_write_blocking(
+            lambda db: db.query(models.RevokedToken)
+            .filter(models.RevokedToken.expires_at < now)
+            .delete(synchronize_session=False)
+        )
+        self.add_committed(rows)
+        self._synced_at = now
+        self.sweep()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.load()
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._sync, name="token-denylist", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _sync(self):
+        while not self._stopped.wait(TOKEN_DENYLIST_SYNC_SECONDS):
+            try:
+                self.load()
+            except Exception:
+                logger.exception("同步访问令牌吊销名单失败")
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _after_transaction_create(session, transaction):
+    if transaction.nested:
+        pending = session.info.get(_PENDING)
+        marks = session.info.setdefault(_MARKS, {})
+        marks[transaction] = len(pending) if pending else 0
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    # SAVEPOINT 释放时同样触发，是否加入名单在 after_transaction_end 中按层级判断
+    session.info[_COMMITTED] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    committed = session.info.pop(_COMMITTED, False)
+    if transaction.nested:
+        mark = session.info.get(_MARKS, {}).pop(transaction, None)
+        pending = session.info.get(_PENDING)
+        if not committed and pending and mark is not None:
+            del pending[mark:]
+        return
+    if transaction.parent is not None:
+        return
+    session.info.pop(_MARKS, None)
+    pending = session.info.pop(_PENDING, None)
+    if committed and pending:
+        by_list: Dict[TokenDenylist, List[Tuple[str, float, float]]] = {}
+        for owner, *row in pending:
+            by_list.setdefault(owner, []).append(tuple(row))
+        for owner, rows in by_list.items():
+            owner.add_committed(rows)
+
+
+denylist = TokenDenylist()
+REGISTRY.gauge("revoked_tokens", "进程内吊销名单中的条目数").set_function(
+    denylist.__len__
+)
+
+
+def start_denylist():
+    denylist.start()
+
+
+def stop_denylist():
+    denylist.stop()
@@ -0,0 +1,284 @@
+"""
+行程变更推送
+
+前端此前在每次进入页面时重新拉取行程列表与详情，以获取其他设备上的修改。
+GET /api/trips/changes 以 SSE（text/event-stream）向客户端推送当前用户的
+行程新建、更新、删除事件，客户端只需重新拉取发生变化的行程。
+
+事件在 trip_sync 的钩子中记录到会话，事务提交后才发布（回滚的写入或回滚的
+SAVEPOINT 中的事件会被丢弃），因此推送出去的变更一定已经可以读到。
+每个行程带有版本号（trip_versions 表，每次写入加一，删除事件的版本号为
+最后一次写入加一），客户端按行程记录已处理的最大版本号，忽略重复或更旧的事件。
+
+发布订阅默认在进程内完成（LocalBroker），只能推送给连接到同一 worker 的客户端。
+多 worker 部署可继承 LocalBroker、把 publish 改为发往消息代理（如 Redis 发布订阅），
+各 worker 收到消息后调用 deliver 投递给本地订阅者，再通过 set_broker 替换。
+
+订阅者的队列满时（客户端处理过慢或一次导入大量行程），积压的事件被丢弃并改为
+推送一个 reset 事件，客户端应重新拉取全部行程。
+
+环境变量:
+    TRIP_EVENTS_QUEUE_SIZE          每个连接积压事件的上限，默认 256
+    TRIP_EVENTS_HEARTBEAT_SECONDS   无事件时发送心跳注释的间隔，默认 15
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, event, insert, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .metrics import REGISTRY
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRIP_EVENTS_QUEUE_SIZE = int(os.getenv("TRIP_EVENTS_QUEUE_SIZE", "256"))
+TRIP_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("TRIP_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+EVENTS_PUBLISHED = REGISTRY.counter(
+    "trip_events_published", "已发布的行程变更事件数", ["type"]
+)
+EVENT_RESETS = REGISTRY.counter(
+    "trip_event_resets", "订阅队列溢出、改为推送 reset 的次数"
+)
+
+# 会话 info 中的键：待发布事件、各 SAVEPOINT 开始时的事件数、最近一次提交标记
+_PENDING = "trip_events"
+_MARKS = "trip_events_marks"
+_COMMITTED = "trip_events_committed"
+
+# 队列溢出后放入的重置标记
+RESET = {"type": "reset"}
+
+
+class Subscription:
+    """一个 SSE 连接的订阅：事件队列属于连接所在的事件循环"""
+
+    def __init__(self, user_id: int, maxsize: int = TRIP_EVENTS_QUEUE_SIZE):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, events: List[dict]):
+        """在连接所在的事件循环中调用"""
+        if self.overflowed:
+            return
+        for item in events:
+            try:
+                self.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # 丢弃积压的事件，客户端收到 reset 后重新拉取全部行程
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait(RESET)
+                self.overflowed = True
+                EVENT_RESETS.inc()
+                return
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """取下一个事件，超时返回 None"""
+        try:
+            item = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if item is RESET:
+            self.overflowed = False
+        return item
+
+
+class LocalBroker:
+    """进程内发布订阅：按用户ID把事件投递给本进程的订阅者，可在任意线程发布"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: int, events: List[dict]):
+        """发布一个用户的事件（事务提交后调用）"""
+        self.deliver(user_id, events)
+
+    def deliver(self, user_id: int, events: List[dict]):
+        """投递给本进程中该用户的订阅者"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, events)
+            except RuntimeError:
+                # 事件循环已关闭（进程退出中）
+                self.unsubscribe(subscription)
+
+
+broker: LocalBroker = LocalBroker()
+REGISTRY.gauge("trip_event_subscribers", "进行中的行程变更推送连接数").set_function(
+    lambda: len(broker)
+)
+
+
+def set_broker(new_broker: LocalBroker):
+    """替换发布订阅实现（多 worker 部署时使用消息代理）"""
+    global broker
+    broker = new_broker
+
+
+def _record(db: Session, user_id: int, type_: str, trip_id: int, version: int):
+    db.info.setdefault(_PENDING, []).append(
+        (user_id, {"type": type_, "trip_id": trip_id, "version": version})
+    )
+
+
+def record_saved(db: Session, trips: Iterable[models.Trip], created: bool = False):
+    """行程写入后递增版本号并记录变更事件（在调用方事务内执行）"""
+    owners = {trip.id: trip.user_id for trip in trips}
+    if not owners:
+        return
+    table = models.TripVersion.__table__
+    versions = dict(
+        db.execute(
+            update(table)
+            .where(table.c.trip_id.in_(owners))
+            .values(version=table.c.version + 1)
+            .returning(table.c.trip_id, table.c.version)
+        ).all()
+    )
+    missing = [trip_id for trip_id in owners if trip_id not in versions]
+    if missing:
+        db.execute(
+            insert(table),
+            [
+                {"trip_id": trip_id, "user_id": owners[trip_id], "version": 1}
+                for trip_id in missing
+            ],
+        )
+        versions.update((trip_id, 1) for trip_id in missing)
+
+    type_ = "created" if created else "updated"
+    for trip_id, user_id in owners.items():
+        _record(db, user_id, type_, trip_id, versions[trip_id])
+
+
+def record_deleted(db: Session, trip_ids: Iterable[int], user_id: int):
+    """行程删除后移除版本号并记录删除事件"""
+    ids = list(trip_ids)
+    if not ids:
+        return
+    table = models.TripVersion.__table__
+    versions = dict(
+        db.execute(
+            delete(table)
+            .where(table.c.trip_id.in_(ids))
+            .returning(table.c.trip_id, table.c.version)
+        ).all()
+    )
+    for trip_id in ids:
+        _record(db, user_id, "deleted", trip_id, versions.get(trip_id, 0) + 1)
+
+
+def remove_user_versions(db: Session, user_id: int):
+    """删除某个用户全部行程的版本号（用户注销时调用）"""
+    db.execute(delete(models.TripVersion).where(models.TripVersion.user_id == user_id))
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _after_transaction_create(session, transaction):
+    if transaction.nested:
+        pending = session.info.get(_PENDING)
+        marks = session.info.setdefault(_MARKS, {})
+        marks[transaction] = len(pending) if pending else 0
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    # SAVEPOINT 释放时同样触发，是否发布在 after_transaction_end 中按层级判断
+    session.info[_COMMITTED] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    committed = session.info.pop(_COMMITTED, False)
+    if transaction.nested:
+        mark = session.info.get(_MARKS, {}).pop(transaction, None)
+        pending = session.info.get(_PENDING)
+        if not committed and pending and mark is not None:
+            del pending[mark:]
+        return
+    if transaction.parent is not None:
+        return
+    session.info.pop(_MARKS, None)
+    pending = session.info.pop(_PENDING, None)
+    if committed and pending:
+        _publish(pending)
+
+
+def _publish(pending: List[tuple]):
+    by_user: Dict[int, List[dict]] = {}
+    for user_id, item in pending:
+        by_user.setdefault(user_id, []).append(item)
+        EVENTS_PUBLISHED.labels(item["type"]).inc()
+    for user_id, events in by_user.items():
+        try:
+            broker.publish(user_id, events)
+        except Exception:
+            # 推送失败不影响已提交的写入，客户端重连后重新拉取
+            logger.exception("发布行程变更事件失败")
+
+
+def _format(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def iter_sse(
+    user_id: int, expires_at: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    SSE 事件流：订阅后先发送 ready（客户端此时拉取一次基线），之后推送 trip 与 reset 事件
+
+    在生成器内订阅，响应未开始发送就断开的连接不会留下订阅。
+    访问令牌过期时结束，客户端刷新令牌后重新连接。
+    """
+    subscription = broker.subscribe(user_id)
+    try:
+        yield "retry: 3000\n" + _format("ready", {"user_id": user_id})
+        while True:
+            timeout = TRIP_EVENTS_HEARTBEAT_SECONDS
+            if expires_at is not None:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    return
+                timeout = min(timeout, remaining)
+            item = await subscription.get(timeout)
+            if item is None:
+                yield ": keepalive\n\n"
+            elif item is RESET:
+                yield _format("reset", {})
+            else:
+                yield _format("trip", item)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,211 @@
+"""
+行程 NDJSON 导出与批量导入
+
+导出通过服务端游标分批读取，逐行生成 NDJSON；导入按批解析并以
+executemany 插入，每批一个写任务（一个事务或写线程中的一个 SAVEPOINT）。
+两者内存占用都只与批大小相关，与行程总数无关。
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from . import models, schemas, trip_sync
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+
+# 导入结果中最多返回的错误条数
+MAX_REPORTED_ERRORS = 20
+
+_EXPORT_COLUMNS = (
+    models.Trip.id,
+    models.Trip.title,
+    models.Trip.status,
+    models.Trip.trip_data,
+    models.Trip.created_at,
+    models.Trip.updated_at,
+)
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
+
+
+def iter_export_lines(
+    user_id: int, batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """逐行导出用户的全部行程，每行一个 JSON 对象"""
+    # 流式响应在依赖清理之后仍会继续迭代，因此使用独立会话
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            select(*_EXPORT_COLUMNS)
+            .where(models.Trip.user_id == user_id)
+            .order_by(models.Trip.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield b"".join(
+                json.dumps(
+                    row._asdict(), ensure_ascii=False, default=_json_default
+                ).encode("utf-8")
+                + b"\n"
+                for row in partition
+            )
+    finally:
+        db.close()
+
+
+class ImportBatch(NamedTuple):
+    """待写入的一批行，last_line 为批次最后一行的行号（用于错误报告）"""
+
+    last_line: int
+    rows: List[Dict[str, Any]]
+
+
+class ImportReport:
+    """导入统计"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, line_no: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+
+class TripImporter:
+    """
+    将 NDJSON 行解析为批次并写入数据库
+
+    解析（feed_lines / finish）与写入（write_batch，一个接收 Session 的写任务）
+    分开：接口在线程池中解析、通过 run_write 写入，事件循环不执行同步的
+    解析或数据库操作；脚本可直接调用 import_lines。
+    """
+
+    def __init__(self, user_id: int, batch_size: int = IMPORT_BATCH_SIZE):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self._rows: List[Dict[str, Any]] = []
+        self._line_no = 0
+
+    def feed(self, line: bytes) -> Optional[ImportBatch]:
+        """解析一行输入，批满时返回该批次"""
+        self._line_no += 1
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            item = schemas.TripImportItem.model_validate_json(line)
+        except ValidationError as e:
+            self.report.add_error(self._line_no, e.errors()[0]["msg"])
+            return None
+
+        row = {
+            "user_id": self.user_id,
+            "title": item.title,
+            "status": item.status,
+            "trip_data": item.trip_data,
+        }
+        # 保留原始时间戳，缺失时由数据库填充默认值
+        if item.created_at is not None:
+            row["created_at"] = item.created_at
+        if item.updated_at is not None:
+            row["updated_at"] = item.updated_at
+        self._rows.append(row)
+
+        if len(self._rows) >= self.batch_size:
+            return self.finish()
+        return None
+
+    def feed_lines(self, lines: Iterable[bytes]) -> List[ImportBatch]:
+        """解析多行输入，返回其间填满的批次"""
+        batches = []
+        for line in lines:
+            batch = self.feed(line)
+            if batch is not None:
+                batches.append(batch)
+        return batches
+
+    def finish(self) -> Optional[ImportBatch]:
+        """取出当前未满的批次"""
+        if not self._rows:
+            return None
+        rows, self._rows = self._rows, []
+        return ImportBatch(self._line_no, rows)
+
+    def write_batch(self, db: Session, batch: ImportBatch):
+        """写入一个批次（写任务，由调用方提交）"""
+        # 时间戳字段缺失的行与完整的行分开插入，保证每次 executemany 的列一致
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in batch.rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        indexed = []
+        for rows in groups.values():
+            ids = db.scalars(
+                insert(models.Trip).returning(
+                    models.Trip.id, sort_by_parameter_order=True
+                ),
+                rows,
+            ).all()
+            indexed.extend(
+                models.Trip(id=trip_id, **row) for trip_id, row in zip(ids, rows)
+            )
+        trip_sync.on_trips_saved(db, indexed, created=True)
+
+    def record(self, batch: ImportBatch, error: Optional[Exception] = None):
+        """记录批次的写入结果"""
+        if error is None:
+            self.report.imported += len(batch.rows)
+            return
+        logger.error("行程导入批次写入失败: %s", error)
+        self.report.failed += len(batch.rows)
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(
+                {"line": batch.last_line, "error": f"批次写入失败: {error}"}
+            )
+
+
+def import_lines(
+    db: Session,
+    user_id: int,
+    lines: Iterable[bytes],
+    batch_size: Optional[int] = None,
+) -> ImportReport:
+    """同步导入（供脚本与基准测试使用），每批一个事务"""
+    importer = TripImporter(user_id, batch_size or IMPORT_BATCH_SIZE)
+    for line in lines:
+        batch = importer.feed(line)
+        if batch is not None:
+            _write_now(db, importer, batch)
+    batch = importer.finish()
+    if batch is not None:
+        _write_now(db, importer, batch)
+    return importer.report
+
+
+def _write_now(db: Session, importer: TripImporter, batch: ImportBatch):
+    try:
+        importer.write_batch(db, batch)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        importer.record(batch, e)
+    else:
+        importer.record(batch)
@@ -0,0 +1,234 @@
+"""
+用户行程统计
+
+首页需要的行程数（按状态）、总预算、活动数与涉及国家数保存在
+user_trip_stats 表中，每个用户一行，统计接口只需按主键读取。
+
+trip_stats 表记录每个行程对统计的贡献。行程写入或删除时，用新旧贡献之差
+增量更新用户统计行，不重新扫描该用户的行程；即将开始的行程也从这张表
+按 (user_id, start_date) 索引查询。
+
+用户统计行在首次查询时由全部行程重建（同时重建 trip_stats），此前该用户的
+行程写入不做任何统计维护，因此已有数据无需回填。
+"""
+
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .activities import clip_text, parse_cost, parse_time
+
+# 行程状态列的默认值，导入时未给出状态的行程按此计
+DEFAULT_STATUS = "planning"
+# 即将开始的行程只包含尚未结束或取消的行程
+ACTIVE_STATUSES = ("planning", "in_progress")
+
+
+def extract_trip_stats(trip: models.Trip) -> Dict[str, Any]:
+    """计算一个行程对统计的贡献（trip_stats 表的一行）"""
+    trip_data = trip.trip_data if isinstance(trip.trip_data, dict) else {}
+    activity_list = trip_data.get("activities")
+    activity_list = [
+        activity
+        for activity in (activity_list if isinstance(activity_list, list) else [])
+        if isinstance(activity, dict)
+    ]
+    countries = {
+        activity["countryCode"][:10]
+        for activity in activity_list
+        if isinstance(activity.get("countryCode"), str) and activity["countryCode"]
+    }
+    return {
+        "trip_id": trip.id,
+        "user_id": trip.user_id,
+        "title": clip_text(trip.title, 200),
+        "status": trip.status or DEFAULT_STATUS,
+        "budget": parse_cost(trip_data.get("budget")),
+        "activity_count": len(activity_list),
+        "countries": sorted(countries),
+        "start_date": parse_time(trip_data.get("startDate")),
+        "end_date": parse_time(trip_data.get("endDate")),
+    }
+
+
+class _Delta:
+    """一个用户统计的变化量"""
+
+    def __init__(self):
+        self.trip_count = 0
+        self.total_budget = 0.0
+        self.activity_count = 0
+        self.status_counts: Counter = Counter()
+        self.country_counts: Counter = Counter()
+
+    def add(self, row, sign: int):
+        get = row.get if isinstance(row, dict) else partial(getattr, row)
+        self.trip_count += sign
+        self.total_budget += sign * (get("budget") or 0)
+        self.activity_count += sign * get("activity_count")
+        self.status_counts[get("status")] += sign
+        for country in get("countries"):
+            self.country_counts[country] += sign
+
+
+def _merge(counts: Dict[str, int], delta: Counter) -> Dict[str, int]:
+    # 返回新字典，使 JSON 列的修改能被检测到
+    merged = Counter(counts)
+    merged.update(delta)
+    return {key: value for key, value in sorted(merged.items()) if value > 0}
+
+
+def _lock_users(
+    db: Session, user_ids: Iterable[int]
+) -> Dict[int, models.UserTripStats]:
+    """
+    锁定用户行并读取已有的统计行
+
+    同一用户的统计更新与首次重建按用户行串行执行（SQLite 忽略 FOR UPDATE，
+    由数据库级写锁保证串行）。
+    """
+    ids = sorted(set(user_ids))
+    db.execute(
+        select(models.User.id).where(models.User.id.in_(ids)).with_for_update()
+    ).all()
+    return {
+        stats.user_id: stats
+        for stats in db.scalars(
+            select(models.UserTripStats).where(models.UserTripStats.user_id.in_(ids))
+        )
+    }
+
+
+def _old_rows(db: Session, trip_ids: List[int]) -> List[models.TripStats]:
+    return db.scalars(
+        select(models.TripStats).where(models.TripStats.trip_id.in_(trip_ids))
+    ).all()
+
+
+def _apply(
+    stats_rows: Dict[int, models.UserTripStats],
+    old_rows: Iterable[models.TripStats],
+    new_rows: Iterable[Dict[str, Any]] = (),
+):
+    deltas: Dict[int, _Delta] = {}
+    for old in old_rows:
+        deltas.setdefault(old.user_id, _Delta()).add(old, -1)
+    for row in new_rows:
+        deltas.setdefault(row["user_id"], _Delta()).add(row, 1)
+
+    for user_id, delta in deltas.items():
+        stats = stats_rows.get(user_id)
+        if stats is None:
+            # 尚未建立统计的用户在首次查询时整体重建
+            continue
+        stats.trip_count += delta.trip_count
+        stats.total_budget += delta.total_budget
+        stats.activity_count += delta.activity_count
+        stats.status_counts = _merge(stats.status_counts, delta.status_counts)
+        stats.country_counts = _merge(stats.country_counts, delta.country_counts)
+
+
+def sync_trip_stats(db: Session, trips: Iterable[models.Trip]):
+    """行程新建或更新后，按新旧贡献之差更新用户统计（在调用方事务内执行）"""
+    rows = [extract_trip_stats(trip) for trip in trips]
+    if not rows:
+        return
+    ids = [row["trip_id"] for row in rows]
+    # 先锁定用户再读取旧贡献，避免与并发的首次重建重复计入
+    stats_rows = _lock_users(db, [row["user_id"] for row in rows])
+    _apply(stats_rows, _old_rows(db, ids), rows)
+
+    db.execute(delete(models.TripStats).where(models.TripStats.trip_id.in_(ids)))
+    tracked = [row for row in rows if row["user_id"] in stats_rows]
+    if tracked:
+        db.execute(insert(models.TripStats), tracked)
+
+
+def remove_trip_stats(db: Session, trip_ids: Iterable[int]):
+    """行程删除后，从用户统计中减去其贡献"""
+    ids = list(trip_ids)
+    if not ids:
+        return
+    user_ids = db.scalars(
+        select(models.TripStats.user_id)
+        .where(models.TripStats.trip_id.in_(ids))
+        .distinct()
+    ).all()
+    if not user_ids:
+        return
+    stats_rows = _lock_users(db, user_ids)
+    _apply(stats_rows, _old_rows(db, ids))
+    db.execute(delete(models.TripStats).where(models.TripStats.trip_id.in_(ids)))
+
+
+def remove_user_stats(db: Session, user_id: int):
+    """删除某个用户的统计（用户注销时调用）"""
+    db.execute(delete(models.TripStats).where(models.TripStats.user_id == user_id))
+    db.execute(
+        delete(models.UserTripStats).where(models.UserTripStats.user_id == user_id)
+    )
+
+
+def rebuild_user_stats(
+    db: Session, user_id: int, batch_size: int = 500
+) -> models.UserTripStats:
+    """由用户的全部行程重建统计行与 trip_stats（在调用方事务内执行）"""
+    stats = _lock_users(db, [user_id]).get(user_id)
+    if stats is not None:
+        # 并发的首次查询已经完成重建
+        return stats
+
+    db.execute(delete(models.TripStats).where(models.TripStats.user_id == user_id))
+    delta = _Delta()
+    query = (
+        select(models.Trip)
+        .where(models.Trip.user_id == user_id)
+        .execution_options(yield_per=batch_size)
+    )
+    batch: List[Dict[str, Any]] = []
+    for trip in db.scalars(query):
+        row = extract_trip_stats(trip)
+        delta.add(row, 1)
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.execute(insert(models.TripStats), batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.TripStats), batch)
+
+    stats = models.UserTripStats(
+        user_id=user_id,
+        trip_count=delta.trip_count,
+        status_counts=_merge({}, delta.status_counts),
+        total_budget=delta.total_budget,
+        activity_count=delta.activity_count,
+        country_counts=_merge({}, delta.country_counts),
+    )
+    db.add(stats)
+    db.flush()
+    db.refresh(stats)
+    return stats
+
+
+def upcoming_trips(
+    db: Session, user_id: int, limit: int, now: Optional[datetime] = None
+) -> List[models.TripStats]:
+    """开始日期在今天及以后、状态为计划中或进行中的行程，按开始日期排序"""
+    today = (now or datetime.utcnow()).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return db.scalars(
+        select(models.TripStats)
+        .where(
+            models.TripStats.user_id == user_id,
+            models.TripStats.start_date >= today,
+            models.TripStats.status.in_(ACTIVE_STATUSES),
+        )
+        .order_by(models.TripStats.start_date, models.TripStats.trip_id)
+        .limit(limit)
+    ).all()
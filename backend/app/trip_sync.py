@@ -0,0 +1,38 @@
+"""
+行程派生数据同步
+
+行程写入或删除后需要同步维护的派生数据（检索索引、活动明细表、用户行程统计、变更推送）
+统一在这里调用，所有函数都在调用方的事务内执行。
+"""
+
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+from . import activities, models, search, trip_events, trip_stats
+
+
+def on_trips_saved(db: Session, trips: Iterable[models.Trip], created: bool = False):
+    """行程新建（created=True）或更新后调用（行程需已 flush，具备ID）"""
+    trips = list(trips)
+    search.index_trips(db, trips)
+    activities.sync_activities(db, trips)
+    trip_stats.sync_trip_stats(db, trips)
+    trip_events.record_saved(db, trips, created)
+
+
+def on_trips_deleted(db: Session, trip_ids: Iterable[int], user_id: int):
+    """行程删除后调用，user_id 为行程所属用户"""
+    trip_ids = list(trip_ids)
+    search.unindex_trips(db, trip_ids)
+    activities.remove_activities(db, trip_ids)
+    trip_stats.remove_trip_stats(db, trip_ids)
+    trip_events.record_deleted(db, trip_ids, user_id)
+
+
+def on_user_deleted(db: Session, user_id: int):
+    """用户注销前调用，清理该用户全部行程的派生数据"""
+    search.unindex_user(db, user_id)
+    activities.remove_user_activities(db, user_id)
+    trip_stats.remove_user_stats(db, user_id)
+    trip_events.remove_user_versions(db, user_id)
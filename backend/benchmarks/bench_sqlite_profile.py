@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+SQLite 运行配置基准
+
+分别以 default 与 production 两种 SQLITE_PROFILE 启动子进程，
+多个线程按比例混合执行读（按ID取行程、分页列表）与写（新建行程），
+比较吞吐、读写延迟分位数以及 "database is locked" 错误数。
+
+用法:
+    python benchmarks/bench_sqlite_profile.py --threads 16 --seconds 10 --write-ratio 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+TRIP_DATA = {
+    "title": "京都赏枫三日游",
+    "description": "清水寺、岚山与伏见稻荷大社，适合秋季出行",
+    "startDate": "2024-11-20T00:00:00.000",
+    "activities": [
+        {
+            "title": f"第{n + 1}站",
+            "city": "京都",
+            "countryCode": "JP",
+            "startTime": f"2024-11-2{n // 3}T{9 + n % 3 * 3:02d}:00:00.000",
+            "estimatedCost": 300,
+        }
+        for n in range(8)
+    ],
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+def run_child(args):
+    """在已设置好环境变量的子进程中执行混合负载"""
+    from sqlalchemy import func, insert, select
+    from sqlalchemy.exc import OperationalError
+
+    from app import models, trip_sync
+    from app.database import SQLITE_PRODUCTION, SessionLocal, engine
+    from app.db_writer import writer
+    from app.search import init_search_index
+
+    models.Base.metadata.create_all(bind=engine)
+    init_search_index(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.User),
+            [{"userID": 1, "username": "bench", "email": "b@example.com"}],
+        )
+        conn.execute(
+            insert(models.Trip),
+            [
+                {"user_id": 1, "title": "seed", "trip_data": TRIP_DATA}
+                for _ in range(args.seed_trips)
+            ],
+        )
+
+    if SQLITE_PRODUCTION:
+        writer.start()
+
+    def create_trip(session):
+        trip = models.Trip(user_id=1, title="bench", trip_data=TRIP_DATA)
+        session.add(trip)
+        session.flush()
+        trip_sync.on_trips_saved(session, [trip], created=True)
+        return trip.id
+
+    def write():
+        if writer.running:
+            writer.submit(create_trip).result()
+            return
+        with SessionLocal() as db:
+            create_trip(db)
+            db.commit()
+
+    def read(rng):
+        with SessionLocal() as db:
+            if rng.random() < 0.5:
+                db.get(models.Trip, rng.randint(1, args.seed_trips))
+            else:
+                db.scalar(
+                    select(func.count())
+                    .select_from(models.Trip)
+                    .where(models.Trip.user_id == 1)
+                )
+                db.scalars(
+                    select(models.Trip)
+                    .where(models.Trip.user_id == 1)
+                    .order_by(models.Trip.created_at.desc())
+                    .limit(20)
+                ).all()
+
+    latencies = {"read": [], "write": []}
+    errors = {"locked": 0, "other": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local = {"read": [], "write": []}
+        locked = other = 0
+        while time.perf_counter() < deadline:
+            kind = "write" if rng.random() < args.write_ratio else "read"
+            started = time.perf_counter()
+            try:
+                write() if kind == "write" else read(rng)
+            except OperationalError as e:
+                if "locked" in str(e):
+                    locked += 1
+                else:
+                    other += 1
+                continue
+            local[kind].append(time.perf_counter() - started)
+        with lock:
+            for kind, values in local.items():
+                latencies[kind].extend(values)
+            errors["locked"] += locked
+            errors["other"] += other
+
+    threads = [
+        threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.stop()
+
+    result = {
+        "profile": os.environ["SQLITE_PROFILE"],
+        "ops_per_second": round(
+            (len(latencies["read"]) + len(latencies["write"])) / args.seconds, 1
+        ),
+        "reads": len(latencies["read"]),
+        "writes": len(latencies["write"]),
+        "read_p50_ms": percentile(latencies["read"], 0.5),
+        "read_p99_ms": percentile(latencies["read"], 0.99),
+        "write_p50_ms": percentile(latencies["write"], 0.5),
+        "write_p99_ms": percentile(latencies["write"], 0.99),
+        "locked_errors": errors["locked"],
+        "other_errors": errors["other"],
+    }
+    if writer.batches:
+        result["writes_per_commit"] = round(writer.jobs / writer.batches, 2)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 运行配置基准")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--seed-trips", type=int, default=2000)
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    for profile in args.profiles:
+        db_path = tempfile.mktemp(suffix=".db")
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{db_path}",
+            SQLITE_PROFILE=profile,
+        )
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", *sys.argv[1:]],
+            env=env,
+            check=True,
+        )
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+
+if __name__ == "__main__":
+    main()
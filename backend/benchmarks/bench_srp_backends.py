@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+SRP 大整数运算后端对比
+
+对每个 SRP_BIGINT_BACKEND 取值在子进程中（后端在导入时确定）：
+    1. 正确性交叉校验：随机用户名、密码与私有随机数 b，逐字节比较
+       app.srp_auth.SRPVerifier 与 srp.Verifier 的挑战 (salt, B) 与服务端证明
+       H_AMK（另用预计算的 g^b 再比较一次），并确认篡改的客户端证明被拒绝；
+       客户端为 srp.User，与现有前端使用同一套 RFC 5054 参数。
+    2. 吞吐：单线程连续完成服务端的挑战与验证，按进程 CPU 时间折算每核每秒登录数；
+       另测 g^b 已由预计算池算好时的情况（池的后台计算不计入，--no-pool 跳过）。
+
+用法:
+    python benchmarks/bench_srp_backends.py
+    python benchmarks/bench_srp_backends.py --backends python gmpy2 --checks 200 --logins 300
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import secrets
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+
+def cross_check(srp, srp_auth, checks: int) -> int:
+    for _ in range(checks):
+        username = f"user_{secrets.token_hex(4)}"
+        password = secrets.token_urlsafe(12)
+        salt, vkey = srp.create_salted_verification_key(
+            username, password, hash_alg=srp.SHA256, ng_type=srp.NG_4096
+        )
+        usr = srp.User(username, password, hash_alg=srp.SHA256, ng_type=srp.NG_4096)
+        _, A = usr.start_authentication()
+        b = secrets.token_bytes(srp_auth.SRP_B_LENGTH)
+
+        reference = srp_auth.create_verifier(username, salt, vkey, A, b)
+        candidates = [
+            srp_auth.SRPVerifier(username, salt, vkey, A, b),
+            srp_auth.SRPVerifier(username, salt, vkey, A, b, srp_auth.power_of_g(b)),
+        ]
+        challenge = reference.get_challenge()
+        M = usr.process_challenge(*challenge)
+        HAMK = reference.verify_session(M)
+        for svr in candidates:
+            if svr.get_challenge() != challenge:
+                raise AssertionError("挑战 (salt, B) 与 srp.Verifier 不一致")
+            if svr.verify_session(bytes([M[0] ^ 1]) + M[1:]) is not None:
+                raise AssertionError("篡改的客户端证明未被拒绝")
+            if svr.verify_session(M) != HAMK:
+                raise AssertionError("服务端证明 H_AMK 与 srp.Verifier 不一致")
+        usr.verify_session(HAMK)
+        if not usr.authenticated():
+            raise AssertionError("客户端校验服务端证明失败")
+    return checks
+
+
+def throughput(srp, srp_auth, logins: int, pool: bool) -> dict:
+    username = "bench_srp"
+    password = "bench-srp-password"
+    salt, vkey = srp.create_salted_verification_key(
+        username, password, hash_alg=srp.SHA256, ng_type=srp.NG_4096
+    )
+    # 客户端计算不计入服务端耗时，先备好每次登录的 (A, b, g^b, M)
+    handshakes = []
+    for _ in range(logins):
+        usr = srp.User(username, password, hash_alg=srp.SHA256, ng_type=srp.NG_4096)
+        _, A = usr.start_authentication()
+        b = secrets.token_bytes(srp_auth.SRP_B_LENGTH)
+        gb = srp_auth.power_of_g(b) if pool else None
+        svr = srp_auth.create_verifier(username, salt, vkey, A, b)
+        M = usr.process_challenge(*svr.get_challenge())
+        handshakes.append((A, b, gb, M))
+
+    started = time.process_time()
+    for A, b, gb, M in handshakes:
+        svr = srp_auth.SRPVerifier(username, salt, vkey, A, b, gb)
+        svr.get_challenge()
+        if svr.verify_session(M) is None:
+            raise AssertionError("登录失败")
+    cpu = time.process_time() - started
+    return {
+        "pool": pool,
+        "logins": logins,
+        "cpu_ms_per_login": round(cpu / logins * 1000, 3),
+        "logins_per_core_second": round(logins / cpu, 1),
+    }
+
+
+def worker(backend: str, args, results):
+    os.environ["SRP_BIGINT_BACKEND"] = backend
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import srp
+
+    from app import srp_auth
+
+    result = {
+        "backend": srp_auth.SRP_BIGINT_BACKEND,
+        "srp_module": srp.Verifier.__module__,
+        "cross_checked": cross_check(srp, srp_auth, args.checks),
+    }
+    runs = [throughput(srp, srp_auth, args.logins, pool=False)]
+    if args.pool:
+        runs.append(throughput(srp, srp_auth, args.logins, pool=True))
+    results.put({**result, "throughput": runs})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SRP 大整数运算后端对比")
+    parser.add_argument("--backends", nargs="+", default=["srp", "python", "gmpy2"])
+    parser.add_argument("--checks", type=int, default=50, help="交叉校验次数")
+    parser.add_argument("--logins", type=int, default=200, help="吞吐测试登录次数")
+    parser.add_argument(
+        "--no-pool", dest="pool", action="store_false", help="不测预计算 g^b 的情况"
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backends:
+        results = context.Queue()
+        process = context.Process(target=worker, args=(backend, args, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(json.dumps({"backend": backend, "error": process.exitcode}))
+            continue
+        print(json.dumps(results.get()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+SRPAuthInit 突发登录基准
+
+对每个 SRP_EPHEMERAL_POOL_SIZE 取值在子进程中启动服务（临时 SQLite 数据库），
+注册一个 SRP 用户后按批次并发发起 SRPAuthInit：每批 --burst 个请求同时发出，
+批次之间间隔 --pause 秒（预计算池在间隔中补充）。客户端的 A 在发请求前
+全部算好，延迟只包含服务端处理。输出每种配置的延迟分位数与池命中情况，
+池大小 0 即每次挑战现场计算 g^b。
+
+用法:
+    python benchmarks/bench_srp_init.py --pool-sizes 0 64 --burst 50 --bursts 10
+    python benchmarks/bench_srp_init.py --session-store database --burst 200
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import httpx
+import srp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+srp.rfc5054_enable()
+
+USERNAME = "bench_srp"
+PASSWORD = "bench-srp-password"
+
+
+def serve(port: int, pool_size: int, session_store: str, db_path: str):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["LOG_LEVEL"] = "WARNING"
+    os.environ["SRP_EPHEMERAL_POOL_SIZE"] = str(pool_size)
+    os.environ["SRP_SESSION_STORE"] = session_store
+
+    import uvicorn
+
+    from app.main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def pool_takes(metrics: str) -> dict:
+    return {
+        result: int(float(value))
+        for result, value in re.findall(
+            r'^srp_ephemeral_pool_takes_total\{result="(\w+)"\} (\S+)$',
+            metrics,
+            re.M,
+        )
+    }
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+        await asyncio.sleep(0.1)
+
+
+async def run_bursts(args, base_url: str) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await wait_ready(client)
+        salt, verifier = srp.create_salted_verification_key(
+            USERNAME, PASSWORD, hash_alg=srp.SHA256, ng_type=srp.NG_4096
+        )
+        response = await client.post(
+            "/api/auth/register",
+            json={
+                "username": USERNAME,
+                "email": f"{USERNAME}@example.com",
+                "srp_salt": base64.b64encode(salt).decode(),
+                "srp_verifier": base64.b64encode(verifier).decode(),
+            },
+        )
+        response.raise_for_status()
+        # 等待预计算池首次填满
+        await asyncio.sleep(args.pause)
+        before = pool_takes((await client.get("/metrics")).text)
+
+        async def init(A: bytes) -> float:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/auth/SRPAuthInit",
+                json={"username": USERNAME, "A": base64.b64encode(A).decode()},
+            )
+            response.raise_for_status()
+            return time.perf_counter() - started
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.bursts):
+            ephemerals = [
+                srp.User(
+                    USERNAME, PASSWORD, hash_alg=srp.SHA256, ng_type=srp.NG_4096
+                ).start_authentication()[1]
+                for _ in range(args.burst)
+            ]
+            latencies += await asyncio.gather(*(init(A) for A in ephemerals))
+            await asyncio.sleep(args.pause)
+        elapsed = time.perf_counter() - started
+
+        after = pool_takes((await client.get("/metrics")).text)
+        return {
+            "requests": len(latencies),
+            "seconds": round(elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+            "pool_hits": after.get("hit", 0) - before.get("hit", 0),
+            "pool_misses": after.get("miss", 0) - before.get("miss", 0),
+        }
+
+
+def run_pool_size(args, pool_size: int) -> dict:
+    db_path = tempfile.mktemp(suffix=".db")
+    context = multiprocessing.get_context("spawn")
+    server = context.Process(
+        target=serve, args=(args.port, pool_size, args.session_store, db_path)
+    )
+    server.start()
+    try:
+        result = asyncio.run(run_bursts(args, f"http://127.0.0.1:{args.port}"))
+    finally:
+        server.terminate()
+        server.join()
+        if os.path.exists(db_path):
+            os.remove(db_path)
+    return {
+        "pool_size": pool_size,
+        "session_store": args.session_store,
+        "burst": args.burst,
+        **result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SRPAuthInit 突发登录基准")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 64])
+    parser.add_argument("--burst", type=int, default=50, help="每批并发请求数")
+    parser.add_argument("--bursts", type=int, default=10, help="批次数")
+    parser.add_argument("--pause", type=float, default=1.0, help="批次间隔秒数")
+    parser.add_argument(
+        "--session-store", choices=["memory", "database"], default="memory"
+    )
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    for pool_size in args.pool_sizes:
+        print(json.dumps(run_pool_size(args, pool_size)))
+
+
+if __name__ == "__main__":
+    main()
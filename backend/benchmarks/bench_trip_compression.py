@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+行程数据压缩基准
+
+分别以明文 JSON、zstd（无字典）、zstd + 训练字典三种方式写入 N 个
+模拟的大型行程，比较数据库文件大小、随机单行读取延迟和全表扫描耗时。
+
+用法:
+    python benchmarks/bench_trip_compression.py --trips 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from sqlalchemy import create_engine, insert, select
+
+from app import compression
+from app.models import Base, Trip, User
+
+CITIES = [
+    ("大阪", "JP"),
+    ("京都", "JP"),
+    ("东京", "JP"),
+    ("成都", "CN"),
+    ("首尔", "KR"),
+]
+PHRASES = [
+    "从关西机场乘坐南海电铁前往市区，入住酒店后前往道顿堀品尝大阪美食",
+    "上午参观历史街区，沿途可以拍照打卡，中午在当地老字号餐厅用餐",
+    "下午自由活动，推荐前往商业街购物，晚上欣赏城市夜景",
+    "建议提前在线预约门票，节假日人流量较大，注意随身财物安全",
+    "乘坐地铁约二十分钟即可到达，步行距离较短，适合带老人和小孩出行",
+]
+
+
+def make_trip(rng: random.Random) -> dict:
+    activities = []
+    for n in range(rng.randint(6, 30)):
+        city, country = rng.choice(CITIES)
+        activities.append(
+            {
+                "title": f"{city}第{n + 1}站",
+                "description": "".join(rng.sample(PHRASES, 3)),
+                "location": f"{city}中心区",
+                "city": city,
+                "countryCode": country,
+                "startTime": f"2024-07-{1 + n // 4:02d}T{9 + n % 4 * 3:02d}:00:00.000",
+                "endTime": f"2024-07-{1 + n // 4:02d}T{11 + n % 4 * 3:02d}:00:00.000",
+                "estimatedCost": rng.randint(0, 2000),
+                "notes": rng.choice(["交通", "餐饮", "景点", "购物", "住宿"]),
+            }
+        )
+    return {
+        "title": "悠闲多城之旅",
+        "description": "".join(rng.sample(PHRASES, 4)),
+        "startDate": "2024-07-01T00:00:00.000",
+        "endDate": "2024-07-08T00:00:00.000",
+        "budget": rng.randint(1000, 30000),
+        "participants": rng.randint(1, 6),
+        "activities": activities,
+    }
+
+
+def run_variant(name: str, trips: list, reads: int, rng: random.Random) -> dict:
+    db_path = tempfile.mktemp(suffix=".db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User), [{"userID": 1, "username": "bench", "email": "b@example.com"}]
+        )
+        for start in range(0, len(trips), 1000):
+            conn.execute(
+                insert(Trip),
+                [
+                    {"user_id": 1, "title": "bench", "trip_data": data}
+                    for data in trips[start : start + 1000]
+                ],
+            )
+    write_seconds = time.perf_counter() - started
+
+    ids = [rng.randint(1, len(trips)) for _ in range(reads)]
+    latencies = []
+    with engine.connect() as conn:
+        for trip_id in ids:
+            started = time.perf_counter()
+            conn.execute(select(Trip.trip_data).where(Trip.id == trip_id)).scalar_one()
+            latencies.append((time.perf_counter() - started) * 1e6)
+
+        started = time.perf_counter()
+        for _ in conn.execute(select(Trip.trip_data)):
+            pass
+        scan_seconds = time.perf_counter() - started
+
+    engine.dispose()
+    size = os.path.getsize(db_path)
+    os.remove(db_path)
+
+    latencies.sort()
+    return {
+        "variant": name,
+        "db_mib": round(size / 2**20, 2),
+        "write_seconds": round(write_seconds, 2),
+        "read_p50_us": round(statistics.median(latencies), 1),
+        "read_p99_us": round(latencies[int(len(latencies) * 0.99)], 1),
+        "full_scan_seconds": round(scan_seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行程数据压缩基准")
+    parser.add_argument("--trips", type=int, default=20000)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--dict-size", type=int, default=112640)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    trips = [make_trip(rng) for _ in range(args.trips)]
+    raw = sum(len(compression.encode_json(t)) for t in trips)
+    print(json.dumps({"trips": args.trips, "raw_json_mib": round(raw / 2**20, 2)}))
+
+    compression.dictionary_store.directory = tempfile.mkdtemp()
+
+    compression.set_compression_mode("none")
+    print(json.dumps(run_variant("json", trips, args.reads, rng)))
+
+    compression.set_compression_mode("zstd")
+    compression.dictionary_store._active_id = 0
+    print(json.dumps(run_variant("zstd", trips, args.reads, rng)))
+
+    samples = [
+        compression.encode_json(t) for t in rng.sample(trips, min(2000, len(trips)))
+    ]
+    compression.train_dictionary(samples, args.dict_size)
+    print(json.dumps(run_variant("zstd+dict", trips, args.reads, rng)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+多 worker 吞吐基准
+
+以共享状态配置（JWT_KEYRING=database、SRP_SESSION_STORE=database、
+SQLITE_PROFILE=production）分别启动 1 个与 N 个 uvicorn worker，
+用 httpx.AsyncClient 以固定并发请求行程列表与 /api/user/me，
+比较吞吐与延迟分位数。令牌由任意 worker 签发、由任意 worker 验证，
+错误数不为 0 说明共享状态配置有问题。
+
+用法:
+    python benchmarks/bench_workers.py --workers 1 4 --concurrency 64 --seconds 15
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TRIP = {
+    "title": "成都美食周末",
+    "trip_data": {
+        "title": "成都美食周末",
+        "activities": [
+            {"title": "宽窄巷子", "city": "成都", "countryCode": "CN"},
+            {"title": "锦里夜市", "city": "成都", "countryCode": "CN"},
+        ],
+    },
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("服务未能在限定时间内启动")
+
+
+async def seed_users(client: httpx.AsyncClient, users: int):
+    tokens = []
+    for n in range(users):
+        account = {
+            "username": f"bench{n}",
+            "email": f"bench{n}@example.com",
+            "password": "bench-password",
+        }
+        await client.post("/api/auth/insecure/register", json=account)
+        response = await client.post(
+            "/api/auth/insecure/login",
+            json={"username": account["username"], "password": account["password"]},
+        )
+        token = response.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for _ in range(5):
+            await client.post("/api/trips/", json=TRIP, headers=headers)
+        tokens.append(headers)
+    return tokens
+
+
+async def drive(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30
+    ) as client:
+        await wait_ready(client)
+        tokens = await seed_users(client, args.users)
+
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + args.seconds
+
+        async def loop(seed: int):
+            nonlocal errors
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                path = "/api/trips/" if rng.random() < 0.7 else "/api/user/me"
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, headers=rng.choice(tokens))
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(loop(seed) for seed in range(args.concurrency)))
+
+    return {
+        "requests_per_second": round(len(latencies) / args.seconds, 1),
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "errors": errors,
+    }
+
+
+def run(workers: int, args) -> dict:
+    db_path = tempfile.mktemp(suffix=".db")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        JWT_KEYRING="database",
+        SRP_SESSION_STORE="database",
+        SQLITE_PROFILE="production",
+    )
+    # 与 start.sh 一致：先建表并生成共享密钥，再启动 worker
+    subprocess.run(
+        [sys.executable, "create_tables.py"],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        result = asyncio.run(drive(f"http://127.0.0.1:{args.port}", args))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    return {"workers": workers, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 吞吐基准")
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1]
+    )
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for workers in dict.fromkeys(args.workers):
+        print(json.dumps(run(workers, args)))
+
+
+if __name__ == "__main__":
+    main()
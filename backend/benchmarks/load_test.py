@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+并发压测工具
+
+由 pseudo_client4test.py 的单用户端到端流程演化而来：用 httpx.AsyncClient
+模拟大量虚拟用户，按开环（open-loop）泊松到达率发起场景，场景之间互不等待，
+服务端变慢时到达率不会随之下降，延迟从计划到达时刻开始计算。
+
+场景（--mix 按权重混合）:
+    register      SRP 注册新用户
+    srp_login     完整 SRP 登录（SRPAuthInit + SRPAuthProof）
+    create_trip   创建行程
+    list_trips    获取行程列表
+    update_trip   更新自己的一个行程
+    speech        语音识别 WebSocket 会话（连接本工具启动的模拟识别服务）
+
+目标服务:
+    不指定 --base-url 时在本进程内用 uvicorn 启动应用（临时 SQLite 数据库），
+    客户端与服务端共用一个事件循环，适合快速对比；
+    指定 --base-url 时压测已运行的服务，语音场景需要服务端设置
+    XUNFEI_WS_BASE_URL=ws://127.0.0.1:<--mock-port> 指向模拟识别服务。
+
+输出为 JSON：每个场景与每个接口的请求数、错误数、吞吐与延迟分位数。
+
+用法:
+    python benchmarks/load_test.py --users 1000 --rate 200 --duration 60
+    python benchmarks/load_test.py --mix list_trips=6,update_trip=2,srp_login=1,speech=0.2
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --output load.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import srp
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+srp.rfc5054_enable()
+
+DEFAULT_MIX = (
+    "register=0.5,srp_login=1,create_trip=2,list_trips=6,update_trip=2,speech=0.2"
+)
+PASSWORD = "load-test-password"
+
+# 16kHz 16bit 单声道 40ms 的静音帧
+AUDIO_FRAME = base64.b64encode(bytes(1280)).decode()
+
+CITIES = [
+    ("北京", "CN"),
+    ("上海", "CN"),
+    ("杭州", "CN"),
+    ("成都", "CN"),
+    ("东京", "JP"),
+]
+
+
+def make_trip(rng: random.Random) -> Dict:
+    title = f"{rng.choice(CITIES)[0]}{rng.randint(2, 7)}日游"
+    return {
+        "title": title,
+        "trip_data": {
+            "title": title,
+            "description": "压测生成的行程",
+            "budget": rng.randint(1000, 20000),
+            "activities": [
+                {
+                    "title": f"活动{n + 1}",
+                    "city": city,
+                    "countryCode": country,
+                    "estimatedCost": rng.randint(0, 800),
+                }
+                for n, (city, country) in enumerate(
+                    rng.choices(CITIES, k=rng.randint(2, 12))
+                )
+            ],
+        },
+    }
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+class Recorder:
+    """按名称汇总延迟与错误数"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, name: str, elapsed: float, ok: bool):
+        if ok:
+            self.latencies[name].append(elapsed)
+        else:
+            self.errors[name] += 1
+
+    def summary(self, seconds: float) -> Dict:
+        result = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies[name]
+            result[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(values) / seconds, 2),
+                "p50_ms": percentile(values, 0.5),
+                "p90_ms": percentile(values, 0.9),
+                "p99_ms": percentile(values, 0.99),
+                "max_ms": percentile(values, 1.0),
+            }
+        return result
+
+
+class VirtualUser:
+    def __init__(self, username: str, headers: Dict[str, str]):
+        self.username = username
+        self.headers = headers
+        self.trip_ids: List[int] = []
+
+
+class LoadClient:
+    """异步版的 SRPClient 与行程操作，每个请求按接口名记录延迟"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder):
+        self.client = client
+        self.recorder = recorder
+
+    async def request(self, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(name, time.perf_counter() - started, False)
+            raise
+        self.recorder.record(
+            name, time.perf_counter() - started, response.status_code < 400
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def register_srp(self, username: str):
+        # 大数运算放到线程中，避免拖慢共用事件循环的进程内服务端
+        salt, verifier = await asyncio.to_thread(
+            srp.create_salted_verification_key,
+            username,
+            PASSWORD,
+            hash_alg=srp.SHA256,
+            ng_type=srp.NG_4096,
+        )
+        await self.request(
+            "POST /api/auth/register",
+            "POST",
+            "/api/auth/register",
+            json={
+                "username": username,
+                "email": f"{username}@example.com",
+                "srp_salt": base64.b64encode(salt).decode(),
+                "srp_verifier": base64.b64encode(verifier).decode(),
+            },
+        )
+
+    async def login_srp(self, username: str) -> Dict[str, str]:
+        user = srp.User(username, PASSWORD, hash_alg=srp.SHA256, ng_type=srp.NG_4096)
+        _, A = await asyncio.to_thread(user.start_authentication)
+        challenge = await self.request(
+            "POST /api/auth/SRPAuthInit",
+            "POST",
+            "/api/auth/SRPAuthInit",
+            json={"username": username, "A": base64.b64encode(A).decode()},
+        )
+        M = await asyncio.to_thread(
+            user.process_challenge,
+            base64.b64decode(challenge["salt"]),
+            base64.b64decode(challenge["B"]),
+        )
+        result = await self.request(
+            "POST /api/auth/SRPAuthProof",
+            "POST",
+            "/api/auth/SRPAuthProof",
+            json={
+                "username": username,
+                "session_id": challenge["session_id"],
+                "M1": base64.b64encode(M).decode(),
+            },
+        )
+        user.verify_session(base64.b64decode(result["M2"]))
+        if not user.authenticated():
+            raise RuntimeError("服务端证明校验失败")
+        return {"Authorization": f"Bearer {result['access_token']}"}
+
+    async def register_insecure(self, username: str) -> Dict[str, str]:
+        await self.request(
+            "POST /api/auth/insecure/register",
+            "POST",
+            "/api/auth/insecure/register",
+            json={
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": PASSWORD,
+            },
+        )
+        result = await self.request(
+            "POST /api/auth/insecure/login",
+            "POST",
+            "/api/auth/insecure/login",
+            json={"username": username, "password": PASSWORD},
+        )
+        return {"Authorization": f"Bearer {result['access_token']}"}
+
+    async def create_trip(self, user: VirtualUser, rng: random.Random):
+        trip = await self.request(
+            "POST /api/trips/",
+            "POST",
+            "/api/trips/",
+            json=make_trip(rng),
+            headers=user.headers,
+        )
+        user.trip_ids.append(trip["id"])
+
+    async def list_trips(self, user: VirtualUser, rng: random.Random):
+        await self.request(
+            "GET /api/trips/",
+            "GET",
+            "/api/trips/",
+            params={"page": 1, "size": 10},
+            headers=user.headers,
+        )
+
+    async def update_trip(self, user: VirtualUser, rng: random.Random):
+        if not user.trip_ids:
+            await self.create_trip(user, rng)
+        await self.request(
+            "PUT /api/trips/{trip_id}",
+            "PUT",
+            f"/api/trips/{rng.choice(user.trip_ids)}",
+            json=make_trip(rng),
+            headers=user.headers,
+        )
+
+
+class LoadTest:
+    def __init__(self, args, base_url: str, client: httpx.AsyncClient):
+        self.args = args
+        self.ws_url = base_url.replace("http", "ws", 1) + "/api/speech/recognize"
+        self.rng = random.Random(args.seed)
+        self.endpoints = Recorder()
+        self.scenarios = Recorder()
+        self.load_client = LoadClient(client, self.endpoints)
+        self.users: List[VirtualUser] = []
+        self.srp_users: List[str] = []
+        self.mix = self._parse_mix(args.mix)
+
+    def _parse_mix(self, value: str) -> Dict[str, float]:
+        mix = {}
+        for item in value.split(","):
+            name, _, weight = item.partition("=")
+            name = name.strip()
+            if not hasattr(self, f"scenario_{name}"):
+                raise SystemExit(f"未知场景: {name}")
+            mix[name] = float(weight or 1)
+        return mix
+
+    async def setup(self):
+        """预先创建虚拟用户（不安全登录，速度快）与一批 SRP 用户"""
+        semaphore = asyncio.Semaphore(self.args.setup_concurrency)
+        run_id = secrets.token_hex(3)
+
+        async def create_user(index: int):
+            async with semaphore:
+                username = f"load_{run_id}_{index}"
+                headers = await self.load_client.register_insecure(username)
+                user = VirtualUser(username, headers)
+                for _ in range(self.args.trips_per_user):
+                    await self.load_client.create_trip(user, self.rng)
+                self.users.append(user)
+
+        async def create_srp_user(index: int):
+            async with semaphore:
+                username = f"load_srp_{run_id}_{index}"
+                await self.load_client.register_srp(username)
+                self.srp_users.append(username)
+
+        await asyncio.gather(*(create_user(n) for n in range(self.args.users)))
+        await asyncio.gather(*(create_srp_user(n) for n in range(self.args.srp_users)))
+        self.run_id = run_id
+        self.registered = 0
+
+    async def scenario_register(self, user: VirtualUser):
+        self.registered += 1
+        username = f"load_new_{self.run_id}_{self.registered}"
+        await self.load_client.register_srp(username)
+        self.srp_users.append(username)
+
+    async def scenario_srp_login(self, user: VirtualUser):
+        await self.load_client.login_srp(self.rng.choice(self.srp_users))
+
+    async def scenario_create_trip(self, user: VirtualUser):
+        await self.load_client.create_trip(user, self.rng)
+
+    async def scenario_list_trips(self, user: VirtualUser):
+        await self.load_client.list_trips(user, self.rng)
+
+    async def scenario_update_trip(self, user: VirtualUser):
+        await self.load_client.update_trip(user, self.rng)
+
+    async def scenario_speech(self, user: VirtualUser):
+        started = time.perf_counter()
+        ok = False
+        try:
+            async with websockets.connect(self.ws_url) as ws:
+                await ws.send(
+                    json.dumps(
+                        {
+                            "user_id": f"{user.username}-{secrets.token_hex(4)}",
+                            "api_keys": {
+                                "xunfei_app_id": "mock",
+                                "xunfei_api_key": "mock",
+                                "xunfei_api_secret": "mock",
+                            },
+                        }
+                    )
+                )
+                for _ in range(self.args.speech_frames):
+                    await ws.send(
+                        json.dumps({"type": "audio", "status": 1, "audio": AUDIO_FRAME})
+                    )
+                    await asyncio.sleep(self.args.speech_frame_interval)
+                await ws.send(json.dumps({"type": "end"}))
+                async for message in ws:
+                    data = json.loads(message).get("data") or {}
+                    if data.get("status") == 2:
+                        ok = True
+                        break
+        finally:
+            self.endpoints.record(
+                "WS /api/speech/recognize", time.perf_counter() - started, ok
+            )
+        if not ok:
+            raise RuntimeError("语音会话未收到最终结果")
+
+    async def run_scenario(self, name: str, intended: float):
+        user = self.rng.choice(self.users)
+        ok = True
+        try:
+            await getattr(self, f"scenario_{name}")(user)
+        except Exception:
+            ok = False
+        # 开环压测：延迟从计划到达时刻算起，包含客户端排队时间
+        self.scenarios.record(name, time.perf_counter() - intended, ok)
+
+    async def run(self) -> Dict:
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        in_flight = set()
+        arrivals = dropped = 0
+        # 只统计压测阶段的请求，不含准备阶段
+        self.endpoints = self.load_client.recorder = Recorder()
+
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        next_arrival = started
+        while True:
+            next_arrival += self.rng.expovariate(self.args.rate)
+            if next_arrival >= deadline:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            arrivals += 1
+            if len(in_flight) >= self.args.max_in_flight:
+                dropped += 1
+                continue
+            name = self.rng.choices(names, weights)[0]
+            task = asyncio.create_task(self.run_scenario(name, next_arrival))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=self.args.drain_timeout)
+        elapsed = time.perf_counter() - started
+
+        return {
+            "config": {
+                "rate": self.args.rate,
+                "duration": self.args.duration,
+                "users": self.args.users,
+                "mix": self.mix,
+                "max_in_flight": self.args.max_in_flight,
+            },
+            "elapsed_seconds": round(elapsed, 2),
+            "arrivals": arrivals,
+            "dropped": dropped,
+            "unfinished": sum(1 for task in in_flight if not task.done()),
+            "scenarios": self.scenarios.summary(elapsed),
+            "endpoints": self.endpoints.summary(elapsed),
+        }
+
+
+async def mock_recognizer(ws):
+    """模拟讯飞识别服务：每收到一帧音频返回中间结果，结束帧后返回最终结果"""
+    sn = 0
+    async for raw in ws:
+        frame = json.loads(raw).get("data", {})
+        status = frame.get("status")
+        if status == 0:
+            continue
+        sn += 1
+        final = status == 2
+        await ws.send(
+            json.dumps(
+                {
+                    "code": 0,
+                    "message": "success",
+                    "sid": "mock",
+                    "data": {
+                        "status": 2 if final else 1,
+                        "result": {
+                            "sn": sn,
+                            "ls": final,
+                            "ws": [{"cw": [{"w": "好"}]}],
+                        },
+                    },
+                }
+            )
+        )
+        if final:
+            return
+
+
+async def start_in_process_server(port: int):
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def main_async(args) -> Dict:
+    mock = await websockets.serve(mock_recognizer, "127.0.0.1", args.mock_port)
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, server_task = await start_in_process_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        limits = httpx.Limits(max_connections=args.max_in_flight)
+        async with httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=args.timeout
+        ) as client:
+            load_test = LoadTest(args, base_url, client)
+            await load_test.setup()
+            return await load_test.run()
+    finally:
+        mock.close()
+        if server is not None:
+            server.should_exit = True
+            await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发压测工具")
+    parser.add_argument("--base-url", help="已运行服务的地址，不指定时在进程内启动")
+    parser.add_argument("--port", type=int, default=8766, help="进程内服务端口")
+    parser.add_argument("--mock-port", type=int, default=9001, help="模拟识别服务端口")
+    parser.add_argument("--users", type=int, default=200, help="预先创建的虚拟用户数")
+    parser.add_argument(
+        "--srp-users", type=int, default=20, help="预先注册的 SRP 用户数"
+    )
+    parser.add_argument("--trips-per-user", type=int, default=3)
+    parser.add_argument("--setup-concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=50, help="每秒到达的场景数")
+    parser.add_argument("--duration", type=float, default=30, help="压测秒数")
+    parser.add_argument(
+        "--mix", default=DEFAULT_MIX, help="场景权重，如 list_trips=6,srp_login=1"
+    )
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--speech-frames", type=int, default=25)
+    parser.add_argument("--speech-frame-interval", type=float, default=0.04)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="结果写入文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    if args.base_url is None:
+        # 进程内服务使用临时数据库，并把语音识别指向模拟服务
+        os.environ.setdefault(
+            "DATABASE_URL", f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+        )
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        os.environ["XUNFEI_WS_BASE_URL"] = f"ws://127.0.0.1:{args.mock_port}"
+
+    result = asyncio.run(main_async(args))
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
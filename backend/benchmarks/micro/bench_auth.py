@@ -0,0 +1,31 @@
+"""JWT 签发/校验与 get_current_user 依赖"""
+
+from app.auth import create_access_token, verify_token
+from app.middleware import get_current_user
+
+
+def bench_create_access_token(benchmark, bench_user):
+    token = benchmark(create_access_token, {"sub": bench_user.username})
+    assert token
+
+
+def bench_verify_token(benchmark, bench_token, bench_user):
+    payload = benchmark(verify_token, bench_token)
+    assert payload["sub"] == bench_user.username
+
+
+def bench_get_current_user(benchmark, bench_token, bench_user, db):
+    # 依赖本身（令牌校验 + 按用户名查询），不含 HTTP 层
+    user = benchmark(get_current_user, token=bench_token, db=db)
+    assert user.id == bench_user.id
+
+
+def bench_denylist_is_revoked(benchmark, bench_token):
+    # 吊销名单中有 1 万个条目时对未吊销令牌的判定
+    from app.token_denylist import TokenDenylist
+
+    denylist = TokenDenylist()
+    for n in range(10000):
+        denylist._add(f"jti{n}", 4102444800 + n, 0)
+    payload = verify_token(bench_token)
+    assert benchmark(denylist.is_revoked, payload) is False
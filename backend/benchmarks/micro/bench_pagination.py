@@ -0,0 +1,64 @@
+"""GET /api/trips/ 在 10 / 1千 / 10万 条行程下的首页与末页"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app import models
+from app.auth import create_access_token
+from app.database import SessionLocal
+from app.main import app
+from helpers import make_trip_data, make_user
+
+PAGE_SIZE = 20
+INSERT_BATCH = 5000
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module", params=[10, 1000, 100000])
+def owner(request):
+    """每个数据量一个用户，行程用 Core 批量写入"""
+    trips = request.param
+    trip_data = make_trip_data(10)
+    with SessionLocal() as db:
+        user = make_user(db, f"bench_pages_{trips}")
+        for start in range(0, trips, INSERT_BATCH):
+            rows = [
+                {
+                    "user_id": user.id,
+                    "title": f"行程{i}",
+                    "status": "planning",
+                    "trip_data": trip_data,
+                }
+                for i in range(start, min(start + INSERT_BATCH, trips))
+            ]
+            db.execute(insert(models.Trip), rows)
+        db.commit()
+        token = create_access_token(data={"sub": user.username})
+    return trips, {"Authorization": f"Bearer {token}"}
+
+
+def _list(client, headers, page):
+    response = client.get(
+        "/api/trips/", params={"page": page, "size": PAGE_SIZE}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def bench_first_page(benchmark, client, owner):
+    trips, headers = owner
+    body = benchmark(_list, client, headers, 1)
+    assert body["total"] == trips
+
+
+def bench_last_page(benchmark, client, owner):
+    trips, headers = owner
+    last = (trips + PAGE_SIZE - 1) // PAGE_SIZE
+    body = benchmark(_list, client, headers, last)
+    assert body["page"] == last and body["items"]
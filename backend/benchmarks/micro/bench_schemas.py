@@ -0,0 +1,42 @@
+"""TripResponse 在不同 trip_data 大小下的校验与序列化"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app import schemas
+from helpers import make_trip_data
+
+
+@pytest.mark.parametrize("activities", [1, 10, 100, 1000])
+def bench_trip_response_validate(benchmark, activities):
+    # trip_data 声明为 Dict[str, Any]，校验只检查顶层
+    now = datetime.now()
+    trip = SimpleNamespace(
+        id=1,
+        user_id=1,
+        title="杭州之旅",
+        status="planning",
+        trip_data=make_trip_data(activities),
+        created_at=now,
+        updated_at=now,
+    )
+    response = benchmark(schemas.TripResponse.model_validate, trip)
+    assert response.id == 1
+
+
+@pytest.mark.parametrize("activities", [1, 10, 100, 1000])
+def bench_trip_response_serialize(benchmark, activities):
+    # 响应序列化，trip_data 越大开销越大
+    now = datetime.now()
+    response = schemas.TripResponse(
+        id=1,
+        user_id=1,
+        title="杭州之旅",
+        status="planning",
+        trip_data=make_trip_data(activities),
+        created_at=now,
+        updated_at=now,
+    )
+    assert benchmark(response.model_dump_json)
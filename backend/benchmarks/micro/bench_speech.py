@@ -0,0 +1,22 @@
+"""语音识别转发中客户端消息到讯飞数据帧的转换"""
+
+import base64
+import json
+
+from app.routers.speech import client_message_to_xunfei_frame
+
+# 40ms、16kHz、16bit 单声道音频，与前端每帧发送的数据量一致
+AUDIO_FRAME = json.dumps(
+    {"type": "audio", "audio": base64.b64encode(bytes(1280)).decode(), "status": 1}
+)
+END_FRAME = json.dumps({"type": "end"})
+
+
+def bench_audio_frame(benchmark):
+    frame = benchmark(client_message_to_xunfei_frame, AUDIO_FRAME)
+    assert json.loads(frame)["data"]["status"] == 1
+
+
+def bench_end_frame(benchmark):
+    frame = benchmark(client_message_to_xunfei_frame, END_FRAME)
+    assert json.loads(frame)["data"]["status"] == 2
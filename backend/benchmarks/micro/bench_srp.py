@@ -0,0 +1,80 @@
+"""SRP 验证器创建、会话校验与大整数编码"""
+
+import secrets
+
+import pytest
+import srp
+
+from app.srp_auth import SRP_B_LENGTH, SRPVerifier, create_verifier
+from app.utils.srp_dataType import base64_to_bigint, bigint_to_base64
+
+USERNAME = "bench_srp"
+PASSWORD = "bench-password"
+
+srp.rfc5054_enable()
+
+
+@pytest.fixture(scope="module")
+def credentials():
+    salt, vkey = srp.create_salted_verification_key(
+        USERNAME, PASSWORD, hash_alg=srp.SHA256, ng_type=srp.NG_4096
+    )
+    usr = srp.User(USERNAME, PASSWORD, hash_alg=srp.SHA256, ng_type=srp.NG_4096)
+    _, A = usr.start_authentication()
+    return salt, vkey, usr, A
+
+
+def bench_verifier_challenge(benchmark, credentials):
+    # 挑战阶段：创建验证器并计算 B
+    salt, vkey, _, A = credentials
+
+    def challenge():
+        svr = create_verifier(
+            USERNAME, salt, vkey, A, secrets.token_bytes(SRP_B_LENGTH)
+        )
+        return svr.get_challenge()
+
+    s, B = benchmark(challenge)
+    assert s == salt and B
+
+
+def bench_verify_session(benchmark, credentials):
+    # 验证阶段：由同一个 b 重建验证器并校验客户端证明 M
+    salt, vkey, usr, A = credentials
+    b = secrets.token_bytes(SRP_B_LENGTH)
+    _, B = create_verifier(USERNAME, salt, vkey, A, b).get_challenge()
+    M = usr.process_challenge(salt, B)
+
+    def verify():
+        return create_verifier(USERNAME, salt, vkey, A, b).verify_session(M)
+
+    HAMK = benchmark(verify)
+    assert HAMK is not None
+
+
+def bench_srp_verifier_verify_session(benchmark, credentials):
+    # 同上，使用 SRPVerifier（按 SRP_BIGINT_BACKEND 选择大整数运算）
+    salt, vkey, usr, A = credentials
+    b = secrets.token_bytes(SRP_B_LENGTH)
+    _, B = create_verifier(USERNAME, salt, vkey, A, b).get_challenge()
+    M = usr.process_challenge(salt, B)
+
+    def verify():
+        return SRPVerifier(USERNAME, salt, vkey, A, b).verify_session(M)
+
+    assert benchmark(verify) is not None
+
+
+@pytest.fixture(scope="module")
+def bigint():
+    return secrets.randbits(4096) | (1 << 4095)
+
+
+def bench_bigint_to_base64(benchmark, bigint):
+    encoded = benchmark(bigint_to_base64, bigint)
+    assert base64_to_bigint(encoded) == bigint
+
+
+def bench_base64_to_bigint(benchmark, bigint):
+    encoded = bigint_to_base64(bigint)
+    assert benchmark(base64_to_bigint, encoded) == bigint
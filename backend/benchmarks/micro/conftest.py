@@ -0,0 +1,59 @@
+"""
+后端热点路径的微基准测试（pytest-benchmark）
+
+安装 benchmark 可选依赖后在 backend 目录运行：
+
+    python -m pytest -c benchmarks/micro/pytest.ini benchmarks/micro --benchmark-autosave
+
+结果按机器与提交保存在 .benchmarks/ 下（文件名含 git 提交号），与历史结果对比：
+
+    python -m pytest -c benchmarks/micro/pytest.ini benchmarks/micro \
+        --benchmark-compare --benchmark-compare-fail=median:10%
+
+--benchmark-compare 不带参数时与最近一次保存的结果对比，也可指定编号（如 0001）；
+--benchmark-compare-fail 使回退超过阈值时以失败退出。分页用例需要写入 10 万条
+行程，只跑其他用例时加 -k "not 100000"。
+
+基准使用临时 SQLite 数据库，导入应用前设置好环境变量，不会读写 app.db。
+"""
+
+import os
+import sys
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="bench-micro-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench.db"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import pytest  # noqa: E402
+
+from app import models  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.search import init_search_index  # noqa: E402
+from helpers import make_user  # noqa: E402
+
+models.Base.metadata.create_all(bind=engine)
+init_search_index(engine)
+
+
+@pytest.fixture(scope="session")
+def bench_user():
+    with SessionLocal() as db:
+        user = make_user(db, "bench_user")
+        db.expunge(user)
+    return user
+
+
+@pytest.fixture(scope="session")
+def bench_token(bench_user):
+    return create_access_token(data={"sub": bench_user.username})
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
@@ -0,0 +1,31 @@
+"""基准测试共用的数据构造"""
+
+import random
+from datetime import datetime
+
+from app import models
+from seed_data import generate_trip_data
+
+_next_user_id = 0
+
+
+def make_user(db, username: str) -> models.User:
+    """直接写入一个用户（跳过注册流程），userID 在基准进程内递增"""
+    global _next_user_id
+    _next_user_id += 1
+    user = models.User(
+        userID=_next_user_id,
+        username=username,
+        email=f"{username}@bench.local",
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def make_trip_data(activities: int) -> dict:
+    """按活动数生成行程数据（与 seed_data.py 相同的结构），同样的活动数结果相同"""
+    return generate_trip_data(
+        random.Random(activities), activities, start=datetime(2024, 7, 1)
+    )
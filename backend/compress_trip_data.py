@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+行程数据压缩迁移工具
+
+    # 从现有行程中抽样训练共享字典
+    python compress_trip_data.py train --samples 2000
+
+    # （仅 PostgreSQL）将 trip_data 列改为 bytea
+    python compress_trip_data.py alter-column
+
+    # 按批把现有行程改写为压缩格式（或用 --mode none 解压回 JSON 文本）
+    python compress_trip_data.py rewrite --batch-size 500
+
+改写按主键分批进行，每批一个事务，不会修改 updated_at。
+PostgreSQL 上 trip_data 已是 bytea 时，--mode none 写入 UTF-8 编码的 JSON 字节；
+之后若要以 TRIP_DATA_COMPRESSION=none 运行，再执行 alter-column --to-json
+把列改回 json（应用在 none 模式下写入 JSON 文本）。
+"""
+
+import argparse
+import os
+import sys
+
+# 添加应用路径到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import LargeBinary, bindparam, func, inspect, select, text, update
+
+from app import compression
+from app.database import SessionLocal, engine
+from app.models import Trip
+
+
+def train(samples: int, dict_size: int):
+    """随机抽样行程数据训练字典"""
+    with SessionLocal() as db:
+        rows = db.scalars(
+            select(Trip.trip_data).order_by(func.random()).limit(samples)
+        ).all()
+    if not rows:
+        print("❌ 数据库中没有行程，无法训练字典")
+        return
+    dict_id = compression.train_dictionary(
+        [compression.encode_json(row) for row in rows], dict_size
+    )
+    print(f"✅ 字典训练完成: id={dict_id}, 样本数={len(rows)}")
+    print(f"   已保存到 {compression.dictionary_store.directory}")
+
+
+def alter_column(to_json: bool = False):
+    """PostgreSQL: 将 trip_data 列从 json 改为 bytea（或改回 json）"""
+    if engine.dialect.name != "postgresql":
+        print("SQLite 列类型是动态的，无需修改表结构")
+        return
+    if to_json:
+        # 只能在 rewrite --mode none 之后执行：压缩帧不是合法的 UTF-8 JSON
+        statement = (
+            "ALTER TABLE trips ALTER COLUMN trip_data TYPE json "
+            "USING convert_from(trip_data, 'UTF8')::json"
+        )
+    else:
+        statement = (
+            "ALTER TABLE trips ALTER COLUMN trip_data TYPE bytea "
+            "USING convert_to(trip_data::text, 'UTF8')"
+        )
+    with engine.begin() as conn:
+        conn.execute(text(statement))
+    print(f"✅ trip_data 列已改为 {'json' if to_json else 'bytea'}")
+
+
+def _binary_column() -> bool:
+    """PostgreSQL 的 trip_data 列是否已改为 bytea"""
+    if engine.dialect.name != "postgresql":
+        return False
+    columns = inspect(engine).get_columns(Trip.__tablename__)
+    column = next(column for column in columns if column["name"] == "trip_data")
+    return isinstance(column["type"], LargeBinary)
+
+
+def rewrite(mode: str, batch_size: int):
+    """按主键分批读取并以指定模式重新写入 trip_data"""
+    binary = _binary_column()
+    if mode == "zstd" and engine.dialect.name == "postgresql" and not binary:
+        print("❌ trip_data 列仍是 json，请先执行 alter-column")
+        return
+    compression.set_compression_mode(mode)
+    table = Trip.__table__
+    data = bindparam("data")
+    encode = None
+    if mode == "none" and binary:
+        # bytea 列不能写入文本：写入 UTF-8 编码的 JSON，读取时按明文 JSON 识别
+        data = bindparam("data", type_=LargeBinary)
+        encode = compression.encode_json
+    statement = (
+        update(table).where(table.c.id == bindparam("trip_id"))
+        # 显式写回 updated_at，避免触发 onupdate
+        .values(trip_data=data, updated_at=table.c.updated_at)
+    )
+
+    last_id, total = 0, 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(table.c.id, table.c.trip_data)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.execute(
+                statement,
+                [
+                    {
+                        "trip_id": row.id,
+                        "data": encode(row.trip_data) if encode else row.trip_data,
+                    }
+                    for row in rows
+                ],
+            )
+            db.commit()
+            last_id = rows[-1].id
+            total += len(rows)
+            print(f"已改写 {total} 个行程 (id <= {last_id})")
+    print(f"✅ 改写完成，共 {total} 个行程，模式: {mode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行程数据压缩迁移工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = sub.add_parser("train", help="抽样训练共享字典")
+    train_parser.add_argument("--samples", type=int, default=2000)
+    train_parser.add_argument("--dict-size", type=int, default=112640)
+
+    alter_parser = sub.add_parser(
+        "alter-column", help="PostgreSQL: 将 trip_data 改为 bytea"
+    )
+    alter_parser.add_argument(
+        "--to-json", action="store_true", help="改回 json（需先 rewrite --mode none）"
+    )
+
+    rewrite_parser = sub.add_parser("rewrite", help="按批改写现有行程")
+    rewrite_parser.add_argument("--mode", choices=["zstd", "none"], default="zstd")
+    rewrite_parser.add_argument("--batch-size", type=int, default=500)
+
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args.samples, args.dict_size)
+    elif args.command == "alter-column":
+        alter_column(args.to_json)
+    else:
+        rewrite(args.mode, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,14 +10,20 @@ import sys
 # 添加应用路径到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from app.auth import keyring
 from app.database import engine
 from app.models import Base
+from app.search import init_search_index
 
 
 def create_tables():
     """创建所有数据库表"""
     print("正在创建数据库表...")
     Base.metadata.create_all(bind=engine)
+    init_search_index(engine)
+    if keyring.backend == "database":
+        # 在启动多个 worker 之前生成共享签名密钥，避免各 worker 同时生成
+        keyring.reload(create=True)
     print("✅ 数据库表创建完成")
 
 
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+JWT签名密钥轮换
+
+生成新的签名密钥并停用当前密钥。停用的密钥在 JWT_KEY_RETENTION_MINUTES
+内仍用于验证已签发的令牌，之后在下一次轮换时删除。各 worker 在
+KEYRING_REFRESH_SECONDS 内切换到新密钥。仅在 JWT_KEYRING=database 时有意义。
+
+    python rotate_signing_key.py
+"""
+
+import os
+import sys
+
+# 添加应用路径到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.auth import JWT_KEYRING, rotate_signing_key
+
+
+def main():
+    if JWT_KEYRING != "database":
+        print("❌ 当前 JWT_KEYRING 不是 database，密钥只存在于各进程内存中，无需轮换")
+        sys.exit(1)
+    kid = rotate_signing_key()
+    print(f"✅ 已生成新的签名密钥: kid={kid}")
+
+
+if __name__ == "__main__":
+    main()
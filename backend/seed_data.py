@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+规模测试数据生成工具
+
+生成 N 个用户、每个用户 M 个行程，trip_data 按 docs/行程JSON结构说明.md 的结构
+随机生成（城市、活动数、中文文本、费用分布都有变化），用 Core 批量插入写入，
+供基准测试与容量测试使用：
+
+    python seed_data.py --users 10000 --trips-per-user 1000 --batch-size 5000
+
+生成的用户名为 <前缀><userID>，均使用不安全密码传输登录（密码 --password），
+可直接用于 /api/auth/insecure/login。主键由工具按现有最大值之后连续分配，
+运行期间不要有其他进程写入用户或行程。
+
+默认同时写入派生数据（检索索引、活动明细），与接口写入的结果一致；
+--skip-derived 只写行程本身，速度更快，但之后应用启动时会为缺失的行程
+补建检索索引，需要时再运行 backfill_activities.py 回填活动明细。
+同样的 --seed 生成同样的数据。
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 添加应用路径到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import column, func, insert, select, table, text
+from sqlalchemy.orm import Session
+
+from app import compression, trip_sync
+from app.database import engine
+from app.id_allocator import user_id_allocator
+from app.models import Base, Trip, User
+from app.search import init_search_index
+from app.srp_auth import hash_password_for_storage
+
+# (城市, 国家代码, 地点)
+CITIES = [
+    ("北京", "CN", ["故宫博物院", "天坛公园", "颐和园", "南锣鼓巷", "八达岭长城"]),
+    ("上海", "CN", ["外滩", "豫园", "南京路步行街", "陆家嘴", "田子坊"]),
+    ("杭州", "CN", ["西湖", "灵隐寺", "河坊街", "西溪湿地", "龙井村"]),
+    ("成都", "CN", ["宽窄巷子", "锦里", "大熊猫繁育研究基地", "春熙路", "武侯祠"]),
+    ("西安", "CN", ["兵马俑", "大雁塔", "回民街", "古城墙", "陕西历史博物馆"]),
+    ("广州", "CN", ["广州塔", "沙面", "上下九步行街", "陈家祠", "白云山"]),
+    ("厦门", "CN", ["鼓浪屿", "曾厝垵", "南普陀寺", "环岛路", "中山路"]),
+    ("桂林", "CN", ["漓江", "象鼻山", "阳朔西街", "遇龙河", "龙脊梯田"]),
+    ("香港", "HK", ["维多利亚港", "太平山顶", "旺角", "铜锣湾", "星光大道"]),
+    ("台北", "TW", ["台北101", "士林夜市", "故宫博物院", "九份老街", "西门町"]),
+    ("东京", "JP", ["浅草寺", "涩谷十字路口", "新宿御苑", "银座", "秋叶原"]),
+    ("大阪", "JP", ["道顿堀", "大阪城", "心斋桥", "黑门市场", "环球影城"]),
+    ("京都", "JP", ["伏见稻荷大社", "清水寺", "金阁寺", "岚山竹林", "祇园"]),
+    ("首尔", "KR", ["景福宫", "明洞", "北村韩屋村", "南山首尔塔", "弘大"]),
+    ("曼谷", "TH", ["大皇宫", "卧佛寺", "考山路", "暹罗广场", "湄南河"]),
+    ("新加坡", "SG", ["滨海湾花园", "鱼尾狮公园", "圣淘沙", "牛车水", "乌节路"]),
+    ("巴黎", "FR", ["埃菲尔铁塔", "卢浮宫", "凯旋门", "塞纳河", "蒙马特高地"]),
+    (
+        "纽约",
+        "US",
+        ["时代广场", "中央公园", "自由女神像", "大都会艺术博物馆", "布鲁克林大桥"],
+    ),
+]
+
+# (活动标题模板, 备注, 时长小时, 费用对数正态分布的中位数与离散度)
+ACTIVITY_KINDS = [
+    ("游览{location}", "观光", 3, 80, 0.8),
+    ("{location}拍照打卡", "观光", 1, 0, 0.0),
+    ("在{location}附近品尝当地美食", "餐饮", 2, 150, 0.6),
+    ("{location}购物", "购物", 2, 400, 1.2),
+    ("前往{location}", "交通", 1, 40, 1.0),
+    ("入住{city}酒店", "住宿", 1, 600, 0.5),
+    ("{location}夜景", "观光", 2, 60, 0.9),
+    ("参观{location}", "门票", 2, 120, 0.5),
+]
+
+DESCRIPTIONS = [
+    "适合{participants}人、预算约{budget}元的{city}轻松行程",
+    "{city}{days}日深度游，兼顾经典景点与地道美食",
+    "第一次去{city}，想多看看当地的人文风景",
+    "带家人一起去{city}，节奏不要太紧",
+]
+
+FOOD = [
+    "火锅",
+    "日料",
+    "寿司",
+    "拉面",
+    "烤鸭",
+    "小笼包",
+    "海鲜",
+    "烤肉",
+    "街头小吃",
+    "素食",
+]
+INTERESTS = ["观光", "购物", "美食", "博物馆", "徒步", "摄影", "夜生活", "亲子"]
+ACCOMMODATION = ["商务酒店", "民宿", "青年旅舍", "度假酒店", "精品酒店"]
+
+STATUSES = ["planning", "in_progress", "completed", "cancelled"]
+STATUS_WEIGHTS = [50, 10, 35, 5]
+
+ISO = "%Y-%m-%dT%H:%M:%S.000"
+
+
+def _cost(rng: random.Random, median: float, sigma: float) -> int:
+    if median <= 0:
+        return 0
+    return int(round(rng.lognormvariate(math.log(median), sigma)))
+
+
+def generate_trip_data(
+    rng: random.Random,
+    activity_count: Optional[int] = None,
+    start: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    生成一个行程的 trip_data
+
+    activity_count 为空时随机决定：约 5% 只有必填字段，其余按天数每天 1~6 个活动。
+    """
+    if start is None:
+        start = datetime(2023, 1, 1) + timedelta(days=rng.randrange(900))
+    home = rng.randrange(len(CITIES))
+    # 多数行程只去一个城市，少数在同一国家内再去一两个城市
+    cities = [CITIES[home]]
+    if rng.random() < 0.3:
+        country = CITIES[home][1]
+        others = [c for c in CITIES if c[1] == country and c is not CITIES[home]]
+        cities.extend(rng.sample(others, min(len(others), rng.randint(1, 2))))
+
+    if activity_count is None:
+        if rng.random() < 0.05:
+            days = rng.randint(1, 3)
+            return {
+                "title": f"{cities[0][0]}{days}日游",
+                "startDate": start.strftime(ISO),
+                "endDate": (start + timedelta(days=days - 1)).strftime(ISO),
+            }
+        days = rng.choices(range(1, 11), weights=[8, 18, 22, 16, 12, 9, 6, 4, 3, 2])[0]
+        activity_count = sum(rng.randint(1, 6) for _ in range(days))
+    else:
+        days = max(1, math.ceil(activity_count / 5))
+
+    per_day = max(1, math.ceil(activity_count / days))
+    participants = rng.choices([1, 2, 3, 4, 5], weights=[25, 40, 15, 15, 5])[0]
+    # 按天格式化日期一次，活动时间直接拼接（strftime 是生成中最慢的部分）
+    dates = [(start + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)]
+    activity_list = []
+    total_cost = 0
+    for index in range(activity_count):
+        day, slot = divmod(index, per_day)
+        city, country, locations = cities[
+            min(day * len(cities) // days, len(cities) - 1)
+        ]
+        location = locations[int(rng.random() * len(locations))]
+        template, notes, hours, median, sigma = ACTIVITY_KINDS[
+            int(rng.random() * len(ACTIVITY_KINDS))
+        ]
+        hour = 8 + slot * 14 // per_day
+        cost = _cost(rng, median, sigma)
+        total_cost += cost
+        activity_list.append(
+            {
+                "title": template.format(location=location, city=city),
+                "description": f"{city}{location}，{notes}安排，预计停留{hours}小时",
+                "location": location,
+                "city": city,
+                "countryCode": country,
+                "startTime": f"{dates[day]}T{hour:02d}:00:00.000",
+                "endTime": f"{dates[day]}T{min(hour + hours, 23):02d}:00:00.000",
+                "estimatedCost": cost,
+                "notes": notes,
+            }
+        )
+
+    budget = (
+        int(math.ceil(total_cost * participants * rng.uniform(1.0, 1.5) / 100)) * 100
+    )
+    city = cities[0][0]
+    return {
+        "title": f"{'、'.join(c[0] for c in cities)}{days}日游",
+        "description": rng.choice(DESCRIPTIONS).format(
+            participants=participants, budget=budget, city=city, days=days
+        ),
+        "startDate": start.strftime(ISO),
+        "endDate": (start + timedelta(days=days - 1)).strftime(ISO),
+        "budget": budget,
+        "participants": participants,
+        "preferences": {
+            "food": rng.sample(FOOD, rng.randint(0, 3)),
+            "activities": rng.sample(INTERESTS, rng.randint(0, 3)),
+            "accommodation": rng.choice(ACCOMMODATION),
+        },
+        "activities": activity_list,
+    }
+
+
+def _next_id(db: Session, column) -> int:
+    return (db.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def _sync_sequences(db: Session):
+    """PostgreSQL 上显式写入主键后，把自增序列推进到当前最大值"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for table in ("users", "trips"):
+        db.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+            )
+        )
+
+
+# 预先编码好的 trip_data 直接写入，跳过 CompressedJSON 的绑定处理
+_raw_trips = table(
+    "trips",
+    *[
+        column(c.name) if c.name == "trip_data" else column(c.name, c.type)
+        for c in Trip.__table__.columns
+    ],
+)
+
+
+def _encode_trip_data(value: Dict[str, Any]):
+    """按当前压缩配置编码 trip_data，与 CompressedJSON 写入的格式一致"""
+    if compression.compression_mode() == "zstd":
+        return compression.compress_value(value)
+    return compression.encode_json(value).decode("utf-8")
+
+
+def generate_batch(spec: Tuple) -> List[Dict[str, Any]]:
+    """
+    生成一批行程行（在子进程中运行）
+
+    每批使用由随机种子和批次起点派生的独立随机数，结果与 worker 数无关。
+    encode 为真时 trip_data 在子进程中编码，主进程只负责写入。
+    """
+    seed_value, first, count, first_trip_pk, first_user_pk, per_user, now, encode = spec
+    rng = random.Random(f"{seed_value}:{first}")
+    rows = []
+    for index in range(first, first + count):
+        created_at = now - timedelta(seconds=rng.randrange(730 * 86400))
+        trip_data = generate_trip_data(rng)
+        rows.append(
+            {
+                "id": first_trip_pk + index,
+                "user_id": first_user_pk + index // per_user,
+                "title": trip_data["title"],
+                "status": rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0],
+                "trip_data": _encode_trip_data(trip_data) if encode else trip_data,
+                "created_at": created_at,
+                "updated_at": created_at + timedelta(seconds=rng.randrange(30 * 86400)),
+            }
+        )
+    return rows
+
+
+def seed(
+    users: int,
+    trips_per_user: int,
+    batch_size: int,
+    seed_value: int,
+    prefix: str,
+    password: str,
+    derived: bool,
+    workers: int,
+):
+    """生成数据并分批写入，每批一个事务；生成在 workers 个子进程中并行进行"""
+    Base.metadata.create_all(bind=engine)
+    init_search_index(engine)
+    password_hash = hash_password_for_storage(password)
+    now = datetime.utcnow()
+    total = users * trips_per_user
+
+    started = time.perf_counter()
+    written = 0
+    first_user_id = user_id_allocator.reserve(users)
+    with engine.connect() as conn:
+        # 生成的数据随时可以重新生成，SQLite 写入期间不逐批等待落盘；
+        # PRAGMA synchronous 不能在事务内修改，直接在底层连接上执行
+        raw = conn.connection.dbapi_connection
+        if conn.dialect.name == "sqlite":
+            synchronous = raw.execute("PRAGMA synchronous").fetchone()[0]
+            raw.execute("PRAGMA synchronous=OFF")
+        with Session(bind=conn) as db:
+            user_pk = _next_id(db, User.id)
+            trip_pk = _next_id(db, Trip.id)
+
+            user_rows = []
+            for offset in range(users):
+                username = f"{prefix}{first_user_id + offset}"
+                user_rows.append(
+                    {
+                        "id": user_pk + offset,
+                        "userID": first_user_id + offset,
+                        "username": username,
+                        "email": f"{username}@example.com",
+                        "srp_salt": "",
+                        "srp_verifier": "",
+                        "insecure_password_hash": password_hash,
+                        "is_insecure_auth": True,
+                    }
+                )
+            for start in range(0, users, batch_size):
+                db.execute(
+                    insert(User.__table__), user_rows[start : start + batch_size]
+                )
+            db.commit()
+            print(f"已写入 {users} 个用户 ({prefix}{first_user_id} 起)")
+
+            # 写派生数据时主进程需要 trip_data 对象，否则在子进程中编码好
+            specs = (
+                (
+                    seed_value,
+                    first,
+                    min(batch_size, total - first),
+                    trip_pk,
+                    user_pk,
+                    trips_per_user,
+                    now,
+                    not derived,
+                )
+                for first in range(0, total, batch_size)
+            )
+            for rows in _generate(specs, workers):
+                written += _write_trips(db, rows, derived)
+                _report(written, total, started)
+            _sync_sequences(db)
+            db.commit()
+        if conn.dialect.name == "sqlite":
+            raw.execute(f"PRAGMA synchronous={synchronous}")
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ 生成完成：{users} 个用户，{written} 个行程，"
+        f"耗时 {elapsed:.1f}s（{written / max(elapsed, 1e-9):,.0f} 行程/秒）"
+    )
+
+
+def _generate(specs: Iterable[Tuple], workers: int) -> Iterator[List[Dict[str, Any]]]:
+    """按顺序产出各批次；子进程最多领先写入 2 * workers 批，避免占满内存"""
+    if workers <= 1:
+        yield from map(generate_batch, specs)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        pending: Deque = deque()
+        for spec in specs:
+            pending.append(pool.apply_async(generate_batch, (spec,)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _write_trips(db: Session, rows: List[Dict[str, Any]], derived: bool) -> int:
+    if not derived:
+        db.execute(insert(_raw_trips), rows)
+        db.commit()
+        return len(rows)
+
+    db.execute(insert(Trip.__table__), rows)
+    # 派生数据走与接口写入相同的同步入口，只需 id/user_id/status/title/trip_data
+    trip_sync.on_trips_saved(
+        db,
+        [
+            Trip(
+                id=row["id"],
+                user_id=row["user_id"],
+                title=row["title"],
+                status=row["status"],
+                trip_data=row["trip_data"],
+            )
+            for row in rows
+        ],
+        created=True,
+    )
+    db.commit()
+    return len(rows)
+
+
+def _report(written: int, total: int, started: float):
+    elapsed = time.perf_counter() - started
+    print(
+        f"已写入 {written}/{total} 个行程"
+        f"（{written / max(elapsed, 1e-9):,.0f} 行程/秒）"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规模测试数据生成工具")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--trips-per-user", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--prefix", default="seed_", help="用户名前缀")
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="生成数据的进程数，默认为 CPU 核数",
+    )
+    parser.add_argument(
+        "--skip-derived", action="store_true", help="不写检索索引与活动明细"
+    )
+    args = parser.parse_args()
+    seed(
+        args.users,
+        args.trips_per_user,
+        args.batch_size,
+        args.seed,
+        args.prefix,
+        args.password,
+        not args.skip_derived,
+        args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,23 @@ set -e  # 遇到错误立即退出
 
 echo "🚀 启动AI旅行规划师服务..."
 
-# 检查并创建数据库
-if [ ! -f "/app/data/app.db" ]; then
-    echo "📁 创建数据库文件..."
-    mkdir -p /app/data
-    # 初始化数据库
-    cd /app
-    python create_tables.py
-    echo "✅ 数据库初始化完成"
+# 创建数据库及缺失的数据表（已有的表不会修改，可重复执行）
+mkdir -p /app/data
+cd /app
+python create_tables.py
+echo "✅ 数据库初始化完成"
+
+# worker 数量：WEB_CONCURRENCY=auto 时使用全部 CPU 核心
+WORKERS="${WEB_CONCURRENCY:-1}"
+if [ "$WORKERS" = "auto" ]; then
+    WORKERS="$(nproc)"
+fi
+if [ "$WORKERS" -gt 1 ]; then
+    # 多 worker 时签名密钥与 SRP 会话必须共享，否则令牌与登录会话只在单个 worker 内有效
+    if [ "${JWT_KEYRING:-memory}" != "database" ] || [ "${SRP_SESSION_STORE:-memory}" != "database" ]; then
+        echo "❌ 多 worker 模式需要设置 JWT_KEYRING=database 与 SRP_SESSION_STORE=database"
+        exit 1
+    fi
 fi
 
 # 检查数据库连接
@@ -33,12 +42,15 @@ except Exception as e:
 # 启动后端服务（后台运行）
 echo "🔧 启动FastAPI后端服务..."
 cd /app
-python -m uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers 1 &
+echo "🔧 worker 数量: $WORKERS"
+# 行程变更推送（SSE）是长连接，限定优雅退出的等待时间，避免重启时被其阻塞
+python -m uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS" \
+    --timeout-graceful-shutdown 10 &
 
-# 等待后端服务启动
+# 等待后端服务就绪（数据库、连接池与工作队列检查通过）
 echo "⏳ 等待后端服务启动..."
 for i in {1..30}; do
-    if curl -f http://localhost:8000/health > /dev/null 2>&1; then
+    if curl -f http://localhost:8000/health/ready > /dev/null 2>&1; then
         echo "✅ 后端服务启动成功"
         break
     fi
@@ -47,7 +59,7 @@ for i in {1..30}; do
 done
 
 # 检查后端服务是否正常
-if ! curl -f http://localhost:8000/health > /dev/null 2>&1; then
+if ! curl -f http://localhost:8000/health/ready > /dev/null 2>&1; then
     echo "❌ 后端服务启动失败，请检查日志"
     exit 1
 fi